@@ -0,0 +1,125 @@
+"""
+Network allowlist and login rate limiting.
+
+``NetworkAllowlist`` runs on every request (Flask's ``restrict_networks``
+and the ASGI middleware), so also on every ``/api/input`` event. The CIDR
+strings are parsed once. Per address family the networks become sets of
+integer prefixes, one set per distinct prefix length, so a lookup is a
+shift and a set probe per prefix length in use (four for the default list)
+whatever the number of networks. Decisions are also cached per address
+string (at most ``cache_size``, oldest out first), which makes the usual
+case one dict lookup. IPv4-mapped IPv6 addresses (``::ffff:10.0.0.5`` from
+a dual-stack socket) are matched as IPv4. Entries are parsed non-strictly
+(``127.0.0.1/8`` means ``127.0.0.0/8``); anything else that does not
+parse is a configuration error and raises.
+
+``LoginRateLimiter`` counts failed logins per address over a sliding
+``window``, approximated from two fixed windows: the current window's count
+plus the previous one's, weighted by how much of it the sliding window
+still covers. That is a timestamp and two counts per address, however many
+attempts, for at most ``max_keys`` addresses (least recently failed dropped
+first; expired ones as soon as another failure comes in). Only failures
+create entries.
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from ipaddress import ip_address, ip_network
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+
+class NetworkAllowlist:
+    def __init__(self, networks: Iterable[str], cache_size: int = 4096) -> None:
+        self.networks = [ip_network(entry.strip(), strict=False) for entry in networks if entry.strip()]
+        self.cache_size = cache_size
+        by_length: Dict[Tuple[int, int], set] = {}
+        for network in self.networks:
+            shift = network.max_prefixlen - network.prefixlen
+            by_length.setdefault((network.version, shift), set()).add(int(network.network_address) >> shift)
+        # Per family: (shift, prefixes), longest prefixes first.
+        self._prefixes: Dict[int, List[Tuple[int, FrozenSet[int]]]] = {4: [], 6: []}
+        for (version, shift), prefixes in sorted(by_length.items()):
+            self._prefixes[version].append((shift, frozenset(prefixes)))
+        self._cache: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def match(self, addr: str) -> bool:
+        """Uncached check of one address."""
+        try:
+            ip = ip_address(addr)
+        except ValueError:
+            return False
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        value = int(ip)
+        return any(value >> shift in prefixes for shift, prefixes in self._prefixes[ip.version])
+
+    def allowed(self, addr: str) -> bool:
+        decision = self._cache.get(addr)
+        if decision is None:
+            decision = self.match(addr)
+            with self._lock:
+                if len(self._cache) >= self.cache_size:
+                    del self._cache[next(iter(self._cache))]
+                self._cache[addr] = decision
+        return decision
+
+
+class LoginRateLimiter:
+    def __init__(self, limit: int, window: float, max_keys: int = 4096) -> None:
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # address -> [current window start, previous window count, current window count]
+        self._counts: 'OrderedDict[str, List[float]]' = OrderedDict()
+
+    def _roll(self, entry: List[float], now: float) -> List[float]:
+        start = now - now % self.window
+        if entry[0] != start:
+            previous = entry[2] if start - entry[0] < 1.5 * self.window else 0
+            entry[:] = [start, previous, 0]
+        return entry
+
+    def _estimate(self, entry: List[float], now: float) -> float:
+        overlap = 1.0 - (now - entry[0]) / self.window
+        return entry[1] * overlap + entry[2]
+
+    def limited(self, key: str) -> bool:
+        """Whether ``key`` has used up its attempts in the last ``window`` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None:
+                return False
+            return self._estimate(self._roll(entry, now), now) >= self.limit
+
+    def hit(self, key: str) -> None:
+        """Record a failed attempt."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None:
+                entry = self._counts[key] = [now - now % self.window, 0, 0]
+            else:
+                self._counts.move_to_end(key)
+            self._roll(entry, now)[2] += 1
+            # Ordered by last failure: drop entries whose windows have both
+            # passed, then the least recent ones beyond ``max_keys``.
+            expired = now - 2 * self.window
+            while self._counts and (
+                len(self._counts) > self.max_keys or next(iter(self._counts.values()))[0] <= expired
+            ):
+                self._counts.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._counts.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._counts)
@@ -0,0 +1,190 @@
+"""
+Per-viewer, backpressure-aware quality control for the stream endpoints.
+
+Every viewer gets a ``StreamClient``. The stream generator reports how long
+each write took to drain into the socket; a write that blocks means the
+client's link (or browser) cannot keep up. The controller then lowers JPEG
+quality, and below the quality floor the scale, and raises them again once
+writes are consistently fast. Stale frames are never queued: subscribers
+always wait for the newest published frame, and frames published while a
+write was blocked are counted as dropped.
+
+Quality moves in ``QUALITY_STEP`` increments and scale along ``SCALE_LADDER``
+so viewers with similar links land on identical settings and share the
+encodings cached on ``streaming.Frame``.
+"""
+
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import Any, Dict, List
+
+import metrics
+
+QUALITY_STEP = 10
+SCALE_LADDER = (1.0, 0.75, 0.625, 0.5, 0.375, 0.25)
+
+# Exponential moving average weight for send-time and fps samples.
+EWMA_ALPHA = 0.3
+# Frames to wait after a change before stepping down / up again.
+DOWN_COOLDOWN = 3
+UP_COOLDOWN = 10
+# Step up only while writes take less than this fraction of the target.
+UP_HEADROOM = 0.3
+
+
+def snap_scale(scale: float) -> float:
+    """Smallest ladder step that still covers ``scale`` (never upscales)."""
+    for step in reversed(SCALE_LADDER):
+        if step >= scale:
+            return step
+    return SCALE_LADDER[0]
+
+
+def _ewma(current: float | None, sample: float) -> float:
+    if current is None:
+        return sample
+    return current + EWMA_ALPHA * (sample - current)
+
+
+class StreamClient:
+    def __init__(
+        self,
+        client_id: int,
+        mode: str,
+        remote_addr: str,
+        quality: int,
+        quality_min: int,
+        quality_max: int,
+        scale_min: float,
+        send_target: float,
+        adapt_scale: bool = True,
+        max_scale: float = 1.0,
+    ) -> None:
+        self.id = client_id
+        self.mode = mode
+        self.remote_addr = remote_addr
+        self.quality_min = quality_min
+        self.quality_max = max(quality_min, quality_max)
+        self.quality = self._snap_quality(quality)
+        # ``max_scale`` is what the viewer asked for (e.g. its viewport size);
+        # adaptation only ever goes below it.
+        top = snap_scale(max_scale)
+        floor = min(scale_min, top)
+        self.scales = [s for s in SCALE_LADDER if floor <= s <= top] if adapt_scale else [top]
+        self._scale_index = 0
+        self.send_target = send_target
+        self.connected_at = time.time()
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self._last_seq: int | None = None
+        self._last_sent: float | None = None
+        self._send_time: float | None = None
+        self._frame_interval: float | None = None
+        self._since_change = 0
+        self._frames_metric = metrics.STREAM_FRAMES.labels(mode)
+        self._bytes_metric = metrics.STREAM_BYTES.labels(mode)
+        self._send_metric = metrics.STREAM_SEND_SECONDS.labels(mode)
+
+    @property
+    def scale(self) -> float:
+        return self.scales[self._scale_index]
+
+    @property
+    def fps(self) -> float:
+        if not self._frame_interval:
+            return 0.0
+        return 1.0 / self._frame_interval
+
+    def _snap_quality(self, quality: int) -> int:
+        quality = round(quality / QUALITY_STEP) * QUALITY_STEP
+        return max(self.quality_min, min(self.quality_max, quality))
+
+    def frame_sent(self, seq: int, nbytes: int, send_seconds: float) -> None:
+        """Record one delivered frame and adjust quality/scale."""
+        now = time.monotonic()
+        if self._last_seq is not None and seq > self._last_seq + 1:
+            self.dropped += seq - self._last_seq - 1
+        self._last_seq = seq
+        if self._last_sent is not None:
+            self._frame_interval = _ewma(self._frame_interval, now - self._last_sent)
+        self._last_sent = now
+        self.frames += 1
+        self.bytes += nbytes
+        self._frames_metric.inc()
+        self._bytes_metric.inc(nbytes)
+        self._send_metric.observe(send_seconds)
+        self._send_time = _ewma(self._send_time, send_seconds)
+        self._since_change += 1
+        self._adjust()
+
+    def _adjust(self) -> None:
+        send_time = self._send_time or 0.0
+        if send_time > self.send_target and self._since_change >= DOWN_COOLDOWN:
+            if self.quality > self.quality_min:
+                self.quality = max(self.quality_min, self.quality - QUALITY_STEP)
+            elif self._scale_index < len(self.scales) - 1:
+                self._scale_index += 1
+            else:
+                return
+            self._since_change = 0
+        elif send_time < self.send_target * UP_HEADROOM and self._since_change >= UP_COOLDOWN:
+            if self._scale_index > 0:
+                self._scale_index -= 1
+            elif self.quality < self.quality_max:
+                self.quality = min(self.quality_max, self.quality + QUALITY_STEP)
+            else:
+                return
+            self._since_change = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'remote_addr': self.remote_addr,
+            'quality': self.quality,
+            'scale': self.scale,
+            'fps': round(self.fps, 2),
+            'send_ms': round((self._send_time or 0.0) * 1000, 1),
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'bytes': self.bytes,
+            'connected_for': round(time.time() - self.connected_at, 1),
+        }
+
+
+class ClientRegistry:
+    """Active ``StreamClient`` instances, for introspection."""
+
+    def __init__(self, quality: int, quality_min: int, quality_max: int, scale_min: float, send_target: float) -> None:
+        self._defaults = dict(
+            quality=quality,
+            quality_min=quality_min,
+            quality_max=quality_max,
+            scale_min=scale_min,
+            send_target=send_target,
+        )
+        self._clients: Dict[int, StreamClient] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def register(self, mode: str, remote_addr: str, adapt_scale: bool = True, max_scale: float = 1.0) -> StreamClient:
+        client = StreamClient(
+            next(self._ids), mode, remote_addr, adapt_scale=adapt_scale, max_scale=max_scale, **self._defaults
+        )
+        with self._lock:
+            self._clients[client.id] = client
+        return client
+
+    def unregister(self, client: StreamClient) -> None:
+        with self._lock:
+            self._clients.pop(client.id, None)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            clients = list(self._clients.values())
+        return [client.snapshot() for client in clients]
@@ -4,25 +4,182 @@ Lightweight HTTP client that proxies the Flask app to the privileged host agent.
 During Phase 2 the agent provides stubbed endpoints so the web gateway can be
 developed independently. When REMOTE_AGENT_ENABLED is false the Flask app
 falls back to in-process capture and input handling.
+
+All calls share one keep-alive ``requests.Session`` (connection pool, headers
+built once). When REMOTE_AGENT_SOCKET is set the session talks HTTP over that
+Unix domain socket instead of TCP, as planned in PHASE1_DESIGN.md.
+
+The ``*_async`` variants are for the ASGI gateway (``asgi.py``): they use one
+pooled ``httpx.AsyncClient`` so a slow agent parks a coroutine, not a thread.
+
+Both go through one ``CircuitBreaker``. A dead or hung agent would otherwise
+hold every caller (the injector, wake and health requests) for the full
+``AGENT_TIMEOUT``. After ``AGENT_BREAKER_FAILURES`` consecutive failures
+(no connection, timeout, 5xx) calls fail at once with ``AgentUnavailable``
+while a background thread polls ``/api/health``; the first answer closes the
+breaker again. ``health()`` results, errors included, are cached for
+``AGENT_HEALTH_TTL`` seconds, so dashboards polling it share one request.
 """
 
 
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
 
 import config
+import metrics
+
+try:
+    import httpx
+except Exception:  # pragma: no cover - only the ASGI gateway needs it
+    httpx = None
 
 logger = logging.getLogger(__name__)
 
+# Base URL used when talking to the agent over a Unix socket; the host part is
+# only a routing key for the mounted adapter.
+_UNIX_BASE_URL = 'http://host-agent'
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_async_client: 'httpx.AsyncClient | None' = None
+
 
 class AgentClientError(RuntimeError):
     """Raised when the host agent rejects a request."""
 
 
+class AgentUnavailable(AgentClientError):
+    """Raised without calling the agent while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a background recovery probe.
+
+    Closed, calls go through and ``failure_threshold`` failures in a row open
+    it. Open, callers get ``AgentUnavailable`` straight away and a daemon
+    thread runs ``probe`` every ``probe_interval`` seconds until it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, probe_interval: float, probe: Callable[[], Any]) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self._probe = probe
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._last_error: str | None = None
+        self.trips = 0
+        self.rejected = 0
+        self.probes = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def rejection(self) -> AgentUnavailable:
+        with self._lock:
+            self.rejected += 1
+            return AgentUnavailable(f'Agent unavailable (retrying in the background): {self._last_error}')
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._opened_at is None:
+                return
+            self._opened_at = None
+        logger.info('Host agent reachable again')
+
+    def failed(self, error: str) -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            if self._opened_at is not None or self._failures < self.failure_threshold:
+                return
+            self._opened_at = time.monotonic()
+            self.trips += 1
+            trip = self.trips
+        logger.warning('Host agent failed %d times in a row, failing fast: %s', self._failures, error)
+        threading.Thread(target=self._recover, args=(trip,), name='agent-probe', daemon=True).start()
+
+    def _recover(self, trip: int) -> None:
+        # Ends once this trip is over (a late success may close and reopen it).
+        while self._opened_at is not None and self.trips == trip:
+            time.sleep(self.probe_interval)
+            self.probes += 1
+            try:
+                self._probe()
+            except Exception as exc:
+                with self._lock:
+                    self._last_error = str(exc)
+                continue
+            self.succeeded()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            opened_at = self._opened_at
+            return {
+                'state': 'closed' if opened_at is None else 'open',
+                'failures': self._failures,
+                'threshold': self.failure_threshold,
+                'open_seconds': None if opened_at is None else round(time.monotonic() - opened_at, 1),
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'probes': self.probes,
+                'last_error': self._last_error,
+            }
+
+
+class _UnixHTTPConnection(HTTPConnection):
+    def __init__(self, socket_path: str, **kwargs: Any) -> None:
+        super().__init__('localhost', **kwargs)
+        self._socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        return sock
+
+
+class _UnixConnectionPool(HTTPConnectionPool):
+    def __init__(self, socket_path: str, maxsize: int) -> None:
+        super().__init__('localhost', maxsize=maxsize)
+        self._socket_path = socket_path
+
+    def _new_conn(self) -> _UnixHTTPConnection:
+        self.num_connections += 1
+        return _UnixHTTPConnection(self._socket_path, timeout=self.timeout.connect_timeout)
+
+
+class _UnixAdapter(HTTPAdapter):
+    def __init__(self, socket_path: str, pool_maxsize: int) -> None:
+        super().__init__()
+        self._unix_pool = _UnixConnectionPool(socket_path, maxsize=pool_maxsize)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._unix_pool
+
+    def get_connection(self, url, proxies=None):
+        return self._unix_pool
+
+    def request_url(self, request, proxies):
+        return request.path_url
+
+    def close(self) -> None:
+        self._unix_pool.close()
+        super().close()
+
+
 def _headers() -> Dict[str, str]:
     return {
         'Authorization': f'Bearer {config.AGENT_TOKEN}',
@@ -30,26 +187,153 @@ def _headers() -> Dict[str, str]:
     }
 
 
-def _request(method: str, path: str, json: Dict[str, Any] | None = None) -> Dict[str, Any]:
-    url = f'{config.AGENT_BASE_URL}{path}'
+def _base_url() -> str:
+    return _UNIX_BASE_URL if config.AGENT_SOCKET else config.AGENT_BASE_URL
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(_headers())
+                if config.AGENT_SOCKET:
+                    session.mount(f'{_UNIX_BASE_URL}/', _UnixAdapter(config.AGENT_SOCKET, config.AGENT_POOL_SIZE))
+                else:
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.AGENT_POOL_SIZE)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def close() -> None:
+    """Drop pooled connections; the next call reconnects with current config."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _get_async_client() -> 'httpx.AsyncClient':
+    global _async_client
+    if _async_client is None:
+        if httpx is None:
+            raise AgentClientError('httpx is required for async agent calls')
+        transport = httpx.AsyncHTTPTransport(uds=config.AGENT_SOCKET) if config.AGENT_SOCKET else None
+        _async_client = httpx.AsyncClient(
+            base_url=_base_url(),
+            headers=_headers(),
+            timeout=config.AGENT_TIMEOUT,
+            transport=transport,
+            limits=httpx.Limits(max_keepalive_connections=config.AGENT_POOL_SIZE),
+        )
+    return _async_client
+
+
+async def aclose() -> None:
+    """Close the async client (ASGI shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _check_breaker(path: str, guarded: bool) -> None:
+    if guarded and breaker.is_open:
+        metrics.AGENT_ERRORS.labels(path, 'breaker_open').inc()
+        raise breaker.rejection()
+
+
+def _response_error(path: str, status: int, text: str, guarded: bool) -> AgentClientError:
+    metrics.AGENT_ERRORS.labels(path, f'http_{status}').inc()
+    if guarded:
+        # 4xx: the agent is up and answering, the request was wrong.
+        if status >= 500:
+            breaker.failed(f'HTTP {status}')
+        else:
+            breaker.succeeded()
+    return AgentClientError(f'Agent error {status}: {text}')
+
+
+def _request(method: str, path: str, json: Any = None, guarded: bool = True) -> Dict[str, Any]:
+    """One agent call; ``guarded=False`` bypasses the breaker (its own probe)."""
+    _check_breaker(path, guarded)
+    url = f'{_base_url()}{path}'
+    started = time.perf_counter()
     try:
-        response = requests.request(
+        response = _get_session().request(
             method=method,
             url=url,
             json=json,
             timeout=config.AGENT_TIMEOUT,
-            headers=_headers(),
         )
     except requests.RequestException as exc:
+        metrics.AGENT_ERRORS.labels(path, 'unavailable').inc()
+        if guarded:
+            breaker.failed(str(exc))
         raise AgentClientError(f'Agent unavailable: {exc}') from exc
+    finally:
+        metrics.AGENT_REQUEST_SECONDS.labels(path).observe(time.perf_counter() - started)
 
     if not response.ok:
-        raise AgentClientError(f'Agent error {response.status_code}: {response.text}')
+        raise _response_error(path, response.status_code, response.text, guarded)
+    if guarded:
+        breaker.succeeded()
     if response.content:
         return response.json()
     return {}
 
 
+async def _request_async(method: str, path: str, json: Any = None) -> Dict[str, Any]:
+    _check_breaker(path, True)
+    started = time.perf_counter()
+    try:
+        response = await _get_async_client().request(method, path, json=json)
+    except httpx.HTTPError as exc:
+        metrics.AGENT_ERRORS.labels(path, 'unavailable').inc()
+        breaker.failed(str(exc))
+        raise AgentClientError(f'Agent unavailable: {exc}') from exc
+    finally:
+        metrics.AGENT_REQUEST_SECONDS.labels(path).observe(time.perf_counter() - started)
+
+    if not response.is_success:
+        raise _response_error(path, response.status_code, response.text, True)
+    breaker.succeeded()
+    if response.content:
+        return response.json()
+    return {}
+
+
+# (expires, result, error) of the last /api/health call; see health().
+_health: Tuple[float, Dict[str, Any] | None, AgentClientError | None] = (0.0, None, None)
+_health_lock = threading.Lock()
+
+
+def _store_health(result: Dict[str, Any] | None, error: AgentClientError | None = None) -> None:
+    global _health
+    _health = (time.monotonic() + config.AGENT_HEALTH_TTL, result, error)
+
+
+def _cached_health() -> Dict[str, Any] | None:
+    """The cached result (raising the cached error), or ``None`` once stale."""
+    expires, result, error = _health
+    if time.monotonic() >= expires:
+        return None
+    if error is not None:
+        raise type(error)(str(error))
+    return dict(result)
+
+
+def _probe_health() -> None:
+    _store_health(_request('GET', '/api/health', guarded=False))
+
+
+breaker = CircuitBreaker(config.AGENT_BREAKER_FAILURES, config.AGENT_BREAKER_PROBE, _probe_health)
+
+
 def agent_enabled() -> bool:
     return config.AGENT_ENABLED
 
@@ -60,6 +344,13 @@ def send_input(payload: Dict[str, Any]) -> Dict[str, Any]:
     return _request('POST', '/api/input', json=payload)
 
 
+def send_inputs(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Forward several input events, in order, in one round trip."""
+    if not agent_enabled():
+        raise AgentClientError('Agent not enabled')
+    return _request('POST', '/api/input/batch', json={'events': events})
+
+
 def wake_host() -> Dict[str, Any]:
     if not agent_enabled():
         raise AgentClientError('Agent not enabled')
@@ -73,6 +364,37 @@ def keep_alive() -> Dict[str, Any]:
 
 
 def health() -> Dict[str, Any]:
-    return _request('GET', '/api/health')
+    """The agent's ``/api/health``, cached for ``AGENT_HEALTH_TTL`` seconds (failures too)."""
+    cached = _cached_health()
+    if cached is not None:
+        return cached
+    with _health_lock:  # one request for everyone who missed the cache
+        cached = _cached_health()
+        if cached is not None:
+            return cached
+        try:
+            result = _request('GET', '/api/health')
+        except AgentClientError as exc:
+            _store_health(None, exc)
+            raise
+        _store_health(result)
+        return dict(result)
 
 
+async def wake_host_async() -> Dict[str, Any]:
+    if not agent_enabled():
+        raise AgentClientError('Agent not enabled')
+    return await _request_async('POST', '/api/wake', json={})
+
+
+async def health_async() -> Dict[str, Any]:
+    cached = _cached_health()
+    if cached is not None:
+        return cached
+    try:
+        result = await _request_async('GET', '/api/health')
+    except AgentClientError as exc:
+        _store_health(None, exc)
+        raise
+    _store_health(result)
+    return dict(result)
@@ -0,0 +1,117 @@
+"""
+Frame source that reads the host agent's shared-memory frame ring.
+
+In agent mode the agent owns capture and encoding (see
+``host_agent/pipeline.py``) and this gateway only attaches to its ring, so
+any number of gateway worker processes serve viewers from one capture. JPEG
+frames are handed to ``streaming.Frame`` as-is and only decoded when a
+viewer needs pixels (tiles, downscaling, another quality).
+
+Each new frame is detached from its ring slot with one copy of the payload
+(the compressed JPEG, normally tens of kilobytes): published frames outlive
+the slot, which the agent rewrites a few captures later. ``grab`` returns
+the previous frame when nothing new was published, which the producer
+treats as an unchanged screen.
+
+The producers of all views share one reader. ``close`` is called by each
+producer thread as it exits, so the reader is only detached once the last
+thread that grabbed from it has closed.
+
+The ring always carries the whole virtual screen; a ``region`` is cut out of
+it here (decoding the JPEG). The gateway need not have a display of its own,
+so the layout comes from the ring too: one screen the size of the latest
+frame at ``(0, 0)``, and regions are given in ring-frame pixels. Per-monitor
+views are not available in this mode.
+"""
+
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List
+
+import capture
+from capture import RawFrame
+from host_agent.framering import CODEC_JPEG, FrameRingReader, RingError
+
+logger = logging.getLogger(__name__)
+
+
+class AgentFrameSource:
+    def __init__(self, ring_name: str, first_frame_timeout: float = 1.0, stale_after: float = 15.0) -> None:
+        self.ring_name = ring_name
+        self.first_frame_timeout = first_frame_timeout
+        # The agent writes a keep-alive frame every few seconds; silence for
+        # longer means it restarted with a new segment under the same name.
+        self.stale_after = stale_after
+        self._reader: FrameRingReader | None = None
+        self._seq = 0
+        self._last: RawFrame | None = None
+        self._last_new = 0.0
+        self._lock = threading.RLock()  # one producer per view shares the reader
+        self._users: set = set()  # idents of producer threads that have not closed
+
+    def _attach(self) -> FrameRingReader:
+        if self._reader is None:
+            try:
+                self._reader = FrameRingReader(self.ring_name)
+            except FileNotFoundError as exc:
+                raise RingError(f'frame ring {self.ring_name!r} not found; is agent capture enabled?') from exc
+            self._seq = 0
+            self._last_new = time.monotonic()
+        return self._reader
+
+    def monitors(self) -> List[Dict[str, Any]]:
+        """The ring's screen as the only "monitor", sized by the latest frame header."""
+        with self._lock:
+            width, height = self._grab_screen().size
+        return [{'left': 0, 'top': 0, 'width': width, 'height': height}]
+
+    def grab(self, region: Dict[str, Any] | None = None) -> RawFrame:
+        with self._lock:
+            self._users.add(threading.get_ident())
+            frame = self._grab_screen()
+        if region is None or (region['width'], region['height']) == frame.size:
+            return frame
+        return capture.crop(frame, region['left'], region['top'], region['width'], region['height'])
+
+    def _grab_screen(self) -> RawFrame:
+        deadline = time.monotonic() + self.first_frame_timeout
+        while True:
+            reader = self._attach()
+            frame = reader.read(self._seq)
+            if frame is not None:
+                try:
+                    payload = reader.copy(frame)
+                except RingError:
+                    continue  # overwritten mid-copy: a newer frame is ready
+                self._seq = frame.seq
+                self._last_new = time.monotonic()
+                if frame.codec == CODEC_JPEG:
+                    self._last = RawFrame(None, frame.size, payload, frame.quality)
+                else:
+                    self._last = RawFrame(payload, frame.size)
+                return self._last
+            if time.monotonic() - self._last_new > self.stale_after:
+                logger.info('Frame ring %s went quiet; reattaching', self.ring_name)
+                self._detach()
+            if self._last is not None:
+                return self._last
+            if time.monotonic() >= deadline:
+                raise RingError(f'no frame published to {self.ring_name!r} yet')
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        """The calling producer is done; detaches once no other producer is using the ring."""
+        with self._lock:
+            self._users.discard(threading.get_ident())
+            if not self._users:
+                self._detach()
+
+    def _detach(self) -> None:
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
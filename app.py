@@ -1,15 +1,13 @@
 from __future__ import annotations
 
-import io
+import json
+import logging
+import secrets
 import subprocess
 import threading
 import time
-from collections import defaultdict
-from datetime import datetime, timedelta
-from ipaddress import ip_network, ip_address
+from typing import Callable
 
-import mss
-from PIL import Image
 from flask import (
     Flask,
     Response,
@@ -21,107 +19,115 @@ from flask import (
     session,
     url_for,
 )
-from pynput import keyboard, mouse
 
+import access
+import backends
+import capture
 import config
+import cursor
+import metrics
+import probe
+import regions
+import sources
+import tiles
+from adaptive import ClientRegistry
+from display_state import DisplayMonitor
+from encoder import StripeEncoder
+from input_queue import InputQueue, InputQueueFull, InputUnavailable, clean_event
+from keepalive import DisplayKeepAlive
+from recorder import SessionRecorder
+from regions import BroadcasterHub, ScreenLayout
+from sessions import SessionRegistry
+from streaming import FrameBroadcaster
+from tilecodec import TileCodec
+
+agent_client = None
+if config.AGENT_ENABLED:  # requests and httpx are only imported for the agent
+    try:
+        import agent_client
+    except Exception:  # pragma: no cover - agent optional
+        agent_client = None
 
 try:
-    import agent_client
-except Exception:  # pragma: no cover - agent optional
-    agent_client = None
+    from flask_sock import Sock
+except Exception:  # pragma: no cover - websocket input optional
+    Sock = None
 
 USE_AGENT = bool(config.AGENT_ENABLED and agent_client is not None)
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = config.SECRET_KEY
+sock = Sock(app) if Sock is not None else None
 
-mouse_controller = mouse.Controller()
-keyboard_controller = keyboard.Controller()
+# 'null' drops local input (headless benchmarks); agent mode forwards it instead.
+# pynput connects to the display with the first injected event (see ``backends``).
+LOCAL_INPUT = config.INPUT_BACKEND == 'pynput' and not USE_AGENT
+input_backend = backends.create_input(config.INPUT_BACKEND if not USE_AGENT else 'null')
 
-login_attempts = defaultdict(list)
+allowlist = access.NetworkAllowlist(config.ALLOWED_SUBNETS)
+login_limiter = access.LoginRateLimiter(
+    config.RATE_LIMIT_ATTEMPTS, config.RATE_LIMIT_WINDOW, max_keys=config.RATE_LIMIT_MAX_IPS
+)
 screen_lock = threading.Lock()
-active_sessions = set()
 keep_alive_running = threading.Event()
 keep_alive_running.set()
+keep_alive_thread: threading.Thread | None = None
+keep_alive_lock = threading.Lock()
 
 
 def keep_alive_worker():
     """Background thread to prevent system sleep during active sessions."""
+    keeper = DisplayKeepAlive() if not USE_AGENT else None
     while keep_alive_running.is_set():
-        if active_sessions:
+        # Sleeps without polling while nobody is connected.
+        active_sessions.wait_active()
+        if not active_sessions.active():
+            if keeper is not None:
+                keeper.release()
+            continue
+        if USE_AGENT:
             try:
-                # Try X11 DPMS keep-alive
-                subprocess.run(
-                    ['xset', 's', 'reset'],
-                    timeout=2,
-                    capture_output=True
-                )
-                # Try systemd inhibit (if available)
-                subprocess.run(
-                    ['loginctl', 'unlock-sessions'],
-                    timeout=2,
-                    capture_output=True
-                )
+                agent_client.keep_alive()
             except Exception:
                 pass
-            if USE_AGENT:
-                try:
-                    agent_client.keep_alive()
-                except Exception:
-                    pass
+        else:
+            keeper.tick()
         time.sleep(config.KEEP_ALIVE_INTERVAL)
 
 
-keep_alive_thread = threading.Thread(target=keep_alive_worker, daemon=True)
-keep_alive_thread.start()
+def start_keep_alive() -> None:
+    """Start the keep-alive thread with the first session rather than at import."""
+    global keep_alive_thread
+    with keep_alive_lock:
+        if keep_alive_thread is None:
+            keep_alive_thread = threading.Thread(target=keep_alive_worker, name='keep-alive', daemon=True)
+            keep_alive_thread.start()
 
-try:
-    with mss.mss() as sct:
-        PRIMARY_MONITOR = sct.monitors[0]
-        SCREEN_WIDTH = PRIMARY_MONITOR['width']
-        SCREEN_HEIGHT = PRIMARY_MONITOR['height']
-        SCREEN_LEFT = PRIMARY_MONITOR.get('left', 0)
-        SCREEN_TOP = PRIMARY_MONITOR.get('top', 0)
-except Exception as exc:  # pragma: no cover
-    raise RuntimeError('Unable to initialize screen capture') from exc
 
+active_sessions = SessionRegistry(
+    ttl=config.SESSION_TTL, max_sessions=config.SESSION_MAX, on_active=start_keep_alive
+)
 
-def is_ip_allowed(addr: str) -> bool:
-    try:
-        ip = ip_address(addr)
-    except ValueError:
-        return False
+if USE_AGENT and config.AGENT_FRAME_RING:
+    from agent_frames import AgentFrameSource
 
-    for network in config.ALLOWED_SUBNETS:
-        try:
-            if ip in ip_network(network.strip()):
-                return True
-        except ValueError:
-            continue
-    return False
+    frame_source = AgentFrameSource(config.AGENT_FRAME_RING)
+else:
+    frame_source = sources.create(config.FRAME_SOURCE, screen_lock)
+# Monitor geometry, read with the first lookup and re-read by the frame
+# producers (capture_view) so resolution / layout changes apply
+screen_layout = ScreenLayout(frame_source.monitors, refresh_interval=config.LAYOUT_REFRESH)
 
 
 @app.before_request
 def restrict_networks():
     remote_addr = request.remote_addr or '127.0.0.1'
-    if not is_ip_allowed(remote_addr):
+    if not allowlist.allowed(remote_addr):
         abort(403)
 
 
-def purge_attempts(ip: str) -> None:
-    window_start = datetime.utcnow() - timedelta(seconds=config.RATE_LIMIT_WINDOW)
-    login_attempts[ip] = [ts for ts in login_attempts[ip] if ts >= window_start]
-
-
-def record_attempt(ip: str) -> None:
-    login_attempts[ip].append(datetime.utcnow())
-
-
-def is_rate_limited(ip: str) -> bool:
-    purge_attempts(ip)
-    return len(login_attempts[ip]) >= config.RATE_LIMIT_ATTEMPTS
-
-
 def authenticated() -> bool:
     return session.get('authenticated', False)
 
@@ -132,7 +138,7 @@ def login():
     error = None
 
     if request.method == 'POST':
-        if is_rate_limited(remote_addr):
+        if login_limiter.limited(remote_addr):
             error = 'Too many attempts. Please wait and try again.'
         else:
             username = request.form.get('username', '').strip()
@@ -140,10 +146,12 @@ def login():
 
             if username == config.USERNAME and password == config.PASSWORD:
                 session['authenticated'] = True
-                login_attempts.pop(remote_addr, None)
+                session['sid'] = secrets.token_urlsafe(12)
+                active_sessions.touch(session['sid'])
+                login_limiter.reset(remote_addr)
                 return redirect(url_for('dashboard'))
             else:
-                record_attempt(remote_addr)
+                login_limiter.hit(remote_addr)
                 error = 'Invalid username or password.'
 
     if authenticated():
@@ -157,24 +165,172 @@ def dashboard():
     if not authenticated():
         return redirect(url_for('login'))
     # Mark session as active for keep-alive
-    session_id = session.get('_id', id(session))
-    active_sessions.add(session_id)
+    active_sessions.touch(session_key())
+    region = screen_layout.resolve(session_view())
     return render_template(
         'dashboard.html',
-        screen_width=SCREEN_WIDTH,
-        screen_height=SCREEN_HEIGHT,
+        screen_width=region['width'],
+        screen_height=region['height'],
         agent_enabled=USE_AGENT,
+        input_socket=sock is not None,
+        video_stream=video_stream(),
     )
 
 
-def capture_frame() -> bytes:
-    with screen_lock:
-        with mss.mss() as sct:
-            frame = sct.grab(PRIMARY_MONITOR)
-        image = Image.frombytes('RGB', frame.size, frame.rgb)
-        buffer = io.BytesIO()
-        image.save(buffer, format='JPEG', quality=config.IMAGE_QUALITY, optimize=True)
-        return buffer.getvalue()
+def session_view() -> str:
+    """What this session watches: ``screen``, ``monitor:N`` or ``region:...``."""
+    return session.get('view', regions.SCREEN)
+
+
+def capture_view(view: str) -> capture.RawFrame:
+    screen_layout.refresh()  # on the producer thread, at most every LAYOUT_REFRESH
+    region = screen_layout.resolve(view)
+    with metrics.CAPTURE_SECONDS.time():
+        try:
+            return frame_source.grab(region)
+        except Exception:
+            # Usually a monitor was unplugged or resized under us.
+            screen_layout.refresh(force=True)
+            raise
+
+
+def wake_display() -> None:
+    """Wake callback for the black-screen monitor (runs on its own thread)."""
+    if USE_AGENT:
+        agent_client.wake_host()
+    else:
+        run_wake_commands()
+
+
+display_monitor = DisplayMonitor(
+    wake_display,
+    stride=config.BLACK_SAMPLE_STRIDE,
+    black_after=config.BLACK_SCREEN_AFTER,
+    wake_backoff=config.WAKE_BACKOFF,
+    wake_backoff_max=config.WAKE_BACKOFF_MAX,
+    quality=config.IMAGE_QUALITY,
+) if config.BLACK_SCREEN_DETECT else None
+
+stripe_encoder = StripeEncoder(config.ENCODE_WORKERS, config.ENCODE_STRIPE_HEIGHT)
+tile_codec = TileCodec(int(config.TILE_CACHE_MB * 1024 * 1024)) if config.TILE_CODEC == 'hybrid' else None
+# Latency probe: last tagged input per session, stamped on frames; reported samples.
+input_marks = probe.InputMarks(max_sessions=config.SESSION_MAX)
+latency_stats = probe.LatencyStats(window=config.PROBE_WINDOW)
+
+
+def load_video():
+    """The ``video`` module if H.264 streaming works here, else ``None``."""
+    import video  # PyAV
+
+    return video if video.available() else None
+
+
+# H.264 viewers (/stream/video) each run their own encoder. PyAV is imported
+# when the first dashboard asks whether it is available.
+video_support = backends.Lazy(load_video)
+
+
+def video_stream() -> bool:
+    return video_support.get() is not None
+
+
+video_slots = threading.BoundedSemaphore(config.VIDEO_MAX_VIEWERS)
+
+
+def new_broadcaster(view: str, display: DisplayMonitor | None = None) -> FrameBroadcaster:
+    return FrameBroadcaster(
+        lambda: capture_view(view),
+        release=frame_source.close,
+        interval=config.CAPTURE_INTERVAL,
+        min_interval=config.CAPTURE_INTERVAL_MIN,
+        activity_boost=config.ACTIVITY_BOOST,
+        keepalive_interval=config.STREAM_KEEPALIVE_INTERVAL,
+        sample_stride=config.CHANGE_SAMPLE_STRIDE,
+        quality=config.IMAGE_QUALITY,
+        stall_timeout=config.STREAM_STALL_TIMEOUT,
+        tile_size=config.TILE_SIZE,
+        encoder=stripe_encoder,
+        display=display,
+        tile_codec=tile_codec,
+        input_marks=input_marks.snapshot,
+    )
+
+
+# The whole-screen producer also drives black-screen detection and recording;
+# monitor / region views get their own producers on demand.
+broadcaster = new_broadcaster(regions.SCREEN, display_monitor)
+broadcasters = BroadcasterHub(broadcaster, new_broadcaster, max_views=config.MAX_VIEWS)
+
+recorder = SessionRecorder(
+    broadcaster,
+    active_sessions,
+    config.RECORD_DIR,
+    quality=config.RECORD_QUALITY,
+    interval=config.RECORD_INTERVAL,
+    keyframe_interval=config.RECORD_KEYFRAME,
+) if config.RECORD_DIR else None
+if recorder is not None:
+    recorder.start()
+
+
+def new_cursor_tracker() -> cursor.CursorTracker | None:
+    pointer = cursor.create_probe(config.CURSOR_BACKEND, input_backend.position if LOCAL_INPUT else None)
+    return cursor.CursorTracker(
+        pointer,
+        interval=config.CURSOR_INTERVAL,
+        idle_interval=config.CURSOR_IDLE_INTERVAL,
+    ) if pointer is not None else None
+
+
+# Host pointer position / shape, pushed separately from frames (/stream/cursor);
+# the probe opens its display connection with the first subscriber.
+cursor_channel = backends.Lazy(new_cursor_tracker)
+
+
+def cursor_tracker() -> cursor.CursorTracker | None:
+    """The cursor channel, or ``None`` when no probe works here."""
+    try:
+        return cursor_channel.get()
+    except Exception:
+        return None
+
+
+stream_clients = ClientRegistry(
+    quality=config.IMAGE_QUALITY,
+    quality_min=config.ADAPTIVE_QUALITY_MIN,
+    quality_max=config.ADAPTIVE_QUALITY_MAX,
+    scale_min=config.ADAPTIVE_SCALE_MIN,
+    send_target=config.ADAPTIVE_SEND_TARGET,
+)
+
+
+def requested_scale(args=None, region=None) -> float:
+    """Scale asked for via ``?scale=`` or a ``?width=``/``?height=`` viewport."""
+    args = request.args if args is None else args
+    region = region or screen_layout.screen
+    try:
+        if 'scale' in args:
+            return clamp_ratio(float(args['scale'])) or 1.0
+        scales = [
+            float(args[name]) / full
+            for name, full in (('width', region['width']), ('height', region['height']))
+            if name in args and float(args[name]) > 0
+        ]
+    except ValueError:
+        return 1.0
+    return clamp_ratio(max(scales)) if scales else 1.0
+
+
+def mjpeg_part(frame, data: bytes, session_id: str) -> bytes:
+    """One ``/stream`` part: ``data`` plus the frame's stamps for the latency probe."""
+    headers = (
+        f'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n'
+        f'X-Frame-Seq: {frame.seq}\r\nX-Frame-Time: {frame.timestamp:.6f}\r\n'
+    )
+    mark = frame.inputs.get(session_id)
+    if mark is not None:
+        headers += f'X-Input-Id: {mark.input_id}\r\nX-Input-Time: {mark.sent:.3f}\r\n'
+    return (headers + '\r\n').encode() + data + b'\r\n'
 
 
 @app.route('/stream')
@@ -182,70 +338,273 @@ def stream():
     if not authenticated():
         return abort(401)
     
-    # Mark session as active
-    session_id = session.get('_id', id(session))
-    active_sessions.add(session_id)
+    session_id = session_key()
+    view = session_view()
+    try:
+        source = broadcasters.get(view)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 503
+    client = stream_clients.register(
+        'mjpeg',
+        request.remote_addr or '127.0.0.1',
+        max_scale=requested_scale(region=screen_layout.resolve(view)),
+    )
 
     def generate():
-        while True:
-            try:
-                frame = capture_frame()
-                active_sessions.add(session_id)  # Keep session active
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                time.sleep(config.CAPTURE_INTERVAL)
-            except Exception:
-                break
-        active_sessions.discard(session_id)
+        active_sessions.open_stream(session_id)
+        try:
+            with source.subscribe() as subscription:
+                for frame in subscription:
+                    chunk = mjpeg_part(frame, frame.jpeg(client.quality, client.scale), session_id)
+                    started = time.monotonic()
+                    yield chunk
+                    client.frame_sent(frame.seq, len(chunk), time.monotonic() - started)
+        finally:
+            stream_clients.unregister(client)
+            active_sessions.close_stream(session_id)
 
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+@app.route('/stream/tiles')
+def stream_tiles():
+    if not authenticated():
+        return abort(401)
+
+    session_id = session_key()
+    try:
+        source = broadcasters.get(session_view())
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 503
+    client = stream_clients.register('tiles', request.remote_addr or '127.0.0.1', adapt_scale=False)
+
+    def generate():
+        active_sessions.open_stream(session_id)
+        try:
+            with source.subscribe(tiles=True) as subscription:
+                for packet in tiles.stream_updates(
+                    source, subscription, config.TILE_KEYFRAME_INTERVAL, client, session_id
+                ):
+                    yield packet
+        finally:
+            stream_clients.unregister(client)
+            active_sessions.close_stream(session_id)
+
+    return Response(
+        generate(),
+        mimetype='application/octet-stream',
+        headers={'Cache-Control': 'no-store', 'X-Content-Type-Options': 'nosniff'},
+    )
+
+
+def video_viewer_release(client) -> Callable[[], None]:
+    """Gives back an acquired ``video_slots`` slot and unregisters ``client``, once.
+
+    Called from the response's close hook as well as the stream itself: a
+    response whose body is never iterated never runs its generator.
+    """
+    done = threading.Lock()
+
+    def release() -> None:
+        if done.acquire(blocking=False):
+            video_slots.release()
+            stream_clients.unregister(client)
+
+    return release
+
+
+def new_video_encoder(region: dict, scale: float) -> video.VideoEncoder:
+    video = video_support.get()
+    return video.VideoEncoder(
+        video.scaled_size((region['width'], region['height']), scale),
+        bitrate=config.VIDEO_BITRATE,
+        keyframe_interval=config.VIDEO_KEYFRAME_INTERVAL,
+        frame_duration=config.CAPTURE_INTERVAL_MIN,
+        preset=config.VIDEO_PRESET,
+    )
+
+
+@app.route('/stream/video')
+def stream_video():
+    """H.264 in fragmented MP4 for Media Source Extensions (see ``video``).
+
+    The response ends when the view changes size; the dashboard reconnects
+    and gets a new init segment.
+    """
+    if not authenticated():
+        return abort(401)
+    if not video_stream():
+        return jsonify({'error': 'H.264 streaming unavailable'}), 501
+
+    session_id = session_key()
+    view = session_view()
+    try:
+        source = broadcasters.get(view)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 503
+    if not video_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many video viewers'}), 503
+    region = screen_layout.resolve(view)
+    try:
+        encoder = new_video_encoder(region, requested_scale(region=region))
+    except Exception as exc:
+        video_slots.release()
+        return jsonify({'error': f'H.264 encoder unavailable: {exc}'}), 501
+    client = stream_clients.register('h264', request.remote_addr or '127.0.0.1', adapt_scale=False)
+    release = video_viewer_release(client)
+
+    def generate():
+        active_sessions.open_stream(session_id)
+        try:
+            yield encoder.init_segment
+            with source.subscribe() as subscription:
+                for frame in subscription:
+                    if frame.display_asleep:
+                        chunk = encoder.repeat()
+                    elif frame.size != (region['width'], region['height']):
+                        return
+                    else:
+                        chunk = encoder.encode(frame.raw)
+                    started = time.monotonic()
+                    yield chunk
+                    client.frame_sent(frame.seq, len(chunk), time.monotonic() - started)
+        finally:
+            release()
+            active_sessions.close_stream(session_id)
+
+    response = Response(
+        generate(),
+        mimetype='video/mp4',
+        headers={'Cache-Control': 'no-store', 'X-Content-Type-Options': 'nosniff', 'X-Video-Codec': encoder.codec},
+    )
+    response.call_on_close(release)
+    return response
+
+
+@app.route('/stream/cursor')
+def stream_cursor():
+    """Server-sent events with the host cursor position (and shape) in this session's view."""
+    if not authenticated():
+        return abort(401)
+    tracker = cursor_tracker()
+    if tracker is None:
+        return jsonify({'error': 'Cursor channel unavailable'}), 404
+
+    view = session_view()
+    feed = cursor.CursorFeed(lambda: screen_layout.resolve(view))
+
+    def generate():
+        with tracker.subscribe() as subscription:
+            for state in subscription:
+                yield feed.event(state)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/api/stream/clients')
+def stream_client_stats():
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    tracker = cursor_tracker() if cursor_channel.created else None
+    return jsonify({
+        'capture_interval': broadcaster.current_interval,
+        'subscribers': broadcaster.subscribers,
+        'views': {
+            view: {'subscribers': source.subscribers, 'capture_interval': source.current_interval}
+            for view, source in broadcasters.all().items()
+        },
+        'clients': stream_clients.snapshot(),
+        'sessions': active_sessions.snapshot(),
+        'recording': recorder.status() if recorder is not None else None,
+        'cursor_subscribers': tracker.subscribers if tracker is not None else 0,
+        'tile_cache': tile_codec.stats() if tile_codec is not None else None,
+    })
+
+
+@app.route('/api/monitors')
+def list_monitors():
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    view = session_view()
+    return jsonify({
+        'monitors': screen_layout.describe(),
+        'layout_version': screen_layout.version,
+        'view': view,
+        'region': screen_layout.resolve(view),
+    })
+
+
+@app.route('/api/view', methods=['POST'])
+def select_view():
+    """Choose what this session streams: ``{"monitor": N}``, ``{"region": {...}}`` or ``{}``."""
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        view = regions.parse_view(request.get_json(silent=True))
+    except (KeyError, TypeError, ValueError) as exc:
+        return jsonify({'error': f'invalid view: {exc}'}), 400
+    if view.startswith('monitor:') and int(view.split(':')[1]) >= len(screen_layout.monitors()):
+        return jsonify({'error': 'no such monitor'}), 400
+    session['view'] = view
+    active_sessions.touch(session_key())
+    return jsonify({'view': view, 'region': screen_layout.resolve(view)})
+
+
+@app.route('/api/display/state')
+def display_state():
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    if display_monitor is None:
+        return jsonify({'state': 'unknown'})
+    return jsonify(display_monitor.state())
+
+
 def clamp_ratio(value: float) -> float:
     return max(0.0, min(1.0, value))
 
 
-MOUSE_BUTTON_MAP = {
-    'left': mouse.Button.left,
-    'right': mouse.Button.right,
-    'middle': mouse.Button.middle,
-}
+MOUSE_BUTTONS = frozenset({'left', 'right', 'middle'})
 
+# Values are pynput ``Key`` names or the character itself (see ``backends``).
 SPECIAL_KEYS = {
-    'enter': keyboard.Key.enter,
-    'esc': keyboard.Key.esc,
-    'escape': keyboard.Key.esc,
-    'tab': keyboard.Key.tab,
-    'backspace': keyboard.Key.backspace,
-    'delete': keyboard.Key.delete,
-    'space': keyboard.Key.space,
-    'shift': keyboard.Key.shift,
-    'ctrl': keyboard.Key.ctrl,
-    'alt': keyboard.Key.alt,
-    'cmd': keyboard.Key.cmd,
-    'win': keyboard.Key.cmd,
-    'meta': keyboard.Key.cmd,
-    'up': keyboard.Key.up,
-    'down': keyboard.Key.down,
-    'left': keyboard.Key.left,
-    'right': keyboard.Key.right,
-    'home': keyboard.Key.home,
-    'end': keyboard.Key.end,
-    'pageup': keyboard.Key.page_up,
-    'pagedown': keyboard.Key.page_down,
+    'enter': 'enter',
+    'esc': 'esc',
+    'escape': 'esc',
+    'tab': 'tab',
+    'backspace': 'backspace',
+    'delete': 'delete',
+    'space': 'space',
+    'shift': 'shift',
+    'ctrl': 'ctrl',
+    'alt': 'alt',
+    'cmd': 'cmd',
+    'win': 'cmd',
+    'meta': 'cmd',
+    'up': 'up',
+    'down': 'down',
+    'left': 'left',
+    'right': 'right',
+    'home': 'home',
+    'end': 'end',
+    'pageup': 'page_up',
+    'pagedown': 'page_down',
 }
 
 CODE_KEY_MAP = {
-    'space': keyboard.Key.space,
-    'shiftleft': keyboard.Key.shift,
-    'shiftright': keyboard.Key.shift,
-    'controlleft': keyboard.Key.ctrl,
-    'controlright': keyboard.Key.ctrl,
-    'altleft': keyboard.Key.alt,
-    'altright': keyboard.Key.alt,
-    'metaleft': keyboard.Key.cmd,
-    'metaright': keyboard.Key.cmd,
-    'contextmenu': keyboard.Key.menu,
+    'space': 'space',
+    'shiftleft': 'shift',
+    'shiftright': 'shift',
+    'controlleft': 'ctrl',
+    'controlright': 'ctrl',
+    'altleft': 'alt',
+    'altright': 'alt',
+    'metaleft': 'cmd',
+    'metaright': 'cmd',
+    'contextmenu': 'menu',
     'digit0': '0',
     'digit1': '1',
     'digit2': '2',
@@ -286,10 +645,15 @@ CODE_KEY_MAP = {
 
 
 def to_screen_coords(payload: dict) -> tuple[int, int]:
+    """Absolute pixel position for ``x``/``y`` in 0..1 of the whole virtual screen.
+
+    ``dispatch_batch`` has already mapped them from the session's view.
+    """
+    screen = screen_layout.screen
     x_ratio = clamp_ratio(float(payload.get('x', 0)))
     y_ratio = clamp_ratio(float(payload.get('y', 0)))
-    x = int(x_ratio * SCREEN_WIDTH) + SCREEN_LEFT
-    y = int(y_ratio * SCREEN_HEIGHT) + SCREEN_TOP
+    x = int(x_ratio * screen['width']) + screen['left']
+    y = int(y_ratio * screen['height']) + screen['top']
     return x, y
 
 
@@ -297,21 +661,19 @@ def handle_mouse_event(payload: dict) -> None:
     action = payload.get('action')
 
     if action == 'move':
-        mouse_controller.position = to_screen_coords(payload)
+        input_backend.move(*to_screen_coords(payload))
         return
 
     if action == 'click':
-        button = MOUSE_BUTTON_MAP.get(payload.get('button', 'left'))
-        if button is None:
+        button = payload.get('button', 'left')
+        if button not in MOUSE_BUTTONS:
             return
-        count = 2 if payload.get('double') else 1
-        for _ in range(count):
-            mouse_controller.click(button, 1)
+        input_backend.click(button, 2 if payload.get('double') else 1)
         return
 
     if action == 'scroll':
         delta_y = float(payload.get('deltaY', 0))
-        mouse_controller.scroll(0, -delta_y)
+        input_backend.scroll(0, -delta_y)
         return
 
 
@@ -348,12 +710,12 @@ def handle_keyboard_event(payload: dict) -> None:
     event_type = payload.get('eventType', 'press')
 
     if event_type == 'down':
-        keyboard_controller.press(key_obj)
+        input_backend.press(key_obj)
     elif event_type == 'up':
-        keyboard_controller.release(key_obj)
+        input_backend.release(key_obj)
     else:
-        keyboard_controller.press(key_obj)
-        keyboard_controller.release(key_obj)
+        input_backend.press(key_obj)
+        input_backend.release(key_obj)
 
 
 def run_wake_commands() -> bool:
@@ -378,26 +740,29 @@ def run_wake_commands() -> bool:
 def aggressive_wake_input():
     """Perform aggressive mouse/keyboard movements to wake display."""
     import random
-    center_x, center_y = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2
+    if not LOCAL_INPUT:
+        return
+    screen = screen_layout.screen
+    center_x, center_y = screen['width'] // 2, screen['height'] // 2
     
     # Move mouse in a small pattern
     for offset in [(0, 0), (5, 5), (-5, -5), (0, 0)]:
         try:
-            mouse_controller.position = (
-                center_x + offset[0] + SCREEN_LEFT,
-                center_y + offset[1] + SCREEN_TOP
+            input_backend.move(
+                center_x + offset[0] + screen['left'],
+                center_y + offset[1] + screen['top']
             )
             time.sleep(0.05)
         except Exception:
             pass
     
     # Press and release multiple keys
-    wake_keys = [keyboard.Key.shift, keyboard.Key.ctrl, keyboard.Key.space]
+    wake_keys = ['shift', 'ctrl', 'space']
     for key in wake_keys:
         try:
-            keyboard_controller.press(key)
+            input_backend.press(key)
             time.sleep(0.02)
-            keyboard_controller.release(key)
+            input_backend.release(key)
             time.sleep(0.02)
         except Exception:
             continue
@@ -408,10 +773,13 @@ def wake_host():
     if not authenticated():
         return jsonify({'error': 'Unauthorized'}), 401
 
+    broadcasters.notify_activity()
     if USE_AGENT:
         try:
             result = agent_client.wake_host()
             return jsonify(result)
+        except agent_client.AgentUnavailable as exc:
+            return jsonify({'error': str(exc)}), 503
         except Exception as exc:
             return jsonify({'error': str(exc)}), 502
 
@@ -453,24 +821,20 @@ def agent_health():
     if not USE_AGENT:
         return jsonify({'status': 'disabled'}), 200
     try:
-        result = agent_client.health()
-        return jsonify(result)
+        result, status = agent_client.health(), 200
+    except agent_client.AgentUnavailable as exc:
+        result, status = {'status': 'unavailable', 'detail': str(exc)}, 503
     except Exception as exc:
-        return jsonify({'status': 'error', 'detail': str(exc)}), 502
-
+        result, status = {'status': 'error', 'detail': str(exc)}, 502
+    return jsonify({**result, 'breaker': agent_client.breaker.snapshot()}), status
 
-@app.route('/api/input', methods=['POST'])
-def receive_input():
-    if not authenticated():
-        return jsonify({'error': 'Unauthorized'}), 401
 
-    payload = request.get_json(silent=True) or {}
+def dispatch_input(payload: dict) -> dict:
+    """Apply one input event locally or forward it to the agent."""
     if USE_AGENT:
-        try:
-            result = agent_client.send_input(payload)
-            return jsonify(result)
-        except Exception as exc:
-            return jsonify({'error': str(exc)}), 502
+        return agent_client.send_input(payload)
+    if not LOCAL_INPUT:
+        return {'status': 'ignored'}
 
     event_type = payload.get('type')
 
@@ -479,13 +843,201 @@ def receive_input():
     elif event_type == 'keyboard':
         handle_keyboard_event(payload)
 
-    return jsonify({'status': 'ok'})
+    return {'status': 'ok'}
+
+
+def apply_events(events: list) -> None:
+    """Injector-thread callback: apply one session's pending events in order."""
+    with metrics.INPUT_APPLY_SECONDS.time():
+        if recorder is not None:
+            # Recording must never cost the user their input.
+            try:
+                recorder.record_input(events)
+            except Exception as exc:
+                metrics.INPUT_RECORD_ERRORS.inc()
+                logger.warning('Recording %d input events failed: %s', len(events), exc)
+        if USE_AGENT:
+            agent_client.send_inputs(events)
+            return
+        # One failing event must not drop the rest, e.g. the key-up after it.
+        for payload in events:
+            try:
+                dispatch_input(payload)
+            except Exception as exc:
+                metrics.INPUT_EVENT_ERRORS.inc()
+                logger.warning('Input event %r failed: %s', payload.get('type'), exc)
+
+
+def events_applied(session_id: str, events: list) -> None:
+    """Injector callback after a batch went through.
+
+    The capture boost starts here rather than when the events are queued: a
+    capture woken before the injection cannot show it, and the next one
+    would only come ``CAPTURE_INTERVAL_MIN`` later.
+    """
+    input_marks.applied(session_id, events)
+    broadcasters.notify_activity()
+
+
+input_queue = InputQueue(apply_events, max_depth=config.INPUT_QUEUE_MAX, on_applied=events_applied)
+
+
+def session_key() -> str:
+    """Stable random id for the current browser session."""
+    sid = session.get('sid')
+    if sid is None:
+        sid = session['sid'] = secrets.token_urlsafe(12)
+    return sid
+
+
+def view_events(events: list, view: str) -> list:
+    """Map pointer positions from 0..1 of ``view`` to 0..1 of the whole screen."""
+    region, screen = screen_layout.resolve(view), screen_layout.screen
+    mapped = []
+    for payload in events:
+        if 'x' in payload and 'y' in payload:  # floats already (``clean_event``)
+            x, y = regions.view_to_screen(payload['x'], payload['y'], region, screen)
+            payload = dict(payload, x=x, y=y)
+        mapped.append(payload)
+    return mapped
+
+
+def dispatch_batch(session_id: str, events, channel: str = 'http', view: str = regions.SCREEN) -> dict:
+    """Queue a list of input events (positions relative to ``view``) for the injector thread."""
+    with metrics.INPUT_REQUEST_SECONDS.labels(channel).time():
+        if not isinstance(events, list):
+            metrics.INPUT_REJECTED.labels('invalid').inc()
+            raise ValueError('events must be a list')
+        if len(events) > config.INPUT_BATCH_MAX:
+            metrics.INPUT_REJECTED.labels('too_large').inc()
+            raise ValueError(f'at most {config.INPUT_BATCH_MAX} events per batch')
+        if USE_AGENT and agent_client.breaker.is_open:
+            # Queued events would only wait for the agent to fail them one batch at a time.
+            metrics.INPUT_REJECTED.labels('agent_unavailable').inc()
+            raise InputUnavailable('Host agent unavailable')
+        cleaned = [clean_event(payload) for payload in events]
+        events = [payload for payload in cleaned if payload is not None]
+        if len(events) < len(cleaned):
+            metrics.INPUT_REJECTED.labels('invalid_event').inc(len(cleaned) - len(events))
+        if view != regions.SCREEN:
+            events = view_events(events, view)
+        active_sessions.touch(session_id)
+        # Not worth connecting the cursor probe for; nobody watches it yet.
+        tracker = cursor_tracker() if cursor_channel.created else None
+        if tracker is not None:
+            tracker.notify_activity()
+        try:
+            depth = input_queue.submit(session_id, events)
+        except InputQueueFull:
+            metrics.INPUT_REJECTED.labels('queue_full').inc()
+            raise
+        metrics.INPUT_EVENTS.labels(channel).inc(len(events))
+        return {'status': 'queued', 'count': len(events), 'depth': depth}
+
+
+@app.route('/api/input', methods=['POST'])
+def receive_input():
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        return jsonify(dispatch_batch(session_key(), [payload], view=session_view()))
+    except InputQueueFull as exc:
+        return jsonify({'error': str(exc)}), 429
+    except InputUnavailable as exc:
+        return jsonify({'error': str(exc)}), 503
+
+
+@app.route('/api/input/batch', methods=['POST'])
+def receive_input_batch():
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    body = request.get_json(silent=True) or {}
+    try:
+        return jsonify(
+            dispatch_batch(session_key(), body.get('events', []), channel='batch', view=session_view())
+        )
+    except InputQueueFull as exc:
+        return jsonify({'error': str(exc)}), 429
+    except InputUnavailable as exc:
+        return jsonify({'error': str(exc)}), 503
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+
+@app.route('/api/input/stats')
+def input_stats():
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(input_queue.stats())
+
+
+@app.route('/api/latency', methods=['GET', 'POST'])
+def latency():
+    """Latency probe: the host clock (for the client's offset estimate) and
+    percentiles of reported samples; POST ``{"samples": {kind: [seconds, ...]}}`` adds some.
+    """
+    if not authenticated():
+        return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        samples = body.get('samples') if isinstance(body, dict) else None
+        if not isinstance(samples, dict):
+            return jsonify({'error': 'samples must be an object'}), 400
+        return jsonify({'accepted': latency_stats.add(samples)})
+    return jsonify({'server_time': time.time(), 'latency': latency_stats.summary()})
+
+
+if sock is not None:
+    @sock.route('/ws/input')
+    def input_socket(ws):
+        """Long-lived input channel: each message is a JSON array of events."""
+        if not authenticated():
+            ws.close(reason=1008, message='Unauthorized')
+            return
+        session_id = session_key()
+        view = session_view()  # the dashboard reconnects after changing it
+        while True:
+            message = ws.receive()
+            if message is None:
+                return
+            try:
+                events = json.loads(message)
+                if isinstance(events, dict):
+                    events = [events]
+                dispatch_batch(session_id, events, channel='ws', view=view)
+            except (ValueError, InputQueueFull, InputUnavailable) as exc:
+                ws.send(json.dumps({'error': str(exc)}))
+
+
+metrics.STREAM_SUBSCRIBERS.set_function(
+    lambda: sum(source.subscribers for source in broadcasters.all().values())
+)
+metrics.CAPTURE_INTERVAL.set_function(lambda: broadcaster.current_interval)
+metrics.INPUT_QUEUE_DEPTH.set_function(lambda: input_queue.depth)
+if USE_AGENT:
+    metrics.AGENT_BREAKER_OPEN.set_function(lambda: int(agent_client.breaker.is_open))
+metrics.STREAM_CLIENT_FPS.set_function(
+    lambda: {(client['id'], client['mode']): client['fps'] for client in stream_clients.snapshot()}
+)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: a logged-in session or the metrics bearer token."""
+    token = config.METRICS_TOKEN
+    bearer = request.headers.get('Authorization', '')
+    if not authenticated() and not (token and secrets.compare_digest(bearer, f'Bearer {token}')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
 
 
 @app.route('/logout')
 def logout():
-    session_id = session.get('_id', id(session))
-    active_sessions.discard(session_id)
+    if 'sid' in session:
+        active_sessions.discard(session['sid'])
     session.clear()
     return redirect(url_for('login'))
 
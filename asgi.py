@@ -0,0 +1,381 @@
+"""
+Asyncio (ASGI) serving mode for the gateway: ``uvicorn asgi:app`` (or
+``python asgi.py``, ``REMOTE_DESKTOP_SERVER=asgi ./run_server.sh``).
+
+Under ``app.run(threaded=True)`` every viewer pins a thread for as long as it
+watches, and every in-flight request (including agent calls, up to
+``AGENT_TIMEOUT``) another. Here the hot routes run on one event loop:
+
+* ``/stream`` and ``/stream/tiles`` are async generators over the shared
+  frame producer (``async for`` on a subscription: one loop wake-up per
+  published frame, however many viewers wait). Encodes no viewer has paid
+  for yet and tile packets are built in the bounded threadpool; the socket
+  write applies backpressure, so each viewer holds at most one chunk;
+* ``/stream/video`` (H.264, fragmented MP4) the same, each viewer encoding
+  on the threadpool with its own encoder;
+* ``/stream/cursor`` server-sent events wait on the cursor tracker the same way;
+* ``/api/input``, ``/api/input/batch`` and the ``/ws/input`` WebSocket queue
+  events for the same injector thread as the Flask routes (validating and
+  mapping them to screen coordinates on the threadpool);
+* in agent mode ``/api/host/wake`` and ``/api/agent/health`` await the agent
+  through ``agent_client``'s async ``httpx`` client.
+
+Everything else (login, dashboard, stats, metrics) is the unchanged Flask
+app mounted through WSGI. Sessions are the Flask session cookie, verified
+with the app's own signing serializer, so both halves see the same login.
+At most ``REMOTE_DESKTOP_MAX_VIEWERS`` streams are served at once.
+"""
+
+
+from __future__ import annotations
+
+import contextlib
+import json
+import time
+from typing import Any, Dict
+
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+import app as gateway
+import config
+import cursor
+import regions
+import tiles
+from input_queue import InputQueueFull, InputUnavailable
+
+_flask = gateway.app
+_serializer = _flask.session_interface.get_signing_serializer(_flask)
+_session_max_age = int(_flask.permanent_session_lifetime.total_seconds())
+_viewers = 0
+
+_STREAM_HEADERS = {'Cache-Control': 'no-store', 'X-Content-Type-Options': 'nosniff'}
+
+
+def flask_session(connection: HTTPConnection) -> Dict[str, Any]:
+    """The Flask session of this request (empty when missing or forged)."""
+    cookie = connection.cookies.get(_flask.config['SESSION_COOKIE_NAME'])
+    if not cookie or _serializer is None:
+        return {}
+    try:
+        return _serializer.loads(cookie, max_age=_session_max_age)
+    except BadSignature:
+        return {}
+
+
+def remote_addr(connection: HTTPConnection) -> str:
+    return connection.client.host if connection.client else '127.0.0.1'
+
+
+async def json_body(request: Request) -> Any:
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def view_of(session: Dict[str, Any]) -> str:
+    return session.get('view', regions.SCREEN)
+
+
+def unauthorized() -> JSONResponse:
+    return JSONResponse({'error': 'Unauthorized'}, status_code=401)
+
+
+def admit_viewer() -> Response | None:
+    if _viewers >= config.MAX_VIEWERS:
+        return PlainTextResponse('Too many viewers', status_code=503, headers={'Retry-After': '5'})
+    return None
+
+
+@contextlib.contextmanager
+def viewing(session_id: str, client):
+    global _viewers
+    _viewers += 1
+    gateway.active_sessions.open_stream(session_id)
+    try:
+        yield
+    finally:
+        _viewers -= 1
+        gateway.stream_clients.unregister(client)
+        gateway.active_sessions.close_stream(session_id)
+
+
+async def stream(request: Request) -> Response:
+    session = flask_session(request)
+    if not session.get('authenticated'):
+        return Response(status_code=401)
+    rejected = admit_viewer()
+    if rejected is not None:
+        return rejected
+
+    session_id = session.get('sid') or remote_addr(request)
+    view = view_of(session)
+    try:
+        source = gateway.broadcasters.get(view)
+    except ValueError as exc:
+        return JSONResponse({'error': str(exc)}, status_code=503)
+    client = gateway.stream_clients.register(
+        'mjpeg',
+        remote_addr(request),
+        max_scale=gateway.requested_scale(request.query_params, gateway.screen_layout.resolve(view)),
+    )
+
+    async def generate():
+        with viewing(session_id, client), source.subscribe() as subscription:
+            async for frame in subscription:
+                data = frame.cached_jpeg(client.quality, client.scale)
+                if data is None:
+                    data = await run_in_threadpool(frame.jpeg, client.quality, client.scale)
+                chunk = gateway.mjpeg_part(frame, data, session_id)
+                started = time.monotonic()
+                yield chunk
+                client.frame_sent(frame.seq, len(chunk), time.monotonic() - started)
+
+    return StreamingResponse(generate(), media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+async def stream_tiles(request: Request) -> Response:
+    session = flask_session(request)
+    if not session.get('authenticated'):
+        return Response(status_code=401)
+    rejected = admit_viewer()
+    if rejected is not None:
+        return rejected
+
+    session_id = session.get('sid') or remote_addr(request)
+    try:
+        source = gateway.broadcasters.get(view_of(session))
+    except ValueError as exc:
+        return JSONResponse({'error': str(exc)}, status_code=503)
+    client = gateway.stream_clients.register('tiles', remote_addr(request), adapt_scale=False)
+    updates = tiles.TileUpdates(source, config.TILE_KEYFRAME_INTERVAL, client, session_id)
+
+    async def generate():
+        with viewing(session_id, client), source.subscribe(tiles=True) as subscription:
+            async for frame in subscription:
+                packet = await run_in_threadpool(updates.packet, frame)
+                started = time.monotonic()
+                yield packet
+                client.frame_sent(frame.seq, len(packet), time.monotonic() - started)
+
+    return StreamingResponse(generate(), media_type='application/octet-stream', headers=_STREAM_HEADERS)
+
+
+async def stream_video(request: Request) -> Response:
+    session = flask_session(request)
+    if not session.get('authenticated'):
+        return Response(status_code=401)
+    if not await run_in_threadpool(gateway.video_stream):  # the first call imports PyAV
+        return JSONResponse({'error': 'H.264 streaming unavailable'}, status_code=501)
+    rejected = admit_viewer()
+    if rejected is not None:
+        return rejected
+
+    session_id = session.get('sid') or remote_addr(request)
+    view = view_of(session)
+    try:
+        source = gateway.broadcasters.get(view)
+    except ValueError as exc:
+        return JSONResponse({'error': str(exc)}, status_code=503)
+    if not gateway.video_slots.acquire(blocking=False):
+        return JSONResponse({'error': 'Too many video viewers'}, status_code=503)
+    region = gateway.screen_layout.resolve(view)
+    try:
+        encoder = await run_in_threadpool(
+            gateway.new_video_encoder, region, gateway.requested_scale(request.query_params, region)
+        )
+    except Exception as exc:
+        gateway.video_slots.release()
+        return JSONResponse({'error': f'H.264 encoder unavailable: {exc}'}, status_code=501)
+    client = gateway.stream_clients.register('h264', remote_addr(request), adapt_scale=False)
+    release = gateway.video_viewer_release(client)
+
+    async def generate():
+        try:
+            with viewing(session_id, client), source.subscribe() as subscription:
+                yield encoder.init_segment
+                async for frame in subscription:
+                    if frame.display_asleep:
+                        chunk = await run_in_threadpool(encoder.repeat)
+                    elif frame.size != (region['width'], region['height']):
+                        return
+                    else:
+                        chunk = await run_in_threadpool(encoder.encode, frame.raw)
+                    started = time.monotonic()
+                    yield chunk
+                    client.frame_sent(frame.seq, len(chunk), time.monotonic() - started)
+        finally:
+            release()
+
+    # The background task also runs when the client left before the body started.
+    return StreamingResponse(
+        generate(),
+        media_type='video/mp4',
+        headers={**_STREAM_HEADERS, 'X-Video-Codec': encoder.codec},
+        background=BackgroundTask(release),
+    )
+
+
+async def stream_cursor(request: Request) -> Response:
+    session = flask_session(request)
+    if not session.get('authenticated'):
+        return Response(status_code=401)
+    tracker = await run_in_threadpool(gateway.cursor_tracker)  # the first call opens the display
+    if tracker is None:
+        return JSONResponse({'error': 'Cursor channel unavailable'}, status_code=404)
+    view = view_of(session)
+    feed = cursor.CursorFeed(lambda: gateway.screen_layout.resolve(view))
+
+    async def generate():
+        with tracker.subscribe() as subscription:
+            async for state in subscription:
+                yield feed.event(state)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def receive_input(request: Request) -> Response:
+    session = flask_session(request)
+    if not session.get('authenticated'):
+        return unauthorized()
+    payload = await json_body(request) or {}
+    try:
+        return JSONResponse(
+            await run_in_threadpool(
+                gateway.dispatch_batch, session.get('sid') or remote_addr(request), [payload], view=view_of(session)
+            )
+        )
+    except InputQueueFull as exc:
+        return JSONResponse({'error': str(exc)}, status_code=429)
+    except InputUnavailable as exc:
+        return JSONResponse({'error': str(exc)}, status_code=503)
+
+
+async def receive_input_batch(request: Request) -> Response:
+    session = flask_session(request)
+    if not session.get('authenticated'):
+        return unauthorized()
+    body = await json_body(request)
+    events = body.get('events', []) if isinstance(body, dict) else []
+    try:
+        return JSONResponse(
+            await run_in_threadpool(
+                gateway.dispatch_batch,
+                session.get('sid') or remote_addr(request),
+                events,
+                channel='batch',
+                view=view_of(session),
+            )
+        )
+    except InputQueueFull as exc:
+        return JSONResponse({'error': str(exc)}, status_code=429)
+    except InputUnavailable as exc:
+        return JSONResponse({'error': str(exc)}, status_code=503)
+    except ValueError as exc:
+        return JSONResponse({'error': str(exc)}, status_code=400)
+
+
+async def input_socket(websocket: WebSocket) -> None:
+    """Long-lived input channel: each message is a JSON array of events."""
+    session = flask_session(websocket)
+    if not session.get('authenticated'):
+        await websocket.close(code=1008, reason='Unauthorized')
+        return
+    session_id = session.get('sid') or remote_addr(websocket)
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                events = json.loads(message)
+                if isinstance(events, dict):
+                    events = [events]
+                await run_in_threadpool(gateway.dispatch_batch, session_id, events, channel='ws', view=view_of(session))
+            except (ValueError, InputQueueFull, InputUnavailable) as exc:
+                await websocket.send_text(json.dumps({'error': str(exc)}))
+    except WebSocketDisconnect:
+        return
+
+
+async def wake_host(request: Request) -> Response:
+    if not flask_session(request).get('authenticated'):
+        return unauthorized()
+    gateway.broadcasters.notify_activity()
+    try:
+        return JSONResponse(await gateway.agent_client.wake_host_async())
+    except gateway.agent_client.AgentUnavailable as exc:
+        return JSONResponse({'error': str(exc)}, status_code=503)
+    except Exception as exc:
+        return JSONResponse({'error': str(exc)}, status_code=502)
+
+
+async def agent_health(request: Request) -> Response:
+    try:
+        result, status = await gateway.agent_client.health_async(), 200
+    except gateway.agent_client.AgentUnavailable as exc:
+        result, status = {'status': 'unavailable', 'detail': str(exc)}, 503
+    except Exception as exc:
+        result, status = {'status': 'error', 'detail': str(exc)}, 502
+    return JSONResponse({**result, 'breaker': gateway.agent_client.breaker.snapshot()}, status_code=status)
+
+
+class RestrictNetworks:
+    """``REMOTE_DESKTOP_ALLOWED_SUBNETS`` for the native routes (Flask checks its own)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] in ('http', 'websocket'):
+            client = scope.get('client')
+            if not gateway.allowlist.allowed(client[0] if client else '127.0.0.1'):
+                if scope['type'] == 'websocket':
+                    await send({'type': 'websocket.close', 'code': 1008})
+                else:
+                    await PlainTextResponse('Forbidden', status_code=403)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    yield
+    if gateway.agent_client is not None:
+        await gateway.agent_client.aclose()
+
+
+routes = [
+    Route('/stream', stream),
+    Route('/stream/tiles', stream_tiles),
+    Route('/stream/video', stream_video),
+    Route('/stream/cursor', stream_cursor),
+    Route('/api/input', receive_input, methods=['POST']),
+    Route('/api/input/batch', receive_input_batch, methods=['POST']),
+    WebSocketRoute('/ws/input', input_socket),
+]
+if gateway.USE_AGENT:
+    routes += [
+        Route('/api/host/wake', wake_host, methods=['POST']),
+        Route('/api/agent/health', agent_health),
+    ]
+routes.append(Mount('/', WSGIMiddleware(_flask)))
+
+app = RestrictNetworks(Starlette(routes=routes, lifespan=lifespan))
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,132 @@
+"""
+Display-bound backends, created on first use instead of at import.
+
+Importing the gateway used to create the ``pynput`` controllers and grab
+monitor geometry through ``mss``, so a missing or wrong ``DISPLAY`` failed
+the import, and every start paid for connections it might never use (agent
+mode injects through the host agent).
+
+* ``Lazy`` builds a value once, on the first ``get()``. A factory that
+  raises is retried on a later call, but not before ``retry`` seconds; calls
+  in between raise the same error again without touching the display.
+* Local input goes through an ``InputBackend``: ``PynputInput`` imports
+  ``pynput`` and creates its controllers with the first event, the base
+  class drops events (``REMOTE_DESKTOP_INPUT_BACKEND=null``, agent mode).
+  Keys are strings: a ``pynput.keyboard.Key`` name such as ``page_up``, or
+  the character to type. Buttons are ``left``, ``right`` or ``middle``.
+
+Capture is lazy in ``sources.MssSource`` and ``regions.ScreenLayout``, which
+open the display on the first grab and the first layout lookup.
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Generic, Tuple, TypeVar
+
+T = TypeVar('T')
+
+_UNSET = object()
+
+
+class Lazy(Generic[T]):
+    def __init__(self, factory: Callable[[], T], retry: float = 5.0) -> None:
+        self._factory = factory
+        self.retry = retry
+        self._lock = threading.Lock()
+        self._value = _UNSET
+        self._error: Exception | None = None
+        self._failed_at = 0.0
+
+    @property
+    def created(self) -> bool:
+        return self._value is not _UNSET
+
+    def get(self) -> T:
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is not _UNSET:
+                return self._value
+            if self._error is not None and time.monotonic() - self._failed_at < self.retry:
+                raise self._error
+            try:
+                self._value = self._factory()
+            except Exception as exc:
+                self._error, self._failed_at = exc, time.monotonic()
+                raise
+            self._error = None
+            return self._value
+
+
+class InputBackend:
+    """The interface; this base class drops every event."""
+
+    name = 'null'
+
+    def move(self, x: int, y: int) -> None:
+        pass
+
+    def click(self, button: str, count: int = 1) -> None:
+        pass
+
+    def scroll(self, dx: float, dy: float) -> None:
+        pass
+
+    def press(self, key: str) -> None:
+        pass
+
+    def release(self, key: str) -> None:
+        pass
+
+    def position(self) -> Tuple[int, int] | None:
+        """Pointer position in virtual-screen pixels, if the backend knows it."""
+        return None
+
+
+class PynputInput(InputBackend):
+    name = 'pynput'
+
+    def __init__(self) -> None:
+        self._controllers = Lazy(self._connect)
+
+    @staticmethod
+    def _connect():
+        from pynput import keyboard, mouse  # connects to the display
+
+        return mouse, mouse.Controller(), keyboard, keyboard.Controller()
+
+    def _key(self, key: str):
+        keyboard = self._controllers.get()[2]
+        return getattr(keyboard.Key, key, key) if len(key) > 1 else key
+
+    def move(self, x: int, y: int) -> None:
+        self._controllers.get()[1].position = (x, y)
+
+    def click(self, button: str, count: int = 1) -> None:
+        mouse, controller, _, _ = self._controllers.get()
+        controller.click(getattr(mouse.Button, button), count)
+
+    def scroll(self, dx: float, dy: float) -> None:
+        self._controllers.get()[1].scroll(dx, dy)
+
+    def press(self, key: str) -> None:
+        self._controllers.get()[3].press(self._key(key))
+
+    def release(self, key: str) -> None:
+        self._controllers.get()[3].release(self._key(key))
+
+    def position(self) -> Tuple[int, int] | None:
+        return self._controllers.get()[1].position
+
+
+def create_input(name: str) -> InputBackend:
+    """``pynput`` or ``null``; nothing touches the display until the first event."""
+    if name == 'pynput':
+        return PynputInput()
+    if name == 'null':
+        return InputBackend()
+    raise ValueError(f'unknown input backend {name!r} (expected pynput or null)')
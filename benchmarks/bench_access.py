@@ -0,0 +1,121 @@
+"""
+Per-request cost of the network allowlist and memory of the login limiter,
+before and after ``access.py``.
+
+* allowlist: the old ``is_ip_allowed`` (parses every ``ALLOWED_SUBNETS``
+  entry with ``ip_network()`` on each call) vs. ``NetworkAllowlist.match``
+  (precompiled prefix sets, uncached) and ``NetworkAllowlist.allowed`` (the
+  per-address cache every request after the first hits), for an address
+  in the first network, one in the last, a denied one and IPv6 loopback;
+* limiter: time per ``limited`` check and ``hit``, and Python memory after
+  failed logins from ``--addresses`` distinct addresses, for the old
+  ``defaultdict`` of ``datetime`` lists vs. ``LoginRateLimiter``.
+
+    python -m benchmarks.bench_access [--calls 100000] [--addresses 100000]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from ipaddress import ip_address, ip_network
+
+import access
+import config
+
+SUBNETS = ['127.0.0.1/8', '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '::1/128']
+ADDRESSES = ('127.0.0.1', '192.168.1.20', '8.8.8.8', '::1')
+
+
+def before_allowed(addr: str) -> bool:
+    try:
+        ip = ip_address(addr)
+    except ValueError:
+        return False
+    for network in SUBNETS:
+        try:
+            if ip in ip_network(network.strip()):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+class BeforeLimiter:
+    def __init__(self) -> None:
+        self.attempts = defaultdict(list)
+
+    def limited(self, ip: str) -> bool:
+        window_start = datetime.utcnow() - timedelta(seconds=config.RATE_LIMIT_WINDOW)
+        self.attempts[ip] = [ts for ts in self.attempts[ip] if ts >= window_start]
+        return len(self.attempts[ip]) >= config.RATE_LIMIT_ATTEMPTS
+
+    def hit(self, ip: str) -> None:
+        self.attempts[ip].append(datetime.utcnow())
+
+
+def per_call_ns(fn, argument, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn(argument)
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def fail_logins(limiter, addresses: list) -> None:
+    for addr in addresses:
+        limiter.limited(addr)
+        limiter.hit(addr)
+
+
+def limiter_cost(factory, addresses: list) -> tuple[float, int, int]:
+    """ns per failed login, traced memory and entries left after ``addresses`` failed once each."""
+    limiter = factory()
+    started = time.perf_counter()
+    fail_logins(limiter, addresses)
+    elapsed = time.perf_counter() - started
+    limiter = factory()
+    tracemalloc.start()
+    fail_logins(limiter, addresses)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    entries = len(limiter.attempts) if isinstance(limiter, BeforeLimiter) else len(limiter)
+    return elapsed / len(addresses) * 1e9, current, entries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=100_000)
+    parser.add_argument('--addresses', type=int, default=100_000)
+    args = parser.parse_args()
+
+    allowlist = access.NetworkAllowlist(SUBNETS)
+    print(f"{'address':<14} {'allowed':<11} {'before ns':>10} {'match ns':>9} {'cached ns':>10}")
+    for addr in ADDRESSES:
+        # The old code skipped 127.0.0.1/8 (host bits set), so loopback was refused.
+        decision = f'{before_allowed(addr)}/{allowlist.allowed(addr)}'
+        print(
+            f'{addr:<14} {decision:<11}'
+            f' {per_call_ns(before_allowed, addr, args.calls // 10):10.0f}'
+            f' {per_call_ns(allowlist.match, addr, args.calls):9.0f}'
+            f' {per_call_ns(allowlist.allowed, addr, args.calls):10.0f}'
+        )
+
+    print(f"\n{'limiter':<8} {'ns per failed login':>19} {'memory KiB':>11} {'entries':>8}")
+    addresses = [f'203.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}' for index in range(args.addresses)]
+    limiters = (
+        ('before', BeforeLimiter),
+        ('after', lambda: access.LoginRateLimiter(
+            config.RATE_LIMIT_ATTEMPTS, config.RATE_LIMIT_WINDOW, config.RATE_LIMIT_MAX_IPS
+        )),
+    )
+    for label, factory in limiters:
+        ns, memory, entries = limiter_cost(factory, addresses)
+        print(f'{label:<8} {ns:19.0f} {memory / 1024:11.0f} {entries:8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Cost of a dead host agent to the gateway, with and without the circuit breaker.
+
+Runs against in-process stand-ins for the agent on one local port:
+
+* ``outage``: an agent that accepts connections and never answers. The
+  gateway makes ``--calls`` ``agent_client.wake_host`` calls (as the black
+  screen monitor, keep-alive thread and dashboards do) with
+  ``REMOTE_AGENT_TIMEOUT`` set to ``--timeout``. Reports time blocked in
+  total and per call, and how many calls reached the agent, with the
+  breaker disabled (the old behaviour) and at the configured threshold;
+* ``recovery``: the agent comes back with the breaker open; time until the
+  background probe closes it (bounded by ``REMOTE_AGENT_BREAKER_PROBE``);
+* ``health``: ``--pollers`` threads calling ``agent_client.health`` every
+  ``--poll-interval`` seconds for ``--duration`` seconds, uncached (TTL 0)
+  and with ``REMOTE_AGENT_HEALTH_TTL``; counts requests served by the agent.
+
+    python -m benchmarks.bench_agent_breaker [--calls 20] [--timeout 0.5]
+                                             [--pollers 8] [--poll-interval 0.05] [--duration 2]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import agent_client
+import config
+from probe import percentiles
+
+
+class HungAgent:
+    """Accepts connections, reads the request, never replies."""
+
+    def __init__(self, port: int) -> None:
+        self.accepted = 0
+        self._connections: list = []
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', port))
+        self._sock.listen(64)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection, _ = self._sock.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            self._connections.append(connection)
+
+    def close(self) -> None:
+        self._sock.shutdown(socket.SHUT_RDWR)  # wakes the accept() above
+        self._sock.close()
+        for connection in self._connections:
+            connection.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _reply(self) -> None:
+        self.server.requests += 1
+        body = json.dumps({'status': 'ok'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def new_breaker(threshold: int) -> None:
+    agent_client.breaker = agent_client.CircuitBreaker(
+        threshold, config.AGENT_BREAKER_PROBE, agent_client._probe_health
+    )
+
+
+def outage(port: int, calls: int, threshold: int) -> tuple:
+    agent_client.close()
+    hung = HungAgent(port)
+    new_breaker(threshold)
+    durations = []
+    try:
+        for _ in range(calls):
+            started = time.perf_counter()
+            try:
+                agent_client.wake_host()
+            except agent_client.AgentClientError:
+                pass
+            durations.append(time.perf_counter() - started)
+    finally:
+        hung.close()
+    return durations, hung.accepted
+
+
+def poll_health(pollers: int, interval: float, duration: float) -> int:
+    deadline = time.monotonic() + duration
+    calls = []
+
+    def poller() -> None:
+        while time.monotonic() < deadline:
+            agent_client.health()
+            calls.append(1)
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=poller) for _ in range(pollers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(calls)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=0.5)
+    parser.add_argument('--pollers', type=int, default=8)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--duration', type=float, default=2.0)
+    args = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    config.AGENT_ENABLED = True
+    config.AGENT_BASE_URL = f'http://127.0.0.1:{port}'
+    config.AGENT_SOCKET = None
+    config.AGENT_TIMEOUT = args.timeout
+
+    print(f"{'outage':<9} {'blocked s':>9} {'p50 ms':>7} {'p99 ms':>7} {'reached agent':>14}")
+    for label, threshold in (('no break', args.calls + 1), ('breaker', config.AGENT_BREAKER_FAILURES)):
+        durations, accepted = outage(port, args.calls, threshold)
+        points = percentiles(durations, (50, 99))
+        print(
+            f'{label:<9} {sum(durations):9.2f} {points["p50"] * 1000:7.2f} {points["p99"] * 1000:7.1f}'
+            f' {accepted:>7}/{args.calls}'
+        )
+
+    # The breaker is open from the last run; bring the agent back.
+    server = serve(port)
+    started = time.perf_counter()
+    while agent_client.breaker.is_open:
+        time.sleep(0.01)
+    print(
+        f'\nrecovery: closed {time.perf_counter() - started:.2f} s after the agent came back'
+        f' (probe every {config.AGENT_BREAKER_PROBE:g} s)'
+    )
+
+    print(f"\n{'health TTL':<10} {'calls':>6} {'agent requests':>15}")
+    ttl = config.AGENT_HEALTH_TTL
+    for value in (0.0, ttl):
+        config.AGENT_HEALTH_TTL = value
+        agent_client._health = (0.0, None, None)
+        server.requests = 0
+        calls = poll_health(args.pollers, args.poll_interval, args.duration)
+        print(f'{value:<10g} {calls:6} {server.requests:15}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
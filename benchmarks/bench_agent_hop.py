@@ -0,0 +1,125 @@
+"""
+Input events per second through the gateway -> host agent hop.
+
+Starts the host agent stub in a subprocess and pushes mouse-move events at
+it the way the gateway does:
+
+* ``per-request``: the original ``requests.request()`` per event (new TCP
+  connection and headers dict every time);
+* ``pooled-tcp`` / ``pooled-unix``: ``agent_client.send_input`` over the
+  shared keep-alive session, via TCP or a Unix domain socket;
+* ``batch-N``: ``agent_client.send_inputs`` with N events per round trip.
+
+    python -m benchmarks.bench_agent_hop [--events 2000] [--batch 32]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+import agent_client
+import config
+
+EVENT = {'type': 'mouse', 'action': 'move', 'x': 0.5, 'y': 0.5}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_agent(port: int, uds: str) -> list[subprocess.Popen]:
+    env = dict(os.environ, HOST_AGENT_TOKEN=config.AGENT_TOKEN)
+    common = [sys.executable, '-m', 'uvicorn', 'host_agent.server:app', '--log-level', 'warning']
+    processes = [
+        subprocess.Popen(common + ['--host', '127.0.0.1', '--port', str(port)], env=env),
+        subprocess.Popen(common + ['--uds', uds], env=env),
+    ]
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=0.5)
+            if os.path.exists(uds):
+                return processes
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError('host agent did not start')
+
+
+def per_request(count: int) -> None:
+    headers = {'Authorization': f'Bearer {config.AGENT_TOKEN}', 'Content-Type': 'application/json'}
+    for _ in range(count):
+        response = requests.request(
+            method='POST',
+            url=f'{config.AGENT_BASE_URL}/api/input',
+            json=EVENT,
+            timeout=config.AGENT_TIMEOUT,
+            headers=headers,
+        )
+        response.raise_for_status()
+
+
+def pooled(count: int) -> None:
+    for _ in range(count):
+        agent_client.send_input(EVENT)
+
+
+def batched(count: int, size: int) -> None:
+    for start in range(0, count, size):
+        agent_client.send_inputs([EVENT] * min(size, count - start))
+
+
+def rate(fn, count: int, *args) -> float:
+    fn(min(count, 50), *args)  # warm up connections
+    started = time.perf_counter()
+    fn(count, *args)
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=32)
+    args = parser.parse_args()
+
+    port = free_port()
+    uds = os.path.join(tempfile.mkdtemp(), 'agent.sock')
+    config.AGENT_ENABLED = True
+    config.AGENT_BASE_URL = f'http://127.0.0.1:{port}'
+    processes = start_agent(port, uds)
+    try:
+        results = {'per-request': rate(per_request, args.events)}
+
+        config.AGENT_SOCKET = None
+        agent_client.close()
+        results['pooled-tcp'] = rate(pooled, args.events)
+        results[f'batch-{args.batch}-tcp'] = rate(batched, args.events, args.batch)
+
+        config.AGENT_SOCKET = uds
+        agent_client.close()
+        results['pooled-unix'] = rate(pooled, args.events)
+        results[f'batch-{args.batch}-unix'] = rate(batched, args.events, args.batch)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    baseline = results['per-request']
+    print(f"{'transport':<16} {'events/s':>10} {'speedup':>8}")
+    for name, value in results.items():
+        print(f'{name:<16} {value:10.0f} {value / baseline:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Load test: threaded Flask server vs. the ASGI gateway (``asgi.py``).
+
+Starts the gateway in a subprocess in each mode (synthetic frame source,
+null input backend), logs in once, then opens N concurrent ``/stream`` (or
+``/stream/tiles``) viewers from one asyncio client while another task posts
+``/api/input`` events back to back. For each N it reports:
+
+* delivered frames per second per viewer (mean) and total stream throughput;
+* ``/api/input`` round-trip latency p50 / p99 under that load;
+* server threads and resident memory while all viewers are connected.
+
+    python -m benchmarks.bench_asgi [--viewers 10,100,300] [--duration 5]
+                                    [--resolution 640x360] [--mode mjpeg|tiles]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import requests
+
+import config
+import tiles
+
+INPUT_EVENT = json.dumps({'type': 'mouse', 'action': 'move', 'x': 0.5, 'y': 0.5}).encode()
+SERVERS = {
+    'threaded': "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'asgi': "import uvicorn, asgi; uvicorn.run(asgi.app, host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, port: int, resolution: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        REMOTE_DESKTOP_FRAME_SOURCE=f'synthetic:scroll:{resolution}',
+        REMOTE_DESKTOP_INPUT_BACKEND='null',
+        REMOTE_DESKTOP_ALLOWED_SUBNETS='0.0.0.0/0',
+        REMOTE_DESKTOP_INTERVAL='0.1',
+        REMOTE_DESKTOP_INTERVAL_MIN='0.1',
+        REMOTE_DESKTOP_MAX_VIEWERS='100000',
+        REMOTE_DESKTOP_BLACK_DETECT='false',
+        REMOTE_AGENT_ENABLED='false',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVERS[mode].format(port=port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=0.5)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def login(port: int) -> str:
+    response = requests.post(
+        f'http://127.0.0.1:{port}/',
+        data={'username': config.USERNAME, 'password': config.PASSWORD},
+        allow_redirects=False,
+    )
+    return f"session={response.cookies['session']}"
+
+
+def process_stats(pid: int) -> Dict[str, int]:
+    stats = {}
+    with open(f'/proc/{pid}/status') as handle:
+        for line in handle:
+            key, _, value = line.partition(':')
+            if key == 'Threads':
+                stats['threads'] = int(value)
+            elif key == 'VmRSS':
+                stats['rss_mb'] = int(value.split()[0]) // 1024
+    return stats
+
+
+async def viewer(port: int, path: str, cookie: str, deadline: float, counts: List[int], index: int) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n'.encode())
+    marker = b'--frame' if path == '/stream' else tiles.MAGIC
+    tail = b''
+    try:
+        while time.monotonic() < deadline:
+            data = await asyncio.wait_for(reader.read(1 << 16), max(0.01, deadline - time.monotonic()))
+            if not data:
+                break
+            chunk = tail + data
+            counts[index] += chunk.count(marker)
+            tail = chunk[-len(marker) + 1:]
+            counts[-1] += len(data)
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def input_client(port: int, cookie: str, deadline: float, latencies: List[float]) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = (
+        f'POST /api/input HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(INPUT_EVENT)}\r\n\r\n'
+    ).encode() + INPUT_EVENT
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(head.lower().split(b'content-length:')[1].split(b'\r\n')[0])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if b'connection: close' in head.lower():
+                writer.close()
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            await asyncio.sleep(0.02)
+    finally:
+        writer.close()
+
+
+async def sample(pid: int, delay: float, into: Dict[str, int]) -> None:
+    await asyncio.sleep(delay)
+    into.update(process_stats(pid))
+
+
+async def load(pid: int, port: int, path: str, cookie: str, viewers: int, duration: float) -> Dict[str, float]:
+    deadline = time.monotonic() + duration
+    counts = [0] * (viewers + 1)  # frames per viewer, then total bytes
+    latencies: List[float] = []
+    server: Dict[str, int] = {}
+    await asyncio.gather(
+        sample(pid, duration * 0.8, server),
+        *(viewer(port, path, cookie, deadline, counts, i) for i in range(viewers)),
+        input_client(port, cookie, deadline, latencies),
+        return_exceptions=True,
+    )
+    latencies.sort()
+    return {
+        **server,
+        'fps_per_viewer': statistics.mean(counts[:-1]) / duration,
+        'mbytes_per_s': counts[-1] / duration / 1e6,
+        'input_p50_ms': 1000 * latencies[len(latencies) // 2] if latencies else float('nan'),
+        'input_p99_ms': 1000 * latencies[int(len(latencies) * 0.99)] if latencies else float('nan'),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--viewers', default='10,100,300')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--resolution', default='640x360')
+    parser.add_argument('--mode', choices=('mjpeg', 'tiles'), default='mjpeg')
+    parser.add_argument('--servers', default='threaded,asgi')
+    args = parser.parse_args()
+
+    path = '/stream' if args.mode == 'mjpeg' else '/stream/tiles'
+    print(f"{'server':<10} {'viewers':>7} {'fps/viewer':>10} {'MB/s':>7} {'input p50':>10} "
+          f"{'input p99':>10} {'threads':>8} {'RSS MB':>7}")
+    for mode in args.servers.split(','):
+        for count in (int(value) for value in args.viewers.split(',')):
+            port = free_port()
+            process = start_server(mode, port, args.resolution)
+            try:
+                result = asyncio.run(load(process.pid, port, path, login(port), count, args.duration))
+            finally:
+                process.kill()
+                process.wait()
+            print(f"{mode:<10} {count:>7} {result['fps_per_viewer']:>10.1f} {result['mbytes_per_s']:>7.1f} "
+                  f"{result['input_p50_ms']:>8.1f}ms {result['input_p99_ms']:>8.1f}ms "
+                  f"{result['threads']:>8} {result['rss_mb']:>7}")
+
+
+if __name__ == '__main__':
+    main()
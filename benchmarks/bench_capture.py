@@ -0,0 +1,110 @@
+"""
+Per-frame cost of the capture -> JPEG path, before and after the copy-free
+BGRA pipeline in ``capture.py``.
+
+The "before" path is the original ``capture_frame``: ``frame.rgb`` (a
+Python-side BGRA -> RGB shuffle), ``Image.frombytes`` and a fresh ``BytesIO``.
+The "after" path feeds ``frame.raw`` to ``Image.frombuffer`` in ``BGRX`` mode
+and reuses the output buffer. Both run on the same synthetic screenshot so no
+display is needed; the cost of opening an ``mss`` context per frame (which the
+old code also paid) is measured separately when ``DISPLAY`` is set.
+
+Peak allocations are measured with ``tracemalloc`` and therefore cover Python
+allocations (bytes/bytearray copies), not Pillow's internal image memory.
+
+    python -m benchmarks.bench_capture [--frames 20] [--quality 60]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import time
+import tracemalloc
+
+from mss.screenshot import ScreenShot
+from PIL import Image
+
+import capture
+
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+
+def synthetic_screenshot(width: int, height: int) -> ScreenShot:
+    """Desktop-like BGRA content: flat background, a gradient panel and text-ish rows."""
+    row = bytearray(b'\x30\x28\x20\xff' * width)
+    data = bytearray()
+    for y in range(height):
+        if height // 4 <= y < height // 2:
+            shade = (y * 255 // height) & 0xFF
+            data += bytes((shade, 0x80, 0xFF - shade, 0xFF)) * width
+        elif y % 18 < 12 and y > height // 2:
+            data += (b'\xe0\xe0\xe0\xff\x10\x10\x10\xff' * (width // 2))
+        else:
+            data += row
+    return ScreenShot.from_size(data, width, height)
+
+
+def before(frame: ScreenShot, quality: int) -> bytes:
+    frame = ScreenShot.from_size(frame.raw, frame.width, frame.height)  # .rgb is cached per object
+    image = Image.frombytes('RGB', frame.size, frame.rgb)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def after(frame: ScreenShot, quality: int) -> bytes:
+    return capture.encode_bgra_jpeg(frame.raw, frame.size, quality)
+
+
+def measure(fn, frame: ScreenShot, quality: int, frames: int) -> tuple[float, int]:
+    fn(frame, quality)  # warm up
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(frames):
+        fn(frame, quality)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / frames * 1000, peak
+
+
+def measure_context_open(frames: int) -> float | None:
+    if not os.environ.get('DISPLAY'):
+        return None
+    import mss
+
+    started = time.perf_counter()
+    for _ in range(frames):
+        with mss.mss():
+            pass
+    return (time.perf_counter() - started) / frames * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--quality', type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"{'res':<6} {'path':<7} {'ms/frame':>9} {'peak MiB':>9}")
+    for name, (width, height) in RESOLUTIONS.items():
+        frame = synthetic_screenshot(width, height)
+        for label, fn in (('before', before), ('after', after)):
+            ms, peak = measure(fn, frame, args.quality, args.frames)
+            print(f'{name:<6} {label:<7} {ms:9.1f} {peak / 2**20:9.1f}')
+
+    context_ms = measure_context_open(args.frames)
+    if context_ms is None:
+        print('mss context open: skipped (no DISPLAY); the old path paid this on every frame')
+    else:
+        print(f'mss context open: {context_ms:.1f} ms/frame saved by the persistent handle')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Frames per second of the stripe encoder (``encoder.StripeEncoder``) as the
+number of worker threads grows.
+
+Each run encodes the same synthetic frame into one spliced baseline JPEG
+(what MJPEG viewers receive). ``workers=0`` is the single ``optimize=True``
+encode the gateway uses unless striping is enabled; speedup is relative to the stripe path
+on one worker, so it isolates core scaling from the cost of skipping Huffman
+optimisation. Scaling is bounded by the cores available to the process.
+
+    python -m benchmarks.bench_parallel_encode [--resolution 4k] [--seconds 3]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from benchmarks.bench_capture import RESOLUTIONS, synthetic_screenshot
+import capture
+from encoder import StripeEncoder
+
+
+def fps(encoder: StripeEncoder, image, quality: int, seconds: float) -> tuple[float, int]:
+    size = len(encoder.encode(image, quality))  # warm up the pool
+    frames = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        encoder.encode(image, quality)
+        frames += 1
+    return frames / (time.perf_counter() - started), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--resolution', choices=sorted(RESOLUTIONS), default='4k')
+    parser.add_argument('--quality', type=int, default=60)
+    parser.add_argument('--stripe-height', type=int, default=256)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    shot = synthetic_screenshot(*RESOLUTIONS[args.resolution])
+    image = capture.bgra_image(shot.raw, shot.size)
+    print(f'{args.resolution}, {os.cpu_count()} CPUs, stripe height {args.stripe_height}')
+    print(f"{'workers':>7} {'fps':>7} {'speedup':>8} {'bytes':>9}")
+
+    counts = sorted({1, 2, 4, 8, args.max_workers} & set(range(1, args.max_workers + 1)))
+    baseline = None
+    for workers in [0] + counts:
+        encoder = StripeEncoder(workers, args.stripe_height)
+        rate, size = fps(encoder, image, args.quality, args.seconds)
+        encoder.shutdown()
+        if workers == 1:
+            baseline = rate
+        speedup = f'{rate / baseline:7.2f}x' if baseline else f"{'-':>8}"
+        print(f'{workers:>7} {rate:7.1f} {speedup} {size:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Gateway cold start: ``import app`` in fresh interpreters.
+
+For each of ``--runs`` subprocesses it measures wall time to import the
+gateway, peak RSS, modules loaded and threads running afterwards, and
+reports the median. The first run also records which display-bound or
+optional heavy packages the import pulled in, and ``-X importtime``
+gives the slowest top-level imports (``--top``). Extra environment for
+the children comes from ``--env NAME=VALUE`` (e.g. a synthetic
+``REMOTE_DESKTOP_FRAME_SOURCE``, or ``REMOTE_AGENT_ENABLED=true``).
+
+    python -m benchmarks.bench_startup [--runs 7] [--top 8] [--env NAME=VALUE ...]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ('pynput', 'Xlib', 'mss', 'av', 'requests', 'httpx')
+
+CHILD = """
+import json, resource, sys, threading, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'threads': threading.active_count(),
+    'heavy': sorted(name for name in %r if name in sys.modules),
+}))
+""" % (HEAVY,)
+
+
+def run(env: dict, importtime: bool = False) -> tuple:
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr: str, top: int) -> list:
+    """Cumulative microseconds of modules imported directly by ``app``."""
+    rows, pending = [], []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        # Children are listed before their parent: keep depth 1 rows until a
+        # top-level import closes them, and only if that one is the gateway.
+        if depth == 1:
+            pending.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == 'app':
+                rows = pending
+            pending = []
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=8)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update(entry.split('=', 1) for entry in args.env)
+    samples = [run(env)[0] for _ in range(args.runs)]
+    print(f"{'import ms':>9} {'RSS MiB':>8} {'modules':>8} {'threads':>8}  heavy imports")
+    print(
+        f"{statistics.median(s['seconds'] for s in samples) * 1000:9.0f}"
+        f" {statistics.median(s['rss_kb'] for s in samples) / 1024:8.1f}"
+        f" {statistics.median(s['modules'] for s in samples):8.0f}"
+        f" {statistics.median(s['threads'] for s in samples):8.0f}"
+        f"  {', '.join(samples[0]['heavy']) or '-'}"
+    )
+
+    _, stderr = run(env, importtime=True)
+    print(f"\n{'module':<16} {'cumulative ms':>13}")
+    for cumulative, name in slowest_imports(stderr, args.top):
+        print(f'{name:<16} {cumulative / 1000:13.1f}')
+
+
+if __name__ == '__main__':
+    main()
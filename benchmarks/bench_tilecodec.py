@@ -0,0 +1,152 @@
+"""
+Tile stream bytes and encode time: JPEG only vs. the hybrid tile codec.
+
+For each screen (the synthetic ``static`` / ``scroll`` / ``video`` patterns
+plus ``ide``, a rendered editor with anti-aliased text and a video panel) it
+builds a ``streaming.Frame`` with and without a ``tilecodec.TileCodec`` and
+reports, per path:
+
+* ``keyframe``: bytes, encode time (cold cache, then warm: the same screen
+  again in a new frame, as on a periodic keyframe) and which codecs were used;
+* ``delta``: bytes and encode time of the dirty tiles between two grabs
+  (``scroll`` and ``video`` only), encoded as ``tiles.TileUpdates`` would:
+  with the tile codec, a change large enough to count as motion is sent as
+  JPEG stripes. The hybrid ``scroll`` delta must come out all JPEG, or the
+  run exits with an error (the tile codec is too slow for a scrolling screen);
+* ``error``: the largest per-channel difference after decoding the keyframe
+  (0 means lossless).
+
+    python -m benchmarks.bench_tilecodec [--resolution 1080p] [--quality 60]
+                                         [--screens static,scroll,video,ide]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import config
+import sources
+import tilecodec
+import tiles
+from capture import RawFrame
+from encoder import Box, StripeEncoder
+from streaming import Frame
+
+WORDS = ('def', 'return', 'self.frame', 'import', 'numpy', 'np.asarray(x)', '=', 'tile', 'if', 'None:', 'for', 'in')
+SYNTAX = [(212, 212, 212)] * 6 + [(86, 156, 214), (206, 145, 120), (106, 153, 85), (197, 134, 192)]
+
+
+def ide_screen(size: Tuple[int, int], seed: int = 0) -> RawFrame:
+    """Dark editor theme: sidebar, coloured code, a bilinear-scaled noise panel."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    image = Image.new('RGB', size, (30, 30, 30))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width, 34), fill=(50, 50, 52))
+    draw.rectangle((0, 34, width // 7, height), fill=(37, 37, 38))
+    font = ImageFont.load_default(size=14)
+    for index, row in enumerate(range(44, height, 22)):
+        draw.text((14, row), f'module_{index}.py', font=font, fill=(200, 200, 200))
+    for row in range(44, height, 20):
+        if rng.random() < 0.25:
+            continue
+        x = width // 7 + 30 + 30 * int(rng.integers(0, 5))
+        end = x + int(rng.integers(200, width // 2))
+        color = SYNTAX[rng.integers(len(SYNTAX))]
+        while x < end:
+            word = WORDS[rng.integers(len(WORDS))]
+            if rng.random() < 0.4:
+                color = SYNTAX[rng.integers(len(SYNTAX))]
+            draw.text((x, row), word, font=font, fill=color)
+            x += int(draw.textlength(word + ' ', font=font))
+    panel = Image.fromarray(rng.integers(0, 255, (60, 100, 3), dtype=np.uint8)).resize((width // 4, height // 4))
+    image.paste(panel, (width * 3 // 4 - 40, height * 2 // 3))
+    return RawFrame(image.convert('RGBX').tobytes('raw', 'BGRX'), size)
+
+
+def screens(name: str, size: Tuple[int, int]) -> Tuple[RawFrame, RawFrame]:
+    """Two consecutive grabs of one screen."""
+    if name == 'ide':
+        first = ide_screen(size)
+        # Typing: a word appears on one line.
+        image = Image.frombuffer('RGBX', size, first.data, 'raw', 'BGRX', 0, 1).copy()
+        ImageDraw.Draw(image).text((size[0] // 3, 300), 'typed', font=ImageFont.load_default(size=14))
+        return first, RawFrame(image.tobytes('raw', 'BGRX'), size)
+    source = sources.SyntheticSource(name, size)
+    return source.grab(), source.grab()
+
+
+def decode(size: Tuple[int, int], parts: List[Tuple[Box, int, bytes]]) -> np.ndarray:
+    canvas = Image.new('RGB', size)
+    for (left, top, _, _), _, data in parts:
+        canvas.paste(Image.open(io.BytesIO(data)).convert('RGB'), (left, top))
+    return np.asarray(canvas)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def run(name: str, size: Tuple[int, int], quality: int, tile_size: int, encoder: StripeEncoder) -> None:
+    first, second = screens(name, size)
+    original = np.frombuffer(first.data, np.uint8).reshape(size[1], size[0], 4)[..., 2::-1]
+    for label, codec in (('jpeg', None), ('hybrid', tilecodec.TileCodec())):
+        frame = Frame(1, 0.0, first, quality, encoder, tile_codec=codec)
+        parts, cold = timed(lambda: frame.keyframe(quality, tile_size))
+        warm_frame = Frame(2, 0.0, first, quality, encoder, tile_codec=codec)
+        _, warm = timed(lambda: warm_frame.keyframe(quality, tile_size))
+        error = int(np.abs(decode(size, parts).astype(np.int16) - original).max())
+        used = Counter(tilecodec.CODEC_NAMES[part[1]] for part in parts)
+        print(
+            f'{name:<7} {label:<7} keyframe {sum(len(part[2]) for part in parts):>9,} B'
+            f' {cold:7.1f} ms cold {warm:7.1f} ms warm  error {error:<3}'
+            f' {", ".join(f"{count} {codec}" for codec, count in sorted(used.items()))}'
+        )
+        if name in ('static', 'ide'):
+            continue
+        mask = tiles.dirty_tiles(first, second, tile_size)
+        moving = codec is not None and tiles.moving(mask)
+        boxes = [tiles.tile_box(int(row), int(col), size, tile_size) for row, col in np.argwhere(mask)]
+        frame = Frame(3, 0.0, second, quality, encoder, tile_codec=codec)
+        if moving:
+            parts, elapsed = timed(lambda: frame.keyframe(quality, tile_size, moving=True))
+            encoded = [(codec_id, data) for _, codec_id, data in parts]
+        else:
+            encoded, elapsed = timed(lambda: frame.regions(boxes, quality, tile_size))
+        print(
+            f'{name:<7} {label:<7} delta    {sum(len(data) for _, data in encoded):>9,} B'
+            f' {elapsed:7.1f} ms      ({len(boxes)} of {mask.size} tiles{", sent as stripes" if moving else ""})'
+        )
+        if name == 'scroll' and any(codec_id != tilecodec.CODEC_JPEG for codec_id, _ in encoded):
+            raise SystemExit('scroll delta went through the tile codec instead of JPEG')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--resolution', default='1080p')
+    parser.add_argument('--quality', type=int, default=60)
+    parser.add_argument('--tile-size', type=int, default=config.TILE_SIZE)
+    parser.add_argument('--screens', default='static,scroll,video,ide')
+    args = parser.parse_args()
+
+    size = sources.parse_resolution(args.resolution)
+    encoder = StripeEncoder(config.ENCODE_WORKERS, config.ENCODE_STRIPE_HEIGHT)
+    try:
+        for name in args.screens.split(','):
+            run(name, size, args.quality, args.tile_size, encoder)
+    finally:
+        encoder.shutdown()
+
+
+if __name__ == '__main__':
+    main()
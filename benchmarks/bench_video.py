@@ -0,0 +1,117 @@
+"""
+Bandwidth and CPU: MJPEG (``/stream``) vs. H.264 in fragmented MP4
+(``/stream/video``) on the same synthetic frames.
+
+Each pattern's grabs are fed to both paths as if every one had changed (the
+producer skips unchanged frames for both alike):
+
+* MJPEG: ``streaming.Frame.jpeg`` at ``--quality`` through the configured
+  stripe encoder, as a viewer of ``/stream`` gets it;
+* H.264: ``video.VideoEncoder`` at ``--bitrate`` (one viewer's encoder).
+
+For each it reports bytes per frame, the bitrate at ``--fps``, encode CPU
+time per frame (process time, so worker threads count) and PSNR of the
+decoded frames against the captured ones. The H.264 stream is decoded by
+libavformat from the bytes a viewer would receive, which also checks the
+fMP4 framing.
+
+    python -m benchmarks.bench_video [--resolution 1080p] [--patterns static,scroll,video]
+                                     [--frames 50] [--fps 10] [--quality 60]
+                                     [--bitrate 2000000] [--preset ultrafast]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+import config
+import sources
+import video
+from capture import RawFrame
+from encoder import StripeEncoder
+from streaming import Frame
+
+
+def rgb(raw: RawFrame) -> np.ndarray:
+    width, height = raw.size
+    return np.frombuffer(raw.data, dtype=np.uint8).reshape(height, width, 4)[..., 2::-1]
+
+
+def psnr(decoded: List[np.ndarray], originals: List[np.ndarray]) -> float:
+    error = np.mean([np.mean((a.astype(np.float32) - b) ** 2) for a, b in zip(decoded, originals)])
+    return float('inf') if error == 0 else 10 * np.log10(255 ** 2 / error)
+
+
+def bench_mjpeg(grabs: List[RawFrame], quality: int, encoder: StripeEncoder):
+    started, cpu = time.perf_counter(), time.process_time()
+    jpegs = [Frame(seq, 0.0, raw, quality, encoder).jpeg(quality) for seq, raw in enumerate(grabs, 1)]
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - started
+    decoded = [np.asarray(Image.open(io.BytesIO(data)).convert('RGB')) for data in jpegs]
+    return sum(map(len, jpegs)), cpu, wall, decoded
+
+
+def bench_h264(grabs: List[RawFrame], bitrate: int, fps: float, preset: str):
+    encoder = video.VideoEncoder(
+        grabs[0].size,
+        bitrate=bitrate,
+        keyframe_interval=config.VIDEO_KEYFRAME_INTERVAL,
+        frame_duration=1 / fps,
+        preset=preset,
+    )
+    started, cpu = time.perf_counter(), time.process_time()
+    chunks = [encoder.init_segment] + [encoder.encode(raw) for raw in grabs]
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - started
+    stream = b''.join(chunks)
+    with video.av.open(io.BytesIO(stream), format='mp4') as container:
+        decoded = [
+            picture.to_ndarray(format='rgb24', src_colorspace='ITU709')
+            for picture in container.decode(video=0)
+        ]
+    return len(stream), cpu, wall, decoded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--resolution', default='1080p')
+    parser.add_argument('--patterns', default='static,scroll,video')
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--fps', type=float, default=10.0)
+    parser.add_argument('--quality', type=int, default=config.IMAGE_QUALITY)
+    parser.add_argument('--bitrate', type=int, default=config.VIDEO_BITRATE)
+    parser.add_argument('--preset', default=config.VIDEO_PRESET)
+    args = parser.parse_args()
+    if not video.available():
+        parser.exit(1, 'PyAV with libx264 is not installed\n')
+
+    size = video.scaled_size(sources.parse_resolution(args.resolution), 1.0)
+    encoder = StripeEncoder(config.ENCODE_WORKERS, config.ENCODE_STRIPE_HEIGHT)
+    print(f"{'pattern':<8} {'path':<6} {'KB/frame':>9} {'Mbit/s':>7} {'CPU ms':>7} {'wall ms':>8} {'PSNR dB':>8}")
+    try:
+        for pattern in args.patterns.split(','):
+            source = sources.SyntheticSource(pattern, size)
+            grabs = [source.grab() for _ in range(args.frames)]
+            originals = [rgb(raw) for raw in grabs]
+            runs = (
+                ('mjpeg', bench_mjpeg(grabs, args.quality, encoder)),
+                ('h264', bench_h264(grabs, args.bitrate, args.fps, args.preset)),
+            )
+            for path, (total, cpu, wall, decoded) in runs:
+                per_frame = total / args.frames
+                print(
+                    f'{pattern:<8} {path:<6} {per_frame / 1024:9.1f} {per_frame * 8 * args.fps / 1e6:7.2f}'
+                    f' {cpu / args.frames * 1000:7.1f} {wall / args.frames * 1000:8.1f}'
+                    f' {psnr(decoded, originals):8.2f}'
+                )
+    finally:
+        encoder.shutdown()
+
+
+if __name__ == '__main__':
+    main()
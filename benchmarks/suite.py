@@ -0,0 +1,337 @@
+"""
+Headless benchmark suite on the synthetic frame source (no display needed).
+
+For every resolution x content pattern it measures:
+
+* ``capture``: synthetic grabs per second (frame generation cost only);
+* ``encode``: full-frame JPEG encodes per second and bytes per frame, per
+  quality, through ``streaming.Frame`` and the configured stripe encoder;
+* ``stream``: end-to-end ``/stream`` (MJPEG) and ``/stream/tiles`` frames per
+  second and bytes per frame, per quality, through the Flask app (test
+  client, so no socket) with capture running as fast as it can;
+* ``input``: events per second accepted by ``/api/input`` and
+  ``/api/input/batch`` and drained by the injector (null input backend);
+* ``latency``: the dashboard's latency probe (see ``probe``) without a
+  browser: tagged events posted to ``/api/input/batch`` one at a time, each
+  timed until the first ``/stream`` / ``/stream/tiles`` frame stamped with
+  it, at the configured capture intervals. Percentiles of round trip,
+  input-to-frame and capture-to-display; "display" here is the frame being
+  handed to the client (no socket, no decode).
+
+Stream and input runs import ``app`` in a subprocess per configuration,
+because the app is configured from the environment at import time.
+
+Results are written as JSON; ``--compare`` prints the change against an
+earlier results file.
+
+    python -m benchmarks.suite [--resolutions 720p,1080p,4k] [--patterns static,scroll,video]
+                               [--qualities 40,60,80] [--modes mjpeg,tiles]
+                               [--duration 2] [--output bench-results.json] [--compare old.json]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import config
+import probe
+import sources
+import tiles
+from encoder import StripeEncoder
+from streaming import Frame
+
+Row = Dict[str, Any]
+
+# Fields identifying a result row (everything else is a measurement).
+KEY_FIELDS = ('kind', 'resolution', 'pattern', 'quality', 'mode', 'channel')
+INPUT_EVENT = {'type': 'mouse', 'action': 'move', 'x': 0.5, 'y': 0.5}
+INPUT_BATCH = 32
+# Pause between probed inputs, so each one meets an idle pipeline.
+PROBE_GAP = 0.05  # seconds
+
+
+def bench_capture(resolution: str, pattern: str, frames: int) -> Row:
+    source = sources.SyntheticSource(pattern, sources.parse_resolution(resolution))
+    source.grab()
+    started = time.perf_counter()
+    for _ in range(frames):
+        source.grab()
+    elapsed = time.perf_counter() - started
+    return {'kind': 'capture', 'resolution': resolution, 'pattern': pattern, 'fps': frames / elapsed}
+
+
+def bench_encode(resolution: str, pattern: str, quality: int, frames: int, encoder: StripeEncoder) -> Row:
+    source = sources.SyntheticSource(pattern, sources.parse_resolution(resolution))
+    raws = [source.grab() for _ in range(frames)]
+    Frame(0, 0.0, raws[0], quality, encoder).jpeg()  # warm up the pool
+    started = time.perf_counter()
+    sizes = [len(Frame(seq, 0.0, raw, quality, encoder).jpeg()) for seq, raw in enumerate(raws)]
+    elapsed = time.perf_counter() - started
+    return {
+        'kind': 'encode',
+        'resolution': resolution,
+        'pattern': pattern,
+        'quality': quality,
+        'fps': frames / elapsed,
+        'bytes_per_frame': sum(sizes) / len(sizes),
+    }
+
+
+def run_child(spec: Dict[str, Any]) -> List[Row]:
+    env = dict(
+        os.environ,
+        REMOTE_DESKTOP_FRAME_SOURCE=f"synthetic:{spec.get('pattern', 'static')}:{spec.get('resolution', '720p')}",
+        REMOTE_DESKTOP_INPUT_BACKEND='null',
+        REMOTE_DESKTOP_ALLOWED_SUBNETS='0.0.0.0/0',
+        REMOTE_DESKTOP_STREAM_KEEPALIVE='1',
+        REMOTE_AGENT_ENABLED='false',
+    )
+    if spec['kind'] != 'latency':
+        # Capture as fast as possible; latency runs keep the configured pacing.
+        env.update(REMOTE_DESKTOP_INTERVAL='0', REMOTE_DESKTOP_INTERVAL_MIN='0')
+    if 'quality' in spec:
+        quality = str(spec['quality'])
+        env.update(
+            REMOTE_DESKTOP_JPEG_QUALITY=quality,
+            REMOTE_DESKTOP_QUALITY_MIN=quality,
+            REMOTE_DESKTOP_QUALITY_MAX=quality,
+            REMOTE_DESKTOP_SCALE_MIN='1',
+        )
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.suite', '--child', json.dumps(spec)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _login(app_module):
+    client = app_module.app.test_client()
+    client.post('/', data={'username': config.USERNAME, 'password': config.PASSWORD})
+    return client
+
+
+def child_stream(spec: Dict[str, Any]) -> List[Row]:
+    import app as app_module
+
+    client = _login(app_module)
+    rows = []
+    for mode in spec['modes']:
+        response = client.get('/stream' if mode == 'mjpeg' else '/stream/tiles')
+        chunks = iter(response.response)
+        next(chunks)  # first frame / keyframe: producer start-up
+        count = nbytes = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < spec['duration']:
+            nbytes += len(next(chunks))
+            count += 1
+        elapsed = time.perf_counter() - started
+        response.close()
+        rows.append({
+            'kind': 'stream',
+            'mode': mode,
+            'resolution': spec['resolution'],
+            'pattern': spec['pattern'],
+            'quality': spec['quality'],
+            'fps': count / elapsed,
+            'bytes_per_frame': nbytes / max(1, count),
+        })
+    return rows
+
+
+def child_input(spec: Dict[str, Any]) -> List[Row]:
+    import app as app_module
+
+    client = _login(app_module)
+    rows = []
+    for channel, path, body, size in (
+        ('http', '/api/input', INPUT_EVENT, 1),
+        (f'batch-{INPUT_BATCH}', '/api/input/batch', {'events': [INPUT_EVENT] * INPUT_BATCH}, INPUT_BATCH),
+    ):
+        events = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < spec['duration']:
+            client.post(path, json=body)
+            events += size
+        while app_module.input_queue.depth:  # count until injected, not just queued
+            time.sleep(0.001)
+        rows.append({'kind': 'input', 'channel': channel, 'events_per_second': events / (time.perf_counter() - started)})
+    return rows
+
+
+def frame_stamps(mode: str, chunk: bytes) -> Tuple[float, int | None]:
+    """Capture time and probed input id of one ``/stream`` part or tile packet."""
+    if mode == 'tiles':
+        _, _, captured, _, _ = tiles.unpack_update(chunk[4:])
+        mark = tiles.unpack_input(chunk[4:])
+        return captured, mark[0] if mark else None
+    head = chunk[:chunk.index(b'\r\n\r\n')].decode()
+    headers = dict(line.split(': ', 1) for line in head.split('\r\n') if ': ' in line)
+    return float(headers['X-Frame-Time']), int(headers['X-Input-Id']) if 'X-Input-Id' in headers else None
+
+
+def child_latency(spec: Dict[str, Any]) -> List[Row]:
+    import app as app_module
+
+    client = _login(app_module)
+    rows = []
+    input_id = 0
+    for mode in spec['modes']:
+        response = client.get('/stream' if mode == 'mjpeg' else '/stream/tiles')
+        chunks = iter(response.response)
+        next(chunks)
+        samples: Dict[str, List[float]] = {kind: [] for kind in probe.KINDS}
+        started = time.perf_counter()
+        while time.perf_counter() - started < spec['duration']:
+            input_id += 1
+            sent = time.time()
+            client.post('/api/input/batch', json={'events': [dict(INPUT_EVENT, id=input_id, t=sent * 1000)]})
+            while True:
+                chunk = next(chunks)
+                shown = time.time()
+                captured, stamped = frame_stamps(mode, chunk)
+                if stamped is not None and stamped >= input_id:
+                    break
+            samples['round_trip'].append(shown - sent)
+            samples['input_to_frame'].append(captured - sent)
+            samples['capture_to_display'].append(shown - captured)
+            time.sleep(PROBE_GAP)
+        response.close()
+        row = {
+            'kind': 'latency',
+            'mode': mode,
+            'resolution': spec['resolution'],
+            'pattern': spec['pattern'],
+            'inputs': len(samples['round_trip']),
+        }
+        for kind, values in samples.items():
+            row.update({f'{kind}_{name}_ms': value * 1000 for name, value in probe.percentiles(values).items()})
+        rows.append(row)
+    return rows
+
+
+def row_key(row: Row) -> tuple:
+    return tuple(row.get(field) for field in KEY_FIELDS)
+
+
+def compare(rows: List[Row], previous_path: str) -> None:
+    with open(previous_path) as handle:
+        previous = {row_key(row): row for row in json.load(handle)['results']}
+    print(f'\nChange against {previous_path}:')
+    for row in rows:
+        old = previous.get(row_key(row))
+        if old is None:
+            continue
+        label = ' '.join(str(value) for value in row_key(row) if value is not None)
+        changes = [
+            f'{metric} {100 * (row[metric] - old[metric]) / old[metric]:+.1f}%'
+            for metric in ('fps', 'bytes_per_frame', 'events_per_second', 'round_trip_p50_ms', 'round_trip_p99_ms')
+            if row.get(metric) and old.get(metric)
+        ]
+        print(f'  {label:<40} {", ".join(changes)}')
+
+
+def print_rows(rows: List[Row]) -> None:
+    print(f"{'benchmark':<40} {'fps / ev/s':>12} {'bytes/frame':>12} {'rtt p50/p99 ms':>15}")
+    for row in rows:
+        label = ' '.join(str(value) for value in row_key(row) if value is not None)
+        rate = row.get('fps', row.get('events_per_second'))
+        size = row.get('bytes_per_frame')
+        rtt = f"{row['round_trip_p50_ms']:.1f}/{row['round_trip_p99_ms']:.1f}" if 'round_trip_p50_ms' in row else ''
+        print(
+            f"{label:<40} {'' if rate is None else f'{rate:12.1f}':>12}"
+            f" {'' if size is None else f'{size:12.0f}':>12} {rtt:>15}"
+        )
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--resolutions', default='720p,1080p,4k')
+    parser.add_argument('--patterns', default=','.join(sources.PATTERNS))
+    parser.add_argument('--qualities', default='40,60,80')
+    parser.add_argument('--modes', default='mjpeg,tiles')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per stream / input measurement')
+    parser.add_argument('--frames', type=int, default=20, help='frames per capture / encode measurement')
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        spec = json.loads(args.child)
+        children = {'input': child_input, 'latency': child_latency, 'stream': child_stream}
+        rows = children[spec['kind']](spec)
+        print(json.dumps(rows))
+        return
+
+    resolutions = args.resolutions.split(',')
+    patterns = args.patterns.split(',')
+    qualities = [int(value) for value in args.qualities.split(',')]
+    modes = args.modes.split(',')
+    encoder = StripeEncoder(config.ENCODE_WORKERS, config.ENCODE_STRIPE_HEIGHT)
+
+    rows: List[Row] = []
+    for resolution in resolutions:
+        for pattern in patterns:
+            rows.append(bench_capture(resolution, pattern, args.frames))
+            for quality in qualities:
+                rows.append(bench_encode(resolution, pattern, quality, args.frames, encoder))
+                rows.extend(run_child({
+                    'kind': 'stream',
+                    'resolution': resolution,
+                    'pattern': pattern,
+                    'quality': quality,
+                    'modes': modes,
+                    'duration': args.duration,
+                }))
+            rows.extend(run_child({
+                'kind': 'latency',
+                'resolution': resolution,
+                'pattern': pattern,
+                'modes': modes,
+                'duration': args.duration,
+            }))
+    rows.extend(run_child({'kind': 'input', 'duration': args.duration}))
+    encoder.shutdown()
+
+    print_rows(rows)
+    results = {
+        'meta': {
+            'timestamp': time.time(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'encode_workers': config.ENCODE_WORKERS,
+            'args': {key: value for key, value in vars(args).items() if key != 'child'},
+        },
+        'results': rows,
+    }
+    with open(args.output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f'\nWrote {len(rows)} results to {args.output}')
+    if args.compare:
+        compare(rows, args.compare)
+
+
+if __name__ == '__main__':
+    main()
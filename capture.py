@@ -0,0 +1,102 @@
+"""
+Screen capture and JPEG encoding helpers used by the frame producer.
+
+Each capturing thread keeps one ``mss`` handle for its lifetime instead of
+opening a new X connection per frame, and the raw BGRA buffer is handed
+straight to Pillow (``BGRX`` raw mode) so the only full-frame conversion
+happens in C inside the encoder.
+"""
+
+
+from __future__ import annotations
+
+import io
+import threading
+from typing import Any, Dict, NamedTuple, Tuple
+
+import mss
+import numpy as np
+from PIL import Image
+
+_local = threading.local()
+
+
+class RawFrame(NamedTuple):
+    """Captured BGRA pixels (4 bytes per pixel, rows tightly packed).
+
+    Frames read from the agent's ring may arrive already encoded: ``jpeg``
+    then holds the full-frame JPEG at ``quality`` and ``data`` stays ``None``
+    until ``with_pixels`` decodes it.
+    """
+
+    data: Any
+    size: Tuple[int, int]
+    jpeg: bytes | None = None
+    quality: int | None = None
+
+
+def _handle():
+    sct = getattr(_local, 'sct', None)
+    if sct is None:
+        # No pointer in frames: it travels on the cursor channel (cursor.py).
+        sct = _local.sct = mss.mss(with_cursor=False)
+    return sct
+
+
+def _buffer() -> io.BytesIO:
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+
+def grab(monitor: Dict[str, Any]) -> RawFrame:
+    """Grab ``monitor`` with this thread's persistent capture handle."""
+    shot = _handle().grab(monitor)
+    return RawFrame(shot.raw, tuple(shot.size))
+
+
+def close() -> None:
+    """Release this thread's capture handle (call before the thread exits)."""
+    sct = getattr(_local, 'sct', None)
+    if sct is not None:
+        _local.sct = None
+        sct.close()
+
+
+def bgra_image(raw, size: Tuple[int, int]) -> Image.Image:
+    """Wrap a BGRA buffer as an RGB image without a Python-side conversion."""
+    return Image.frombuffer('RGB', size, raw, 'raw', 'BGRX', 0, 1)
+
+
+def decode_jpeg(data: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    return image if image.mode == 'RGB' else image.convert('RGB')
+
+
+def with_pixels(frame: RawFrame) -> RawFrame:
+    """``frame`` with BGRA ``data`` filled in (decoding ``jpeg`` if needed)."""
+    if frame.data is not None:
+        return frame
+    return frame._replace(data=decode_jpeg(frame.jpeg).tobytes('raw', 'BGRX'))
+
+
+def crop(frame: RawFrame, left: int, top: int, width: int, height: int) -> RawFrame:
+    """The ``width`` x ``height`` pixels of ``frame`` at ``(left, top)``."""
+    frame = with_pixels(frame)
+    full_width, full_height = frame.size
+    pixels = np.frombuffer(frame.data, dtype=np.uint32, count=full_width * full_height)
+    part = pixels.reshape(full_height, full_width)[top:top + height, left:left + width]
+    return RawFrame(part.tobytes(), (part.shape[1], part.shape[0]))
+
+
+def encode_jpeg(image: Image.Image, quality: int, optimize: bool = True) -> bytes:
+    buffer = _buffer()
+    image.save(buffer, format='JPEG', quality=quality, optimize=optimize)
+    return buffer.getvalue()
+
+
+def encode_bgra_jpeg(raw, size: Tuple[int, int], quality: int) -> bytes:
+    return encode_jpeg(bgra_image(raw, size), quality)
@@ -7,15 +7,86 @@ PASSWORD = os.environ.get('REMOTE_DESKTOP_PASSWORD', 'changeme')
 # Flask session secret
 SECRET_KEY = os.environ.get('REMOTE_DESKTOP_SECRET', 'replace-with-random-secret')
 
+# Frame source: 'mss' (local display) or 'synthetic[:static|scroll|video[:720p..5k|WxH[:seed]]]'
+# for running without a display (benchmarks, CI). Agent mode may use REMOTE_AGENT_FRAME_RING instead.
+FRAME_SOURCE = os.environ.get('REMOTE_DESKTOP_FRAME_SOURCE', 'mss')
+# Local input injection: 'pynput', or 'null' to drop events (no display)
+INPUT_BACKEND = os.environ.get('REMOTE_DESKTOP_INPUT_BACKEND', 'pynput')
+
 # Streaming / capture settings
-CAPTURE_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_INTERVAL', 0.8))  # seconds
+CAPTURE_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_INTERVAL', 0.8))  # seconds, idle rate
+# Fastest capture interval, used while the screen changes or right after input
+CAPTURE_INTERVAL_MIN = float(os.environ.get('REMOTE_DESKTOP_INTERVAL_MIN', 0.1))  # seconds
+ACTIVITY_BOOST = float(os.environ.get('REMOTE_DESKTOP_ACTIVITY_BOOST', 1.5))  # seconds at the fastest rate after input
+# Unchanged frames are not re-sent; one is still published this often as a heartbeat
+STREAM_KEEPALIVE_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_STREAM_KEEPALIVE', 5.0))  # seconds
+# Change detection compares every Nth pixel row of consecutive captures
+CHANGE_SAMPLE_STRIDE = int(os.environ.get('REMOTE_DESKTOP_CHANGE_SAMPLE_STRIDE', 4))
 IMAGE_QUALITY = int(os.environ.get('REMOTE_DESKTOP_JPEG_QUALITY', 60))
+# A viewer that receives no frame for this long is disconnected (it will reconnect)
+STREAM_STALL_TIMEOUT = float(os.environ.get('REMOTE_DESKTOP_STREAM_STALL_TIMEOUT', 10.0))  # seconds
+# Concurrent /stream and /stream/tiles viewers served by the ASGI gateway (asgi.py)
+MAX_VIEWERS = int(os.environ.get('REMOTE_DESKTOP_MAX_VIEWERS', 512))
+# Monitor layout is re-read this often so resolution changes apply without a restart
+LAYOUT_REFRESH = float(os.environ.get('REMOTE_DESKTOP_LAYOUT_REFRESH', 2.0))  # seconds
+# Distinct monitor / region views captured at once (one producer each)
+MAX_VIEWS = int(os.environ.get('REMOTE_DESKTOP_MAX_VIEWS', 8))
+
+# Cursor channel (/stream/cursor): 'auto' (XFixes, else the input backend's pointer
+# position), 'xfixes', 'pointer' or 'off'. Polled every CURSOR_INTERVAL while the
+# cursor moves or input arrives, every CURSOR_IDLE_INTERVAL otherwise
+CURSOR_BACKEND = os.environ.get('REMOTE_DESKTOP_CURSOR', 'auto')
+CURSOR_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_CURSOR_INTERVAL', 0.02))  # seconds
+CURSOR_IDLE_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_CURSOR_IDLE_INTERVAL', 0.1))  # seconds
+
+# Parallel JPEG encoding, opt-in: worker threads (0 = single optimized encode)
+# and stripe height (rounded down to 16 rows). Stripes skip Huffman
+# optimization, so frames get 5-45% larger; try min(4, cores) when one core
+# cannot keep up with the capture rate and bandwidth is not the limit.
+ENCODE_WORKERS = int(os.environ.get('REMOTE_DESKTOP_ENCODE_WORKERS', 0))
+ENCODE_STRIPE_HEIGHT = int(os.environ.get('REMOTE_DESKTOP_STRIPE_HEIGHT', 256))
+
+# Per-viewer adaptive quality: a write slower than ADAPTIVE_SEND_TARGET lowers
+# JPEG quality (then scale) for that viewer, fast writes raise them again
+ADAPTIVE_QUALITY_MIN = int(os.environ.get('REMOTE_DESKTOP_QUALITY_MIN', 30))
+ADAPTIVE_QUALITY_MAX = int(os.environ.get('REMOTE_DESKTOP_QUALITY_MAX', 80))
+ADAPTIVE_SCALE_MIN = float(os.environ.get('REMOTE_DESKTOP_SCALE_MIN', 0.5))
+ADAPTIVE_SEND_TARGET = float(os.environ.get('REMOTE_DESKTOP_SEND_TARGET', 0.15))  # seconds per frame write
+
+# Tile delta streaming (/stream/tiles): tile edge in pixels and forced keyframe period
+TILE_SIZE = int(os.environ.get('REMOTE_DESKTOP_TILE_SIZE', 64))
+TILE_KEYFRAME_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_TILE_KEYFRAME_INTERVAL', 10.0))  # seconds
+# Tile codec: 'hybrid' (lossless PNG / WebP for text and UI tiles, JPEG for photo
+# and video tiles) or 'jpeg'; encodings are cached by tile content up to TILE_CACHE_MB
+TILE_CODEC = os.environ.get('REMOTE_DESKTOP_TILE_CODEC', 'hybrid')
+TILE_CACHE_MB = float(os.environ.get('REMOTE_DESKTOP_TILE_CACHE_MB', 32))
+
+# H.264 stream (/stream/video; needs PyAV with libx264, else the dashboard stays on
+# MJPEG): target bitrate, IDR period and x264 preset. Every viewer runs its own
+# encoder, so at most VIDEO_MAX_VIEWERS are served at once
+VIDEO_BITRATE = int(os.environ.get('REMOTE_DESKTOP_VIDEO_BITRATE', 2_000_000))  # bits per second
+VIDEO_KEYFRAME_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_VIDEO_KEYFRAME_INTERVAL', 10.0))  # seconds
+VIDEO_PRESET = os.environ.get('REMOTE_DESKTOP_VIDEO_PRESET', 'ultrafast')
+VIDEO_MAX_VIEWERS = int(os.environ.get('REMOTE_DESKTOP_VIDEO_MAX_VIEWERS', 4))
+
+# Latency probe (/api/latency): samples kept per kind for the reported percentiles
+PROBE_WINDOW = int(os.environ.get('REMOTE_DESKTOP_PROBE_WINDOW', 1024))
+
+# Upper bound on events accepted in one /api/input/batch request or websocket message
+INPUT_BATCH_MAX = int(os.environ.get('REMOTE_DESKTOP_INPUT_BATCH_MAX', 256))
+# Pending (not yet injected) events allowed per session before input is refused
+INPUT_QUEUE_MAX = int(os.environ.get('REMOTE_DESKTOP_INPUT_QUEUE_MAX', 1024))
+
+# /metrics also accepts "Authorization: Bearer <token>" (for scrapers) when set
+METRICS_TOKEN = os.environ.get('REMOTE_DESKTOP_METRICS_TOKEN') or None
 
 # Rate limiting (per IP)
 RATE_LIMIT_WINDOW = int(os.environ.get('REMOTE_DESKTOP_RATE_WINDOW', 60))  # seconds
 RATE_LIMIT_ATTEMPTS = int(os.environ.get('REMOTE_DESKTOP_RATE_ATTEMPTS', 5))
+# Addresses with recent failed logins tracked at once (least recently failed dropped first)
+RATE_LIMIT_MAX_IPS = int(os.environ.get('REMOTE_DESKTOP_RATE_MAX_IPS', 4096))
 
-# Network restrictions (CIDR blocks)
+# Network restrictions (CIDR blocks; host bits are ignored, e.g. 127.0.0.1/8)
 ALLOWED_SUBNETS = os.environ.get(
     'REMOTE_DESKTOP_ALLOWED_SUBNETS',
     '127.0.0.1/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
@@ -30,11 +101,43 @@ WAKE_COMMANDS = [
     ).split(';') if cmd.strip()
 ]
 
+# Server-side black-screen detection: after REMOTE_DESKTOP_BLACK_AFTER seconds of
+# blank captures (every sampled pixel exactly black) the display is treated as
+# asleep, viewers get a placeholder and wake commands run with exponential backoff
+BLACK_SCREEN_DETECT = os.environ.get('REMOTE_DESKTOP_BLACK_DETECT', 'true').lower() in {'1', 'true', 'yes'}
+BLACK_SCREEN_AFTER = float(os.environ.get('REMOTE_DESKTOP_BLACK_AFTER', 3.0))  # seconds
+BLACK_SAMPLE_STRIDE = int(os.environ.get('REMOTE_DESKTOP_BLACK_SAMPLE_STRIDE', 16))  # pixels
+WAKE_BACKOFF = float(os.environ.get('REMOTE_DESKTOP_WAKE_BACKOFF', 5.0))  # seconds, doubles per attempt
+WAKE_BACKOFF_MAX = float(os.environ.get('REMOTE_DESKTOP_WAKE_BACKOFF_MAX', 60.0))  # seconds
+
 # Keep-alive interval (seconds) - prevents system from sleeping during active sessions
 KEEP_ALIVE_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_KEEP_ALIVE', 30.0))
+# Sessions without an open stream stop counting as active this long after their
+# last request; at most SESSION_MAX sessions are tracked
+SESSION_TTL = float(os.environ.get('REMOTE_DESKTOP_SESSION_TTL', 120.0))  # seconds
+SESSION_MAX = int(os.environ.get('REMOTE_DESKTOP_SESSION_MAX', 1024))
+
+# Session recording: while sessions are active, write keyframes + changed tiles
+# and injected input to REMOTE_DESKTOP_RECORD_DIR (disabled when unset), pulling
+# at most one update per RECORD_INTERVAL and a seek keyframe per RECORD_KEYFRAME
+RECORD_DIR = os.environ.get('REMOTE_DESKTOP_RECORD_DIR') or None
+RECORD_QUALITY = int(os.environ.get('REMOTE_DESKTOP_RECORD_QUALITY', 40))
+RECORD_INTERVAL = float(os.environ.get('REMOTE_DESKTOP_RECORD_INTERVAL', 0.5))  # seconds
+RECORD_KEYFRAME = float(os.environ.get('REMOTE_DESKTOP_RECORD_KEYFRAME', 60.0))  # seconds
 
 # Host agent integration
 AGENT_BASE_URL = os.environ.get('REMOTE_AGENT_BASE_URL', 'http://127.0.0.1:8787')
 AGENT_TOKEN = os.environ.get('REMOTE_AGENT_TOKEN', 'replace-this-agent-token')
 AGENT_TIMEOUT = float(os.environ.get('REMOTE_AGENT_TIMEOUT', 5.0))
+# Talk to the agent over this Unix domain socket instead of AGENT_BASE_URL when set
+AGENT_SOCKET = os.environ.get('REMOTE_AGENT_SOCKET') or None
+AGENT_POOL_SIZE = int(os.environ.get('REMOTE_AGENT_POOL_SIZE', 4))  # keep-alive connections
+# After REMOTE_AGENT_BREAKER_FAILURES failed calls in a row, fail agent calls at once
+# and poll its health every REMOTE_AGENT_BREAKER_PROBE seconds until it answers
+AGENT_BREAKER_FAILURES = int(os.environ.get('REMOTE_AGENT_BREAKER_FAILURES', 3))
+AGENT_BREAKER_PROBE = float(os.environ.get('REMOTE_AGENT_BREAKER_PROBE', 2.0))  # seconds
+AGENT_HEALTH_TTL = float(os.environ.get('REMOTE_AGENT_HEALTH_TTL', 5.0))  # seconds health() is cached
+# Read frames from the agent's shared-memory ring (HOST_AGENT_RING_NAME) instead
+# of capturing in-process; only used when the agent is enabled
+AGENT_FRAME_RING = os.environ.get('REMOTE_AGENT_FRAME_RING') or None
 AGENT_ENABLED = os.environ.get('REMOTE_AGENT_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
@@ -0,0 +1,340 @@
+"""
+Host cursor channel: pointer position and shape, separate from the frames.
+
+Frames are grabbed without the pointer (``mss`` ``with_cursor=False``), so a
+moving cursor never changes a frame and never costs an encode. Instead
+``CursorTracker`` polls the host cursor on its own thread while anyone
+listens (every ``interval`` seconds while it moves or input arrives, every
+``idle_interval`` otherwise) and publishes a new state only when the
+position or shape changed. ``/stream/cursor`` pushes those states as
+server-sent events and the dashboard draws the cursor over the stream.
+
+Probes:
+
+* ``XFixesProbe``: ``QueryPointer`` for the position (a few bytes per poll);
+  the cursor image is fetched (XFixes ``GetCursorImage``) only after an
+  XFixes cursor-change event and converted to PNG once per serial;
+* ``PointerProbe``: position only, e.g. ``pynput``'s mouse controller. The
+  dashboard then draws a default arrow.
+"""
+
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, Iterator, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+try:
+    from Xlib import display as xdisplay
+    from Xlib.ext import xfixes
+except Exception:  # pragma: no cover - python-xlib optional
+    xdisplay = xfixes = None
+
+logger = logging.getLogger(__name__)
+
+SHAPE_CACHE = 32  # cursor images kept per probe, by serial
+HEARTBEAT = 15.0  # seconds between SSE comments on a still cursor
+
+
+class CursorShape(NamedTuple):
+    serial: int
+    width: int
+    height: int
+    xhot: int
+    yhot: int
+    png: bytes
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            'serial': self.serial,
+            'width': self.width,
+            'height': self.height,
+            'xhot': self.xhot,
+            'yhot': self.yhot,
+            'image': 'data:image/png;base64,' + base64.b64encode(self.png).decode('ascii'),
+        }
+
+
+class CursorState(NamedTuple):
+    seq: int
+    x: int  # virtual-screen pixels
+    y: int
+    shape: CursorShape | None
+
+
+def cursor_shape(serial: int, width: int, height: int, xhot: int, yhot: int, argb) -> CursorShape:
+    """PNG cursor from XFixes pixels (premultiplied ARGB, one 32-bit word each)."""
+    pixels = np.asarray(argb, dtype='<u4').reshape(height, width).view(np.uint8).reshape(height, width, 4)
+    alpha = pixels[..., 3:4].astype(np.uint16)
+    # BGRA in memory; undo the premultiplication for PNG.
+    rgb = np.where(alpha > 0, pixels[..., 2::-1].astype(np.uint16) * 255 // np.maximum(alpha, 1), 0)
+    rgba = np.concatenate([np.minimum(rgb, 255), alpha], axis=2).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG', optimize=True)
+    return CursorShape(serial, width, height, xhot, yhot, buffer.getvalue())
+
+
+class XFixesProbe:
+    def __init__(self) -> None:
+        if xdisplay is None:
+            raise RuntimeError('python-xlib is not installed')
+        self._display = xdisplay.Display()
+        if not self._display.has_extension('XFIXES'):
+            self._display.close()
+            raise RuntimeError('XFIXES extension not available')
+        self._display.xfixes_query_version()
+        self._root = self._display.screen().root
+        self._display.xfixes_select_cursor_input(self._root, xfixes.XFixesDisplayCursorNotifyMask)
+        self._shapes: OrderedDict[int, CursorShape] = OrderedDict()
+        self._shape: CursorShape | None = None
+
+    def __call__(self) -> Tuple[int, int, CursorShape | None]:
+        changed = self._shape is None
+        while self._display.pending_events():
+            self._display.next_event()
+            changed = True
+        if changed:
+            reply = self._display.xfixes_get_cursor_image(self._root)
+            shape = self._shapes.get(reply.cursor_serial)
+            if shape is None:
+                shape = cursor_shape(
+                    reply.cursor_serial, reply.width, reply.height, reply.xhot, reply.yhot, reply.cursor_image
+                )
+                self._shapes[shape.serial] = shape
+                while len(self._shapes) > SHAPE_CACHE:
+                    self._shapes.popitem(last=False)
+            self._shapes.move_to_end(shape.serial)
+            self._shape = shape
+            return reply.x, reply.y, shape
+        pointer = self._root.query_pointer()
+        return pointer.root_x, pointer.root_y, self._shape
+
+    def close(self) -> None:
+        self._display.close()
+
+
+class PointerProbe:
+    def __init__(self, position: Callable[[], Tuple[int, int]]) -> None:
+        self._position = position
+
+    def __call__(self) -> Tuple[int, int, CursorShape | None]:
+        x, y = self._position()
+        return int(x), int(y), None
+
+    def close(self) -> None:
+        pass
+
+
+def create_probe(backend: str, position: Callable[[], Tuple[int, int]] | None = None):
+    """``xfixes``, ``pointer`` (needs ``position``), ``auto`` (the first that works) or ``off``."""
+    if backend in ('auto', 'xfixes'):
+        try:
+            return XFixesProbe()
+        except Exception as exc:
+            if backend == 'xfixes':
+                raise
+            logger.info('XFixes cursor probe unavailable: %s', exc)
+    if backend in ('auto', 'pointer') and position is not None:
+        return PointerProbe(position)
+    if backend not in ('auto', 'pointer', 'off'):
+        raise ValueError(f'unknown cursor backend {backend!r}')
+    return None
+
+
+class CursorSubscription:
+    """Iterate for cursor states; ``None`` means nothing changed for ``HEARTBEAT`` seconds."""
+
+    def __init__(self, tracker: 'CursorTracker') -> None:
+        self._tracker = tracker
+        self._last_seq = 0
+        self._closed = False
+
+    def __enter__(self) -> 'CursorSubscription':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[CursorState | None]:
+        while not self._closed:
+            state = self._tracker.wait(self._last_seq, HEARTBEAT)
+            if state is not None:
+                self._last_seq = state.seq
+            yield state
+
+    async def __aiter__(self) -> AsyncIterator[CursorState | None]:
+        while not self._closed:
+            state = await self._tracker.wait_async(self._last_seq, HEARTBEAT)
+            if state is not None:
+                self._last_seq = state.seq
+            yield state
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._tracker._unsubscribe()
+
+
+class CursorTracker:
+    def __init__(
+        self,
+        probe: Callable[[], Tuple[int, int, CursorShape | None]],
+        interval: float = 0.02,
+        idle_interval: float = 0.1,
+        active_for: float = 1.0,
+    ) -> None:
+        self._probe = probe
+        self.interval = interval
+        self.idle_interval = max(interval, idle_interval)
+        self._active_for = active_for
+        self._active_until = 0.0
+        self._wake = threading.Event()
+        self._cond = threading.Condition()
+        self._latest: CursorState | None = None
+        self._subscribers = 0
+        self._loop_events: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+        self._thread: threading.Thread | None = None
+        self.last_error: str | None = None
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def latest(self) -> CursorState | None:
+        return self._latest
+
+    def notify_activity(self) -> None:
+        """Poll at the fast rate for a while, starting now (input was injected)."""
+        self._active_until = time.monotonic() + self._active_for
+        self._wake.set()
+
+    def subscribe(self) -> CursorSubscription:
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cursor-tracker', daemon=True)
+                self._thread.start()
+        return CursorSubscription(self)
+
+    def _unsubscribe(self) -> None:
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+
+    def wait(self, after_seq: int, timeout: float) -> CursorState | None:
+        """Block until a state newer than ``after_seq`` is published."""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._latest is not None and self._latest.seq > after_seq,
+                timeout,
+            )
+            return self._latest if ready else None
+
+    async def wait_async(self, after_seq: int, timeout: float) -> CursorState | None:
+        """``wait`` for coroutines on an event loop."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            event = self._loop_events.get(loop)
+            if event is None:
+                event = self._loop_events[loop] = asyncio.Event()
+            latest = self._latest
+            if latest is not None and latest.seq > after_seq:
+                return latest
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def _wake_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        event = self._loop_events.pop(loop, None)
+        if event is not None:
+            event.set()
+
+    def _publish(self, x: int, y: int, shape: CursorShape | None) -> None:
+        with self._cond:
+            seq = self._latest.seq + 1 if self._latest is not None else 1
+            self._latest = CursorState(seq, x, y, shape)
+            self._cond.notify_all()
+        for loop in tuple(self._loop_events):
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:  # loop closed
+                self._loop_events.pop(loop, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._subscribers == 0:
+                    self._thread = None
+                    return
+            started = time.monotonic()
+            try:
+                x, y, shape = self._probe()
+            except Exception as exc:
+                if str(exc) != self.last_error:
+                    logger.warning('Cursor probe failed: %s', exc)
+                self.last_error = str(exc)
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            latest = self._latest
+            if latest is None or (x, y, shape) != latest[1:]:
+                self._publish(x, y, shape)
+                self._active_until = max(self._active_until, started + self._active_for)
+            fast = time.monotonic() < self._active_until
+            self._wake.wait(max(0.0, (self.interval if fast else self.idle_interval) - (time.monotonic() - started)))
+            self._wake.clear()
+
+
+class CursorFeed:
+    """Server-sent events for one viewer.
+
+    Positions are relative to the viewer's view (0..1 inside it, ``inside``
+    false outside); each shape is sent once, before the first position that
+    uses it.
+    """
+
+    def __init__(self, region: Callable[[], Dict[str, int]]) -> None:
+        self._region = region
+        self._shapes: set = set()
+
+    def event(self, state: CursorState | None) -> bytes:
+        if state is None:
+            metrics.CURSOR_EVENTS.labels('keepalive').inc()
+            return b': keepalive\n\n'
+        chunks = []
+        shape = state.shape
+        if shape is not None and shape.serial not in self._shapes:
+            if len(self._shapes) >= SHAPE_CACHE:
+                self._shapes.clear()
+            self._shapes.add(shape.serial)
+            metrics.CURSOR_EVENTS.labels('shape').inc()
+            chunks.append(b'event: shape\ndata: ' + json.dumps(shape.as_dict()).encode() + b'\n\n')
+        region = self._region()
+        x = (state.x - region['left']) / region['width']
+        y = (state.y - region['top']) / region['height']
+        position = {
+            'x': round(x, 5),
+            'y': round(y, 5),
+            'inside': 0.0 <= x < 1.0 and 0.0 <= y < 1.0,
+            'shape': shape.serial if shape is not None else None,
+        }
+        metrics.CURSOR_EVENTS.labels('position').inc()
+        chunks.append(b'data: ' + json.dumps(position, separators=(',', ':')).encode() + b'\n\n')
+        return b''.join(chunks)
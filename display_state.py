@@ -0,0 +1,149 @@
+"""
+Server-side black-screen (display asleep) detection for the frame producer.
+
+``DisplayMonitor.observe`` looks at a strided sample of each captured frame
+(every ``stride``-th pixel of every ``stride``-th row of the BGRA buffer the
+producer already holds, or a DCT-scaled draft decode of an upstream JPEG).
+A frame is *blank* only if every sample is exactly black: a dark terminal,
+a dark theme or a paused film still has some non-zero pixels. A powered-down
+output captures as uniform zeros, and keeps capturing the same frame, so a
+blank screen is also a stale one. Once captures have been blank for
+``black_after`` seconds the display is considered asleep:
+
+* the ``wake`` callback runs on a background thread, then again with
+  exponential backoff (``wake_backoff`` doubling up to ``wake_backoff_max``)
+  for as long as the screen stays blank;
+* the producer publishes a small pre-encoded placeholder instead of encoding
+  full black frames. Only a screen that is exactly black can be replaced, so
+  a dark desktop is never hidden behind it;
+* ``state()`` reports it to clients and published frames carry the flag
+  (tile packets too).
+"""
+
+
+from __future__ import annotations
+
+import io
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from capture import RawFrame
+
+logger = logging.getLogger(__name__)
+
+# Colour channels of a BGRA pixel; alpha is whatever the capture backend sets.
+RGB_MASK = 0x00FFFFFF
+PLACEHOLDER_SIZE = (320, 180)
+
+
+def is_blank(frame: RawFrame, stride: int) -> bool:
+    """Whether every pixel of a strided sample of ``frame`` is exactly black."""
+    width, height = frame.size
+    if frame.data is not None:
+        # One masked test per sampled 32-bit BGRA pixel (~15us at 1080p, stride 16).
+        pixels = np.frombuffer(frame.data, dtype=np.uint32, count=width * height).reshape(height, width)
+        return not np.any(pixels[::stride, ::stride] & RGB_MASK)
+    image = Image.open(io.BytesIO(frame.jpeg))
+    image.draft('RGB', (max(1, width // stride), max(1, height // stride)))
+    return not np.any(np.asarray(image.convert('RGB')))
+
+
+def placeholder_frame(size: Tuple[int, int] = PLACEHOLDER_SIZE, quality: int = 60) -> RawFrame:
+    """Tiny pre-encoded "display asleep" frame."""
+    image = Image.new('RGB', size, (24, 26, 32))
+    draw = ImageDraw.Draw(image)
+    text = 'Display asleep - waking...'
+    left, top, right, bottom = draw.textbbox((0, 0), text)
+    draw.text(((size[0] - right + left) / 2, (size[1] - bottom + top) / 2), text, fill=(200, 200, 210))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return RawFrame(None, size, buffer.getvalue(), quality)
+
+
+class DisplayMonitor:
+    def __init__(
+        self,
+        wake: Callable[[], Any] | None = None,
+        stride: int = 16,
+        black_after: float = 3.0,
+        wake_backoff: float = 5.0,
+        wake_backoff_max: float = 60.0,
+        quality: int = 60,
+    ) -> None:
+        self._wake = wake
+        self.stride = max(1, stride)
+        self.black_after = black_after
+        self.wake_backoff = wake_backoff
+        self.wake_backoff_max = wake_backoff_max
+        self.placeholder = placeholder_frame(quality=quality)
+        self.asleep = False
+        self.blank = False
+        self.wake_attempts = 0
+        self.last_wake_error: str | None = None
+        self._black_since: float | None = None
+        self._since = time.time()
+        self._next_wake = 0.0
+        self._backoff = wake_backoff
+        self._waking = threading.Lock()
+        self._last_key = None
+
+    def observe(self, frame: RawFrame) -> bool:
+        """Update the state from a new capture; returns whether the display is asleep."""
+        # The agent ring source hands back the same frame while nothing new was published.
+        key = frame.data if frame.data is not None else frame.jpeg
+        if key is not self._last_key:
+            self._last_key = key
+            self.blank = is_blank(frame, self.stride)
+        now = time.monotonic()
+        if not self.blank:
+            if self.asleep:
+                logger.info('Display awake again')
+                self._since = time.time()
+            self.asleep = False
+            self._black_since = None
+            self._backoff = self.wake_backoff
+            self._next_wake = 0.0
+            return False
+
+        if self._black_since is None:
+            self._black_since = now
+        if not self.asleep and now - self._black_since >= self.black_after:
+            logger.info('Display appears to be asleep')
+            self.asleep = True
+            self._since = time.time()
+        if self.asleep and now >= self._next_wake:
+            self._next_wake = now + self._backoff
+            self._backoff = min(self.wake_backoff_max, self._backoff * 2)
+            self._trigger_wake()
+        return self.asleep
+
+    def _trigger_wake(self) -> None:
+        if self._wake is None or not self._waking.acquire(blocking=False):
+            return  # a wake attempt is still running
+        self.wake_attempts += 1
+        threading.Thread(target=self._run_wake, name='display-wake', daemon=True).start()
+
+    def _run_wake(self) -> None:
+        try:
+            self._wake()
+            self.last_wake_error = None
+        except Exception as exc:
+            self.last_wake_error = str(exc)
+            logger.warning('Display wake failed: %s', exc)
+        finally:
+            self._waking.release()
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            'state': 'asleep' if self.asleep else 'awake',
+            'since': self._since,
+            'blank': self.blank,
+            'wake_attempts': self.wake_attempts,
+            'next_wake_in': round(max(0.0, self._next_wake - time.monotonic()), 1) if self.asleep else None,
+            'last_wake_error': self.last_wake_error,
+        }
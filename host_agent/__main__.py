@@ -13,6 +13,7 @@ def main() -> None:
         'host_agent.server:app',
         host=settings.bind,
         port=settings.port,
+        uds=settings.uds,
         reload=False,
         log_level=settings.log_level.lower(),
     )
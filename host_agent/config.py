@@ -9,10 +9,21 @@ from pydantic import BaseModel
 class AgentSettings(BaseModel):
     bind: str = os.environ.get('HOST_AGENT_BIND', '127.0.0.1')
     port: int = int(os.environ.get('HOST_AGENT_PORT', 8787))
+    # Serve on this Unix domain socket instead of bind/port when set
+    uds: str | None = os.environ.get('HOST_AGENT_UDS') or None
     token: str = os.environ.get('HOST_AGENT_TOKEN', 'replace-this-agent-token')
     log_level: str = os.environ.get('HOST_AGENT_LOG_LEVEL', 'INFO')
     state_dir: Path = Path(os.environ.get('HOST_AGENT_STATE_DIR', '/tmp/host_agent'))
     enable_stub_capture: bool = os.environ.get('HOST_AGENT_STUB_CAPTURE', 'true').lower() in {'1', 'true', 'yes'}
+    # Real capture: frames go into the shared-memory ring named ring_name
+    enable_capture: bool = os.environ.get('HOST_AGENT_CAPTURE', 'false').lower() in {'1', 'true', 'yes'}
+    capture_interval: float = float(os.environ.get('HOST_AGENT_CAPTURE_INTERVAL', 0.1))  # seconds
+    capture_codec: str = os.environ.get('HOST_AGENT_CAPTURE_CODEC', 'jpeg')  # jpeg | bgra
+    jpeg_quality: int = int(os.environ.get('HOST_AGENT_JPEG_QUALITY', 60))
+    ring_name: str = os.environ.get('HOST_AGENT_RING_NAME', 'remote-desktop-frames')
+    ring_slots: int = int(os.environ.get('HOST_AGENT_RING_SLOTS', 4))
+    # Per-slot payload limit; raw 'bgra' frames need width * height * 4
+    ring_slot_bytes: int = int(os.environ.get('HOST_AGENT_RING_SLOT_BYTES', 8 * 1024 * 1024))
 
 
 settings = AgentSettings()
@@ -0,0 +1,160 @@
+"""
+Shared-memory ring buffer carrying captured frames from the agent to the gateway.
+
+The agent is the single writer; any number of gateway processes attach as
+readers by name, so one capture serves every worker. Reads hand out a
+``memoryview`` straight into the shared segment (no copy); each slot is
+guarded by a sequence lock so a reader can tell whether the writer has
+started overwriting the slot while it was being used.
+
+Layout (little-endian)::
+
+    header  (64 bytes): magic 8s, slots u32, slot_bytes u32, latest_seq u64
+    slot[i] (64 bytes + slot_bytes):
+        seq_begin u64, seq_end u64, timestamp f64,
+        length u32, width u32, height u32, codec 4s, quality u8, payload...
+
+The writer stores ``seq_begin`` before touching a slot and ``seq_end`` plus
+the header's ``latest_seq`` after; a slot is consistent while
+``seq_begin == seq_end``. This relies on stores becoming visible in program
+order, which holds on x86 and for the aligned 8-byte fields on ARM64 in
+practice; readers re-validate after use either way.
+
+Stdlib only, so the gateway can import it without the agent's dependencies.
+"""
+
+
+from __future__ import annotations
+
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple, Tuple
+
+MAGIC = b'RDRING1\x00'
+
+_HEADER = struct.Struct('<8sIIQ')
+_SLOT = struct.Struct('<QQdIII4sB')
+HEADER_BYTES = 64
+SLOT_HEADER_BYTES = 64
+
+CODEC_JPEG = b'jpeg'
+CODEC_BGRA = b'bgra'
+
+
+class RingError(RuntimeError):
+    """Raised for a missing, mismatched or overwritten ring."""
+
+
+class RingFrame(NamedTuple):
+    seq: int
+    timestamp: float
+    size: Tuple[int, int]
+    codec: bytes
+    quality: int  # JPEG quality, 0 for raw codecs
+    view: memoryview
+
+
+def _segment_bytes(slots: int, slot_bytes: int) -> int:
+    return HEADER_BYTES + slots * (SLOT_HEADER_BYTES + slot_bytes)
+
+
+class FrameRingWriter:
+    def __init__(self, name: str, slots: int, slot_bytes: int) -> None:
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        size = _segment_bytes(slots, slot_bytes)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a previous agent run: replace it.
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buf = self._shm.buf
+        self._seq = 0
+        _HEADER.pack_into(self._buf, 0, MAGIC, slots, slot_bytes, 0)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(
+        self,
+        payload,
+        size: Tuple[int, int],
+        codec: bytes,
+        quality: int = 0,
+        timestamp: float | None = None,
+    ) -> int:
+        """Publish one frame; returns its sequence number."""
+        length = len(payload)
+        if length > self.slot_bytes:
+            raise RingError(f'frame of {length} bytes exceeds slot size {self.slot_bytes}')
+        seq = self._seq + 1
+        offset = HEADER_BYTES + (seq % self.slots) * (SLOT_HEADER_BYTES + self.slot_bytes)
+        struct.pack_into('<Q', self._buf, offset, seq)  # seq_begin: slot is being rewritten
+        data_start = offset + SLOT_HEADER_BYTES
+        self._buf[data_start:data_start + length] = payload
+        _SLOT.pack_into(
+            self._buf, offset, seq, seq, timestamp or time.time(), length, size[0], size[1], codec, quality
+        )
+        struct.pack_into('<Q', self._buf, 16, seq)  # header latest_seq
+        self._seq = seq
+        return seq
+
+    def close(self) -> None:
+        self._buf.release()
+        self._shm.close()
+        self._shm.unlink()
+
+
+class FrameRingReader:
+    def __init__(self, name: str) -> None:
+        # Readers must not unlink the writer's segment when they exit.
+        if sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._buf = self._shm.buf
+        magic, self.slots, self.slot_bytes, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            self.close()
+            raise RingError(f'{name} is not a frame ring')
+
+    @property
+    def latest_seq(self) -> int:
+        return struct.unpack_from('<Q', self._buf, 16)[0]
+
+    def _offset(self, seq: int) -> int:
+        return HEADER_BYTES + (seq % self.slots) * (SLOT_HEADER_BYTES + self.slot_bytes)
+
+    def read(self, after_seq: int = 0) -> RingFrame | None:
+        """Zero-copy view of the newest frame if it is newer than ``after_seq``."""
+        seq = self.latest_seq
+        if seq <= after_seq:
+            return None
+        offset = self._offset(seq)
+        begin, end, timestamp, length, width, height, codec, quality = _SLOT.unpack_from(self._buf, offset)
+        if begin != seq or end != seq:
+            return None  # overwritten between reading latest_seq and the slot
+        start = offset + SLOT_HEADER_BYTES
+        return RingFrame(seq, timestamp, (width, height), codec, quality, self._buf[start:start + length])
+
+    def valid(self, frame: RingFrame) -> bool:
+        """Whether ``frame``'s slot is still intact (call after using the view)."""
+        return struct.unpack_from('<Q', self._buf, self._offset(frame.seq))[0] == frame.seq
+
+    def copy(self, frame: RingFrame) -> bytes:
+        """Detach ``frame``'s payload from the ring, checking it was not torn."""
+        data = bytes(frame.view)
+        if not self.valid(frame):
+            raise RingError(f'frame {frame.seq} was overwritten while reading')
+        return data
+
+    def close(self) -> None:
+        self._buf.release()
+        self._shm.close()
@@ -0,0 +1,116 @@
+"""
+Agent-side capture/encode loop publishing into the shared-memory frame ring.
+
+One thread grabs the screen with an ``mss`` handle (reopened every
+``LAYOUT_REFRESH`` seconds and after a failed grab, so the ring follows
+resolution changes), encodes it (JPEG by default, or passes raw BGRA
+through) and writes the result into a ``FrameRingWriter``. Unchanged captures are skipped, except for one frame
+every ``keepalive`` seconds so readers can tell the agent is alive.
+"""
+
+
+from __future__ import annotations
+
+import io
+import logging
+import threading
+import time
+
+from .config import settings
+from .framering import CODEC_BGRA, CODEC_JPEG, FrameRingWriter
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_REFRESH = 5.0  # seconds between re-reads of the monitor layout
+
+
+class CapturePipeline:
+    def __init__(
+        self,
+        ring_name: str,
+        slots: int,
+        slot_bytes: int,
+        interval: float,
+        codec: str = 'jpeg',
+        quality: int = 60,
+        keepalive: float = 5.0,
+    ) -> None:
+        self.codec = CODEC_BGRA if codec == 'bgra' else CODEC_JPEG
+        self.quality = quality
+        self.interval = interval
+        self.keepalive = keepalive
+        self.ring = FrameRingWriter(ring_name, slots, slot_bytes)
+        self.frames = 0
+        self.skipped = 0
+        self.last_error: str | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='agent-capture', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.ring.close()
+
+    def stats(self) -> dict:
+        return {
+            'ring': self.ring.name,
+            'codec': self.codec.decode(),
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'last_error': self.last_error,
+        }
+
+    def _encode(self, raw, size) -> bytes:
+        from PIL import Image
+
+        image = Image.frombuffer('RGB', size, raw, 'raw', 'BGRX', 0, 1)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=self.quality, optimize=True)
+        return buffer.getvalue()
+
+    def _run(self) -> None:
+        import mss
+
+        previous = None
+        last_write = 0.0
+        while not self._stop.is_set():
+            # A fresh handle re-reads the monitor layout, so resolution and
+            # layout changes reach the ring without restarting the agent.
+            with mss.mss() as sct:
+                monitor = sct.monitors[0]
+                reopen_at = time.monotonic() + LAYOUT_REFRESH
+                while not self._stop.is_set() and time.monotonic() < reopen_at:
+                    started = time.monotonic()
+                    try:
+                        shot = sct.grab(monitor)
+                        raw = shot.raw
+                        if raw == previous and started - last_write < self.keepalive:
+                            self.skipped += 1
+                        else:
+                            size = tuple(shot.size)
+                            if self.codec == CODEC_JPEG:
+                                self.ring.write(self._encode(raw, size), size, CODEC_JPEG, self.quality)
+                            else:
+                                self.ring.write(raw, size, CODEC_BGRA)
+                            previous = raw
+                            last_write = started
+                            self.frames += 1
+                    except Exception as exc:
+                        self.last_error = str(exc)
+                        logger.warning('Frame capture failed: %s', exc)
+                        reopen_at = 0.0
+                    self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def from_settings() -> CapturePipeline:
+    return CapturePipeline(
+        settings.ring_name,
+        slots=settings.ring_slots,
+        slot_bytes=settings.ring_slot_bytes,
+        interval=settings.capture_interval,
+        codec=settings.capture_codec,
+        quality=settings.jpeg_quality,
+    )
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import logging
 import time
-from typing import Any, Dict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
 
 from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse
@@ -12,7 +13,27 @@ from .config import settings
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title='Host Agent Stub', version='0.1.0')
+pipeline = None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    global pipeline
+    if settings.enable_capture:
+        from .pipeline import from_settings
+
+        pipeline = from_settings()
+        pipeline.start()
+        logger.info('Publishing frames to shared memory ring %s', pipeline.ring.name)
+    try:
+        yield
+    finally:
+        if pipeline is not None:
+            pipeline.stop()
+            pipeline = None
+
+
+app = FastAPI(title='Host Agent Stub', version='0.1.0', lifespan=lifespan)
 
 
 def verify_token(request: Request) -> None:
@@ -34,6 +55,10 @@ class InputPayload(BaseModel):
     double: bool | None = None
 
 
+class InputBatch(BaseModel):
+    events: List[InputPayload]
+
+
 class WebRTCOffer(BaseModel):
     sdp: str
     type: str
@@ -45,32 +70,48 @@ def health() -> Dict[str, Any]:
 
 
 @app.post('/api/keepalive')
-def keepalive(_: Request = Depends(verify_token)) -> Dict[str, Any]:
+def keepalive(_: None = Depends(verify_token)) -> Dict[str, Any]:
     logger.debug('Keepalive ping received')
     return {'status': 'ok'}
 
 
 @app.post('/api/input')
-def input_event(payload: InputPayload, _: Request = Depends(verify_token)) -> Dict[str, Any]:
+def input_event(payload: InputPayload, _: None = Depends(verify_token)) -> Dict[str, Any]:
     logger.info('Stub agent received input: %s', payload.dict())
     return {'status': 'queued'}
 
 
+@app.post('/api/input/batch')
+def input_batch(batch: InputBatch, _: None = Depends(verify_token)) -> Dict[str, Any]:
+    # Events are applied in list order; one round trip for many events.
+    for payload in batch.events:
+        logger.debug('Stub agent received input: %s', payload.dict())
+    return {'status': 'queued', 'count': len(batch.events)}
+
+
 @app.post('/api/wake')
-def wake(_: Request = Depends(verify_token)) -> Dict[str, Any]:
+def wake(_: None = Depends(verify_token)) -> Dict[str, Any]:
     logger.info('Stub wake invoked')
     return {'status': 'ok', 'message': 'Stub wake executed'}
 
 
 @app.post('/api/webrtc/offer')
-def negotiate(offer: WebRTCOffer, _: Request = Depends(verify_token)) -> Dict[str, Any]:
+def negotiate(offer: WebRTCOffer, _: None = Depends(verify_token)) -> Dict[str, Any]:
     logger.info('Received WebRTC offer (len=%s)', len(offer.sdp))
     # Placeholder answer
     return {'status': 'stub', 'sdp': offer.sdp, 'type': 'answer'}
 
 
+@app.get('/api/stream/info')
+def stream_info(_: None = Depends(verify_token)) -> Dict[str, Any]:
+    if pipeline is None:
+        return {'status': 'disabled'}
+    return {'status': 'ok', **pipeline.stats()}
+
+
 @app.get('/api/stream/mock')
-def mock_stream(_: Request = Depends(verify_token)):
+def mock_stream(_: None = Depends(verify_token)):
+    # Testing fallback only; real frames go through the shared-memory ring.
     if not settings.enable_stub_capture:
         raise HTTPException(status_code=404, detail='Mock stream disabled')
 
@@ -0,0 +1,158 @@
+"""
+Ordered per-session input queue drained by a single injector thread.
+
+Request handlers only enqueue and return, so HTTP/websocket workers never
+block on ``pynput`` or the agent, and concurrent requests cannot reorder a
+session's key down/up events. While events wait, a pointer move that
+directly follows another pending move replaces it: only the latest position
+matters. Presses, releases, clicks and scrolls are never merged or reordered.
+The injector serves sessions round-robin and hands each one all of its
+pending events at once, so the apply callback can forward them as a batch.
+``on_applied`` is then told which session's events went through (the
+latency probe's input marks, see ``probe``).
+
+``clean_event`` checks each event against the fields the host agent's
+``InputPayload`` accepts before it is queued, so a malformed event is
+dropped on its own instead of failing the batch it would be sent or
+applied with.
+"""
+
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class InputQueueFull(RuntimeError):
+    """Raised when a session already has too many pending events."""
+
+
+class InputUnavailable(RuntimeError):
+    """Raised instead of queueing when the events could not be injected anyway."""
+
+
+TEXT_FIELDS = ('action', 'key', 'code', 'button', 'eventType')
+NUMBER_FIELDS = ('x', 'y', 'deltaY')
+# Latency probe tags (see ``probe``), kept as they are.
+PROBE_FIELDS = ('id', 't')
+
+
+def clean_event(event: Any) -> Dict[str, Any] | None:
+    """``event`` with numbers coerced to ``float``, or ``None`` if it is malformed."""
+    if not isinstance(event, dict) or not isinstance(event.get('type'), str):
+        return None
+    cleaned: Dict[str, Any] = {'type': event['type']}
+    for field in TEXT_FIELDS:
+        value = event.get(field)
+        if value is not None:
+            if not isinstance(value, str):
+                return None
+            cleaned[field] = value
+    for field in NUMBER_FIELDS:
+        value = event.get(field)
+        if value is not None:
+            if isinstance(value, bool):
+                return None
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+            if not math.isfinite(value):
+                return None
+            cleaned[field] = value
+    if event.get('double') is not None:
+        cleaned['double'] = bool(event['double'])
+    for field in PROBE_FIELDS:
+        if field in event:
+            cleaned[field] = event[field]
+    return cleaned
+
+
+def is_move(event: Dict[str, Any]) -> bool:
+    return event.get('type') == 'mouse' and event.get('action') == 'move'
+
+
+class InputQueue:
+    def __init__(
+        self,
+        apply: Callable[[List[Dict[str, Any]]], None],
+        max_depth: int = 1024,
+        on_applied: Callable[[str, List[Dict[str, Any]]], None] | None = None,
+    ) -> None:
+        self._apply = apply
+        self._on_applied = on_applied
+        self._max_depth = max_depth
+        self._cond = threading.Condition()
+        self._queues: 'OrderedDict[str, Deque[Dict[str, Any]]]' = OrderedDict()
+        self._thread: threading.Thread | None = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.errors = 0
+        self.last_error: str | None = None
+
+    def submit(self, session_id: str, events: List[Dict[str, Any]]) -> int:
+        """Queue ``events`` for ``session_id``; returns that session's depth."""
+        with self._cond:
+            queue = self._queues.get(session_id)
+            if queue is None:
+                queue = self._queues[session_id] = deque()
+            if len(queue) + len(events) > self._max_depth:
+                raise InputQueueFull(f'more than {self._max_depth} pending input events')
+            for event in events:
+                if queue and is_move(event) and is_move(queue[-1]):
+                    queue[-1] = event
+                    self.coalesced += 1
+                else:
+                    queue.append(event)
+            self.submitted += len(events)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='input-injector', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return len(queue)
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            sessions = {session_id[:8]: len(queue) for session_id, queue in self._queues.items()}
+        return {
+            'depth': sum(sessions.values()),
+            'sessions': sessions,
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'applied': self.applied,
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
+
+    def _next_batch(self) -> Tuple[str, List[Dict[str, Any]]]:
+        with self._cond:
+            self._cond.wait_for(lambda: bool(self._queues))
+            session_id, queue = self._queues.popitem(last=False)
+            # Everything this session queued so far, in order; the session
+            # goes to the back of the line if it submits more meanwhile.
+            return session_id, list(queue)
+
+    def _run(self) -> None:
+        while True:
+            session_id, batch = self._next_batch()
+            try:
+                self._apply(batch)
+                self.applied += len(batch)
+                if self._on_applied is not None:
+                    self._on_applied(session_id, batch)
+            except Exception as exc:
+                self.errors += 1
+                self.last_error = str(exc)
+                logger.warning('Input injection failed: %s', exc)
@@ -0,0 +1,104 @@
+"""
+Long-lived display keep-alive for while remote sessions are connected.
+
+Rather than forking ``xset``/``loginctl`` on every tick:
+
+* one ``systemd-inhibit ... sleep infinity`` child holds an idle/sleep
+  inhibitor lock from the first tick until ``release()``;
+* a persistent X connection (python-xlib, optional) resets the screen saver
+  and DPMS timers on each tick, the equivalent of ``xset s reset`` as a
+  single request on an already open socket.
+
+Mechanisms that are unavailable are detected once and skipped.
+"""
+
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import subprocess
+
+try:
+    from Xlib import X
+    from Xlib import display as xdisplay
+except Exception:  # pragma: no cover - python-xlib optional
+    X = xdisplay = None
+
+logger = logging.getLogger(__name__)
+
+
+class DisplayKeepAlive:
+    def __init__(self, inhibit: bool = True) -> None:
+        self._inhibit_cmd = shutil.which('systemd-inhibit') if inhibit else None
+        self._inhibitor: subprocess.Popen | None = None
+        self._display = None
+
+    @property
+    def held(self) -> bool:
+        return self._inhibitor is not None or self._display is not None
+
+    def tick(self) -> None:
+        self._hold_inhibitor()
+        self._reset_screensaver()
+
+    def _hold_inhibitor(self) -> None:
+        if self._inhibit_cmd is None:
+            return
+        if self._inhibitor is not None:
+            if self._inhibitor.poll() is None:
+                return
+            # Exited on its own (no logind, denied by polkit): do not respawn every tick.
+            logger.info('systemd-inhibit exited with %s; inhibitor disabled', self._inhibitor.returncode)
+            self._inhibitor = None
+            self._inhibit_cmd = None
+            return
+        try:
+            self._inhibitor = subprocess.Popen(
+                [
+                    self._inhibit_cmd,
+                    '--what=idle:sleep',
+                    '--who=remote-desktop',
+                    '--why=Remote session active',
+                    '--mode=block',
+                    'sleep', 'infinity',
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as exc:
+            logger.info('systemd-inhibit unavailable: %s', exc)
+            self._inhibit_cmd = None
+
+    def _reset_screensaver(self) -> None:
+        if xdisplay is None or not os.environ.get('DISPLAY'):
+            return
+        try:
+            if self._display is None:
+                self._display = xdisplay.Display()
+            self._display.force_screen_saver(X.ScreenSaverReset)
+            self._display.flush()
+        except Exception as exc:
+            logger.debug('Screen saver reset failed: %s', exc)
+            self._close_display()
+
+    def _close_display(self) -> None:
+        if self._display is not None:
+            try:
+                self._display.close()
+            except Exception:
+                pass
+            self._display = None
+
+    def release(self) -> None:
+        """Drop the inhibitor and X connection (no sessions left)."""
+        if self._inhibitor is not None:
+            self._inhibitor.terminate()
+            try:
+                self._inhibitor.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._inhibitor.kill()
+            self._inhibitor = None
+        self._close_display()
@@ -0,0 +1,238 @@
+"""
+In-process pipeline metrics rendered in the Prometheus text format (0.0.4).
+
+A deliberately small registry instead of a client library: counters,
+callback gauges and fixed-bucket histograms, optionally labelled. Recording
+is a dict lookup (cached for hot paths via ``labels()``), a bisect and a
+lock-protected add (under a microsecond), so it stays enabled in
+production. Gauges are computed from callbacks only when ``/metrics`` is
+scraped.
+
+The metrics the gateway records are defined at the bottom of this module.
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; spans a cached-frame hit to a multi-second agent timeout.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry: List['_Metric'] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):  # pragma: no cover - overridden
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:  # pragma: no cover - overridden
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}'
+
+
+class _Timer:
+    __slots__ = ('_child', '_started')
+
+    def __init__(self, child: '_HistogramChild') -> None:
+        self._child = child
+
+    def __enter__(self) -> '_Timer':
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Gauge(_Metric):
+    """Gauge computed at scrape time.
+
+    The callback returns a number, or for labelled gauges a mapping of
+    label-value tuples to numbers.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._callback: Callable[[], object] | None = None
+
+    def set_function(self, callback: Callable[[], object]) -> None:
+        self._callback = callback
+
+    def _samples(self) -> Iterable[str]:
+        if self._callback is None:
+            return
+        value = self._callback()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, sample in items:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(sample)}'
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Capture / encode
+CAPTURE_SECONDS = Histogram('rd_capture_seconds', 'Time to grab one frame, including any screen_lock wait.')
+SCREEN_LOCK_WAIT_SECONDS = Histogram('rd_screen_lock_wait_seconds', 'Time spent waiting for screen_lock before a capture.')
+CAPTURES = Counter('rd_captures_total', 'Producer captures by outcome.', ['result'])
+ENCODE_SECONDS = Histogram('rd_encode_seconds', 'JPEG encode time per cache miss.', ['kind'])
+TILE_ENCODES = Counter('rd_tile_encodes_total', 'Tiles encoded, by the codec their content was classified for.', ['codec'])
+TILE_BYTES = Counter('rd_tile_bytes_total', 'Bytes of encoded tiles, by codec.', ['codec'])
+TILE_CACHE = Counter('rd_tile_cache_total', 'Tile encoding cache lookups (by tile content).', ['result'])
+
+# Streaming
+STREAM_FRAMES = Counter('rd_stream_frames_total', 'Frames or tile packets written to viewers.', ['mode'])
+STREAM_BYTES = Counter('rd_stream_bytes_total', 'Bytes written to viewers.', ['mode'])
+STREAM_SEND_SECONDS = Histogram('rd_stream_send_seconds', 'Time for one frame write to drain into the socket.', ['mode'])
+STREAM_CLIENT_FPS = Gauge('rd_stream_client_fps', 'Delivered frames per second per viewer.', ['client', 'mode'])
+STREAM_SUBSCRIBERS = Gauge('rd_stream_subscribers', 'Viewers subscribed to the frame producer.')
+CAPTURE_INTERVAL = Gauge('rd_capture_interval_seconds', 'Current adaptive capture interval.')
+CURSOR_EVENTS = Counter('rd_cursor_events_total', 'Cursor channel events written to viewers.', ['kind'])
+
+# Input
+INPUT_EVENTS = Counter('rd_input_events_total', 'Input events accepted into the queue.', ['channel'])
+INPUT_REJECTED = Counter('rd_input_rejected_total', 'Input requests refused.', ['reason'])
+INPUT_REQUEST_SECONDS = Histogram('rd_input_request_seconds', 'Time to validate and queue one input request.', ['channel'])
+INPUT_APPLY_SECONDS = Histogram('rd_input_apply_seconds', 'Time to inject one batch of queued events.')
+INPUT_EVENT_ERRORS = Counter('rd_input_event_errors_total', 'Queued events that failed to inject locally.')
+INPUT_RECORD_ERRORS = Counter('rd_input_record_errors_total', 'Input batches the session recorder failed to write.')
+INPUT_QUEUE_DEPTH = Gauge('rd_input_queue_depth', 'Input events waiting for the injector.')
+PROBE_LATENCY_SECONDS = Histogram(
+    'rd_probe_latency_seconds', 'Input-to-photon latency reported by probing dashboards.', ['kind']
+)
+
+# Host agent
+AGENT_REQUEST_SECONDS = Histogram('rd_agent_request_seconds', 'Host agent round-trip time.', ['path'])
+AGENT_ERRORS = Counter('rd_agent_errors_total', 'Failed host agent calls.', ['path', 'kind'])
+AGENT_BREAKER_OPEN = Gauge('rd_agent_breaker_open', '1 while agent calls fail fast after repeated errors.')
@@ -0,0 +1,139 @@
+"""
+End-to-end latency probe: from an input event in the dashboard to the first
+frame showing its effect on the viewer's screen.
+
+With the probe switched on, the dashboard tags every input event with an
+``id`` (increasing per page) and ``t``, its send time in unix milliseconds
+on the browser's clock. After injecting a batch, the injector records the
+last tagged event per session (``InputMarks``). Producers take the current
+marks right before each grab and publish them with the frame
+(``Frame.inputs``), and publish the next capture after any newly applied
+input even if the screen did not change. Each viewer's stream then carries
+the mark of its own session: an input block in tile packets (``tiles``),
+``X-Input-Id`` / ``X-Input-Time`` part headers on ``/stream`` next to
+``X-Frame-Seq`` / ``X-Frame-Time``. The first frame carrying an id is the
+first one captured after that event was injected, which gives:
+
+* ``input_to_frame``: send time -> capture of that frame;
+* ``capture_to_display``: capture -> drawn by the dashboard (every frame);
+* ``round_trip``: send -> drawn, the sum of the two on the browser clock only.
+
+The first two compare the browser's clock with the host's; the dashboard
+estimates the offset from ``/api/latency`` pings, keeping the one with the
+smallest round trip (accurate to half of it). How long the application
+takes to redraw is not included: the frame counts from the injection
+whether or not the pixels changed yet. With the agent's frame ring, a frame
+read right after injection can predate it, so the probe reads low there.
+
+Dashboards post their samples back; ``LatencyStats`` keeps the latest
+``window`` of each kind for the percentiles on ``/api/latency`` (also what
+``benchmarks.suite`` reports) and feeds ``rd_probe_latency_seconds``.
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Mapping, NamedTuple, Sequence
+
+import metrics
+
+KINDS = ('round_trip', 'input_to_frame', 'capture_to_display')
+PERCENTILES = (50, 95, 99)
+# Samples above this are dropped as bogus (a stalled tab, a bad clock offset).
+MAX_SAMPLE = 60.0  # seconds
+
+
+class InputMark(NamedTuple):
+    input_id: int
+    sent: float  # the event's ``t``: browser clock, unix milliseconds
+    applied: float  # host clock, unix seconds
+
+
+def tagged_id(event: Dict[str, Any]) -> int | None:
+    input_id = event.get('id')
+    if isinstance(input_id, int) and not isinstance(input_id, bool) and input_id >= 0:
+        return input_id & 0xFFFFFFFF
+    return None
+
+
+class InputMarks:
+    """Last tagged input event injected per session.
+
+    The mapping is replaced, never modified, so ``snapshot()`` (once per
+    capture) is a plain attribute read and frames can keep the result.
+    """
+
+    def __init__(self, max_sessions: int = 1024) -> None:
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._marks: Dict[str, InputMark] = {}
+
+    def applied(self, session_id: str, events: Sequence[Dict[str, Any]]) -> None:
+        """Injector callback after ``events`` of ``session_id`` went through."""
+        for event in reversed(events):
+            input_id = tagged_id(event)
+            if input_id is not None:
+                break
+        else:
+            return
+        sent = event.get('t')
+        mark = InputMark(input_id, float(sent) if isinstance(sent, (int, float)) else 0.0, time.time())
+        with self._lock:
+            marks = dict(self._marks)
+            marks.pop(session_id, None)
+            marks[session_id] = mark
+            while len(marks) > self.max_sessions:
+                del marks[next(iter(marks))]
+            self._marks = marks
+
+    def snapshot(self) -> Mapping[str, InputMark]:
+        return self._marks
+
+
+def percentiles(values: Iterable[float], points: Sequence[int] = PERCENTILES) -> Dict[str, float]:
+    """Nearest-rank percentiles of ``values`` as ``{'p50': ..., ...}`` (empty for no values)."""
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {f'p{point}': ordered[min(len(ordered) - 1, len(ordered) * point // 100)] for point in points}
+
+
+class LatencyStats:
+    """Latest ``window`` samples per kind, as reported by probing clients."""
+
+    def __init__(self, window: int = 1024) -> None:
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {kind: deque(maxlen=window) for kind in KINDS}
+        self._histograms = {kind: metrics.PROBE_LATENCY_SECONDS.labels(kind) for kind in KINDS}
+
+    def add(self, samples: Mapping[str, Any]) -> int:
+        """Record ``{kind: [seconds, ...]}``; returns how many samples were valid."""
+        accepted: List[tuple] = []
+        for kind, values in samples.items():
+            if kind not in self._samples or not isinstance(values, list):
+                continue
+            accepted += [
+                (kind, float(value)) for value in values
+                if isinstance(value, (int, float)) and 0 <= value < MAX_SAMPLE
+            ]
+        with self._lock:
+            for kind, value in accepted:
+                self._samples[kind].append(value)
+        for kind, value in accepted:
+            self._histograms[kind].observe(value)
+        return len(accepted)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per kind: sample count and percentiles in milliseconds."""
+        with self._lock:
+            samples = {kind: list(values) for kind, values in self._samples.items()}
+        return {
+            kind: {
+                'count': len(values),
+                **{name: value * 1000 for name, value in percentiles(values).items()},
+            }
+            for kind, values in samples.items()
+        }
@@ -0,0 +1,323 @@
+"""
+Compact session recording: keyframes plus changed tiles, and input, on one timeline.
+
+The recorder is one more tile subscriber of the frame producer: it reuses
+``tiles.stream_updates`` at a fixed (low) quality and pulls at most one
+update per ``interval`` seconds, so frames it skips are merged into the next
+delta by the producer's dirty-tile history and encodings are shared with tile
+viewers at the same quality. Recording runs while sessions are active; each
+run writes a new file under ``directory``.
+
+File layout (little-endian), append-only::
+
+    8s magic b'RDREC001', u32 header_length, header JSON
+    records: u8 kind, f64 unix timestamp, u32 length, payload
+        kind 1: a tile update (``tiles`` packet without its length prefix)
+        kind 2: a JSON list of input events, as injected
+
+Frame records are in capture order, but input records carry the time they
+were injected, so a record can be followed by one with an earlier timestamp;
+``frame_at`` only stops at a later frame record and ``inputs`` filters.
+
+Every keyframe also appends ``f64 timestamp, u64 offset`` to ``<file>.idx``,
+so ``Recording.frame_at`` seeks to the nearest earlier keyframe and replays
+only the deltas after it. Both files go through small write buffers flushed
+every ``flush_interval`` seconds, keeping memory bounded and losing at most
+that much on a crash.
+
+    python recorder.py <file.rdrec> [--at SECONDS --out frame.png]
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple
+
+from PIL import Image
+
+import tiles
+
+if TYPE_CHECKING:  # pragma: no cover
+    from sessions import SessionRegistry
+    from streaming import FrameBroadcaster
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'RDREC001'
+KIND_FRAME = 1
+KIND_INPUT = 2
+
+_FILE_HEADER = struct.Struct('<8sI')
+_RECORD = struct.Struct('<BdI')
+_INDEX = struct.Struct('<dQ')
+_PACKET_HEADER = struct.Struct('<4sBIdHHH')  # see tiles.py
+_BUFFER_BYTES = 64 * 1024
+
+
+class _RecordingClient:
+    """Fixed-quality stand-in for ``adaptive.StreamClient``."""
+
+    def __init__(self, quality: int) -> None:
+        self.quality = quality
+        self.frames = 0
+        self.bytes = 0
+
+    def frame_sent(self, seq: int, nbytes: int, send_seconds: float) -> None:
+        self.frames += 1
+        self.bytes += nbytes
+
+
+class RecordingWriter:
+    def __init__(self, path: str, header: Dict[str, Any]) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb', buffering=_BUFFER_BYTES)
+        self._index = open(path + '.idx', 'wb', buffering=4096)
+        meta = json.dumps(header).encode()
+        self._file.write(_FILE_HEADER.pack(MAGIC, len(meta)) + meta)
+        self._offset = _FILE_HEADER.size + len(meta)
+        self.bytes = self._offset
+
+    def _append(self, kind: int, timestamp: float, payload: bytes) -> int:
+        offset = self._offset
+        self._file.write(_RECORD.pack(kind, timestamp, len(payload)))
+        self._file.write(payload)
+        self._offset += _RECORD.size + len(payload)
+        self.bytes = self._offset
+        return offset
+
+    def write_update(self, packet: bytes) -> None:
+        """Append one length-prefixed ``tiles`` packet (empty deltas are dropped)."""
+        payload = packet[4:]
+        _, flags, _, timestamp, _, _, count = _PACKET_HEADER.unpack_from(payload)
+        if not count and not flags & tiles.FLAG_KEYFRAME:
+            return
+        with self._lock:
+            offset = self._append(KIND_FRAME, timestamp, payload)
+            if flags & tiles.FLAG_KEYFRAME:
+                self._index.write(_INDEX.pack(timestamp, offset))
+
+    def write_input(self, events: List[Dict[str, Any]], timestamp: float | None = None) -> None:
+        payload = json.dumps(events, separators=(',', ':')).encode()
+        with self._lock:
+            self._append(KIND_INPUT, timestamp or time.time(), payload)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+            self._index.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+
+class SessionRecorder:
+    def __init__(
+        self,
+        broadcaster: 'FrameBroadcaster',
+        sessions: 'SessionRegistry',
+        directory: str,
+        quality: int = 40,
+        interval: float = 0.5,
+        keyframe_interval: float = 60.0,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self._broadcaster = broadcaster
+        self._sessions = sessions
+        self.directory = directory
+        self.quality = quality
+        self.interval = interval
+        self.keyframe_interval = keyframe_interval
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()  # guards _writer against record_input
+        self._writer: RecordingWriter | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='session-recorder', daemon=True)
+        self._thread.start()
+
+    def record_input(self, events: List[Dict[str, Any]]) -> None:
+        """Add injected input to the current recording (no-op between recordings)."""
+        if not events:
+            return
+        with self._lock:
+            if self._writer is not None:
+                self._writer.write_input(events)
+
+    def status(self) -> Dict[str, Any]:
+        writer = self._writer
+        return {
+            'recording': writer is not None,
+            'path': writer.path if writer else None,
+            'bytes': writer.bytes if writer else 0,
+        }
+
+    def _run(self) -> None:
+        while True:
+            self._sessions.wait_active()
+            if not self._sessions.active():
+                time.sleep(1.0)
+                continue
+            try:
+                self._record()
+            except Exception:
+                logger.exception('Session recording failed')
+                time.sleep(5.0)
+
+    def _record(self) -> None:
+        started = time.time()
+        path = os.path.join(self.directory, time.strftime('session-%Y%m%d-%H%M%S.rdrec', time.localtime(started)))
+        writer = RecordingWriter(path, {
+            'version': 1,
+            'started': started,
+            'quality': self.quality,
+            'tile_size': self._broadcaster.tile_size,
+        })
+        logger.info('Recording session to %s', path)
+        with self._lock:
+            self._writer = writer
+        client = _RecordingClient(self.quality)
+        last_flush = time.monotonic()
+        try:
+            with self._broadcaster.subscribe(tiles=True) as subscription:
+                for packet in tiles.stream_updates(self._broadcaster, subscription, self.keyframe_interval, client):
+                    writer.write_update(packet)
+                    now = time.monotonic()
+                    if now - last_flush >= self.flush_interval:
+                        writer.flush()
+                        last_flush = now
+                    if not self._sessions.active():
+                        break
+                    # Pull slowly: skipped frames are merged into the next delta.
+                    time.sleep(self.interval)
+        finally:
+            with self._lock:
+                self._writer = None
+                writer.close()
+            logger.info('Recorded %s updates (%s bytes) to %s', client.frames, writer.bytes, path)
+
+
+class Recording:
+    """Reader for a recording file with keyframe-indexed seeking."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as handle:
+            magic, length = _FILE_HEADER.unpack(handle.read(_FILE_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a session recording')
+            self.header = json.loads(handle.read(length))
+        self._data_start = _FILE_HEADER.size + length
+        self.index = self._load_index()
+
+    def _load_index(self) -> List[Tuple[float, int]]:
+        try:
+            with open(self.path + '.idx', 'rb') as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            # Rebuild from the records (slow path, e.g. index lost).
+            return [
+                (timestamp, offset)
+                for kind, timestamp, payload, offset in self.records()
+                if kind == KIND_FRAME and payload[4] & tiles.FLAG_KEYFRAME
+            ]
+        usable = len(data) - len(data) % _INDEX.size  # ignore a torn last entry
+        return [_INDEX.unpack_from(data, pos) for pos in range(0, usable, _INDEX.size)]
+
+    def records(self, offset: int | None = None) -> Iterator[Tuple[int, float, bytes, int]]:
+        """``(kind, timestamp, payload, offset)`` from ``offset`` to the end."""
+        with open(self.path, 'rb') as handle:
+            handle.seek(self._data_start if offset is None else offset)
+            while True:
+                position = handle.tell()
+                head = handle.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    return
+                kind, timestamp, length = _RECORD.unpack(head)
+                payload = handle.read(length)
+                if len(payload) < length:
+                    return  # torn tail from an unclean stop
+                yield kind, timestamp, payload, position
+
+    def keyframe_before(self, timestamp: float) -> Tuple[float, int] | None:
+        position = bisect_right(self.index, (timestamp, float('inf')))
+        return self.index[position - 1] if position else None
+
+    def frame_at(self, timestamp: float) -> Image.Image | None:
+        """The screen as recorded at ``timestamp`` (unix seconds)."""
+        keyframe = self.keyframe_before(timestamp)
+        if keyframe is None:
+            return None
+        canvas = None
+        for kind, record_time, payload, _ in self.records(keyframe[1]):
+            # Only frame records are in capture order; input records carry
+            # their (later) injection time and may sit between them.
+            if kind != KIND_FRAME:
+                continue
+            if record_time > timestamp:
+                break
+            _, _, _, size, parts = tiles.unpack_update(payload)
+            if canvas is None or canvas.size != size:
+                canvas = Image.new('RGB', size)
+            for x, y, _, _, _, data in parts:
+                canvas.paste(Image.open(io.BytesIO(data)).convert('RGB'), (x, y))
+        return canvas
+
+    def inputs(self, start: float = 0.0, end: float = float('inf')) -> Iterator[Tuple[float, List[Dict[str, Any]]]]:
+        keyframe = self.keyframe_before(start)
+        # Filtered, not cut off: records are not in time order (frames carry
+        # their capture time, input its injection time).
+        for kind, timestamp, payload, _ in self.records(keyframe[1] if keyframe else None):
+            if kind == KIND_INPUT and start <= timestamp <= end:
+                yield timestamp, json.loads(payload)
+
+    def summary(self) -> Dict[str, Any]:
+        frames = inputs = 0
+        first = last = None
+        for kind, timestamp, _, _ in self.records():
+            frames += kind == KIND_FRAME
+            inputs += kind == KIND_INPUT
+            first = timestamp if first is None else min(first, timestamp)
+            last = timestamp if last is None else max(last, timestamp)
+        return {
+            'header': self.header,
+            'bytes': os.path.getsize(self.path),
+            'updates': frames,
+            'input_records': inputs,
+            'keyframes': len(self.index),
+            'duration': (last - first) if first is not None else 0.0,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Inspect a session recording.')
+    parser.add_argument('path')
+    parser.add_argument('--at', type=float, help='seconds from the start of the recording')
+    parser.add_argument('--out', default='frame.png')
+    args = parser.parse_args()
+
+    recording = Recording(args.path)
+    print(json.dumps(recording.summary(), indent=2))
+    if args.at is not None:
+        image = recording.frame_at(recording.header['started'] + args.at)
+        if image is None:
+            raise SystemExit('no keyframe before that time')
+        image.save(args.out)
+        print(f'Wrote {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Monitor layout, per-viewer views and one frame producer per view.
+
+A *view* is what a viewer watches, as a canonical string:
+
+* ``screen``: the bounding box of all monitors (the old behaviour);
+* ``monitor:N``: monitor ``N`` as numbered by ``mss`` (1-based);
+* ``region:L,T,W,H``: a rectangle in virtual-screen pixels.
+
+``ScreenLayout`` enumerates the monitors on the first lookup (not when the
+gateway is imported). Lookups only read that cached layout; the frame
+producers call ``refresh`` before each capture, which re-enumerates at most
+every ``refresh_interval`` seconds (and right after a failed capture), so
+resolution and layout changes are picked up at runtime without request
+threads or the event loop opening the display. Views are resolved to
+rectangles on every capture, a monitor that disappeared falls back to the
+whole screen and rectangles are clipped to it. Tile viewers get a keyframe
+whenever the captured size changes.
+
+``BroadcasterHub`` keeps one ``streaming.FrameBroadcaster`` per view in use,
+so viewers of the same monitor share capture and encoding exactly as before
+and only the region being watched is grabbed.
+"""
+
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from streaming import FrameBroadcaster
+
+logger = logging.getLogger(__name__)
+
+SCREEN = 'screen'
+MIN_REGION = 16  # pixels per side
+
+
+def parse_view(spec: Dict[str, Any] | None) -> str:
+    """Canonical view string from ``{'monitor': N}``, ``{'region': {...}}`` or ``{}``."""
+    spec = spec or {}
+    if spec.get('monitor') is not None:
+        index = int(spec['monitor'])
+        if index < 0:
+            raise ValueError('monitor must be >= 0')
+        return SCREEN if index == 0 else f'monitor:{index}'
+    if spec.get('region') is not None:
+        region = spec['region']
+        left, top, width, height = (int(region[key]) for key in ('left', 'top', 'width', 'height'))
+        if width < MIN_REGION or height < MIN_REGION:
+            raise ValueError(f'region must be at least {MIN_REGION}x{MIN_REGION} pixels')
+        return f'region:{left},{top},{width},{height}'
+    return SCREEN
+
+
+def view_to_screen(x: float, y: float, region: Dict[str, int], screen: Dict[str, int]) -> tuple[float, float]:
+    """Map ``(x, y)`` from 0..1 within ``region`` to 0..1 within ``screen``."""
+    x = min(max(x, 0.0), 1.0)
+    y = min(max(y, 0.0), 1.0)
+    return (
+        (region['left'] - screen['left'] + x * region['width']) / screen['width'],
+        (region['top'] - screen['top'] + y * region['height']) / screen['height'],
+    )
+
+
+class ScreenLayout:
+    def __init__(self, enumerate: Callable[[], List[Dict[str, int]]], refresh_interval: float = 2.0) -> None:
+        self._enumerate = enumerate
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._monitors: List[Dict[str, int]] | None = None
+        self._checked = 0.0
+        self.version = 0
+
+    def refresh(self, force: bool = False) -> bool:
+        """Re-enumerate if due (or ``force``); returns whether the layout changed."""
+        if not force and time.monotonic() - self._checked < self.refresh_interval:
+            return False
+        with self._lock:
+            if not force and time.monotonic() - self._checked < self.refresh_interval:
+                return False
+            self._checked = time.monotonic()
+            try:
+                monitors = self._enumerate()
+            except Exception as exc:
+                if self._monitors is None:
+                    raise  # nothing to fall back on
+                logger.warning('Monitor enumeration failed: %s', exc)
+                return False
+            if self._monitors is None:
+                self._monitors = monitors
+                return False
+            if monitors == self._monitors:
+                return False
+            logger.info('Monitor layout changed: %s', monitors)
+            self._monitors = monitors
+            self.version += 1
+            return True
+
+    def monitors(self) -> List[Dict[str, int]]:
+        """The cached layout; only the very first lookup enumerates."""
+        if self._monitors is None:
+            with self._lock:
+                if self._monitors is None:
+                    self._monitors = self._enumerate()
+                    self._checked = time.monotonic()
+        return self._monitors
+
+    @property
+    def screen(self) -> Dict[str, int]:
+        return self.monitors()[0]
+
+    def resolve(self, view: str) -> Dict[str, int]:
+        """The rectangle ``view`` currently covers (the whole screen if it no longer exists)."""
+        monitors = self.monitors()
+        screen = monitors[0]
+        kind, _, value = view.partition(':')
+        if kind == 'monitor':
+            index = int(value)
+            return dict(monitors[index]) if index < len(monitors) else dict(screen)
+        if kind == 'region':
+            left, top, width, height = (int(part) for part in value.split(','))
+            right = min(left + width, screen['left'] + screen['width'])
+            bottom = min(top + height, screen['top'] + screen['height'])
+            left, top = max(left, screen['left']), max(top, screen['top'])
+            if right - left >= MIN_REGION and bottom - top >= MIN_REGION:
+                return {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+        return dict(screen)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        monitors = self.monitors()
+        return [
+            {'index': index, 'view': SCREEN if index == 0 else f'monitor:{index}', **monitor}
+            for index, monitor in enumerate(monitors)
+        ]
+
+
+class BroadcasterHub:
+    """One frame producer per view in use; ``screen`` is ``default``.
+
+    Idle producers (no subscribers, and not handed out by ``get`` for
+    ``idle_grace`` seconds) are dropped when a new view needs a slot; at
+    most ``max_views`` exist at once. The grace period covers the gap
+    between a request getting a producer and subscribing to it.
+    """
+
+    def __init__(
+        self,
+        default: FrameBroadcaster,
+        factory: Callable[[str], FrameBroadcaster],
+        max_views: int = 8,
+        idle_grace: float = 10.0,
+    ) -> None:
+        self.default = default
+        self._factory = factory
+        self.max_views = max_views
+        self.idle_grace = idle_grace
+        self._lock = threading.Lock()
+        self._views: Dict[str, FrameBroadcaster] = {}
+        self._handed_out: Dict[str, float] = {}
+
+    def get(self, view: str) -> FrameBroadcaster:
+        if view == SCREEN:
+            return self.default
+        with self._lock:
+            now = time.monotonic()
+            broadcaster = self._views.get(view)
+            if broadcaster is None:
+                idle_before = now - self.idle_grace
+                for key, other in list(self._views.items()):
+                    if other.subscribers == 0 and self._handed_out[key] < idle_before:
+                        del self._views[key], self._handed_out[key]
+                if len(self._views) + 1 >= self.max_views:
+                    raise ValueError(f'at most {self.max_views} different views can be streamed at once')
+                broadcaster = self._views[view] = self._factory(view)
+            self._handed_out[view] = now
+            return broadcaster
+
+    def all(self) -> Dict[str, FrameBroadcaster]:
+        with self._lock:
+            return {SCREEN: self.default, **self._views}
+
+    def notify_activity(self) -> None:
+        for broadcaster in self.all().values():
+            broadcaster.notify_activity()
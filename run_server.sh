@@ -1,4 +1,9 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+# REMOTE_DESKTOP_SERVER=asgi serves viewers and input from one event loop (asgi.py)
+if [[ "${REMOTE_DESKTOP_SERVER:-threaded}" == "asgi" ]]; then
+    exec python3 asgi.py
+fi
+
 python3 app.py
@@ -0,0 +1,100 @@
+"""
+Registry of connected browser sessions, used to drive the display keep-alive.
+
+Sessions are keyed by the stable random ``sid`` stored in the Flask session
+cookie. Stream frames, input and page loads refresh a session's last-seen
+time; a session with an open stream never expires, any other one is evicted
+``ttl`` seconds after it was last seen. The registry holds at most
+``max_sessions`` entries (least recently seen are dropped first), and
+``wait_active`` lets the keep-alive thread sleep until someone connects.
+``on_active`` runs whenever the registry goes from no sessions to one (the
+gateway starts the keep-alive thread there).
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+class SessionRegistry:
+    def __init__(
+        self, ttl: float, max_sessions: int = 1024, on_active: Callable[[], None] | None = None
+    ) -> None:
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.on_active = on_active
+        self._lock = threading.Lock()
+        self._seen: 'OrderedDict[str, float]' = OrderedDict()
+        self._streams: Dict[str, int] = {}
+        self._active = threading.Event()
+
+    def touch(self, sid: str) -> None:
+        """Record activity for ``sid``."""
+        with self._lock:
+            self._seen[sid] = time.monotonic()
+            self._seen.move_to_end(sid)
+            while len(self._seen) > self.max_sessions:
+                oldest, _ = self._seen.popitem(last=False)
+                self._streams.pop(oldest, None)
+            activated = not self._active.is_set()
+            self._active.set()
+        if activated and self.on_active is not None:
+            self.on_active()
+
+    def open_stream(self, sid: str) -> None:
+        with self._lock:
+            self._streams[sid] = self._streams.get(sid, 0) + 1
+        self.touch(sid)
+
+    def close_stream(self, sid: str) -> None:
+        with self._lock:
+            count = self._streams.get(sid, 0) - 1
+            if count > 0:
+                self._streams[sid] = count
+            else:
+                self._streams.pop(sid, None)
+        self.touch(sid)  # the TTL starts when the last stream closes
+
+    def discard(self, sid: str) -> None:
+        with self._lock:
+            self._seen.pop(sid, None)
+            self._streams.pop(sid, None)
+            if not self._seen:
+                self._active.clear()
+
+    def evict(self) -> int:
+        """Drop expired sessions; returns how many remain."""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            for sid, seen in list(self._seen.items()):
+                if seen >= cutoff:
+                    break  # ordered by last-seen time
+                if sid not in self._streams:
+                    del self._seen[sid]
+            if not self._seen:
+                self._active.clear()
+            return len(self._seen)
+
+    def active(self) -> bool:
+        return self.evict() > 0
+
+    def wait_active(self, timeout: float | None = None) -> bool:
+        """Block until at least one session is registered."""
+        return self._active.wait(timeout)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'sessions': len(self._seen),
+                'streaming': len(self._streams),
+                'idle_seconds': {sid[:8]: round(now - seen, 1) for sid, seen in self._seen.items()},
+            }
@@ -0,0 +1,217 @@
+"""
+Pluggable frame sources for the frame producer.
+
+A source has ``monitors()``, the current layout as ``mss`` reports it (a
+list of ``left``/``top``/``width``/``height`` dicts, entry 0 being the
+bounding box of all monitors), ``grab(region=None)`` returning a
+``capture.RawFrame`` of ``region`` (virtual-screen coordinates; the whole
+screen by default) and ``close()``, called when a producer thread exits.
+
+* ``MssSource`` captures the local display (the default);
+* ``SyntheticSource`` generates reproducible BGRA content without a display,
+  for benchmarks and CI: a static desktop, scrolling text, or full-motion
+  video-like noise at any resolution;
+* ``agent_frames.AgentFrameSource`` reads the host agent's frame ring.
+
+``create`` builds one from a spec string such as ``mss`` or
+``synthetic:scroll:1080p`` (``REMOTE_DESKTOP_FRAME_SOURCE``);
+``synthetic:static:1080p:0:3`` fakes three side-by-side monitors.
+"""
+
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+import capture
+import metrics
+from capture import RawFrame
+
+RESOLUTIONS = {
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160),
+    '5k': (5120, 2880),
+}
+PATTERNS = ('static', 'scroll', 'video')
+
+# Text rendering for the synthetic desktop: glyph cell and line height in pixels.
+_GLYPH_W, _GLYPH_H, _LINE_H = 8, 12, 18
+_SCROLL_STEP = _LINE_H // 3  # rows scrolled per grab
+
+
+def enumerate_monitors() -> List[Dict[str, Any]]:
+    """The current monitor layout as reported by ``mss`` (entry 0: all monitors)."""
+    import mss
+
+    try:
+        with mss.mss() as sct:
+            return [
+                {key: monitor[key] for key in ('left', 'top', 'width', 'height')}
+                for monitor in sct.monitors
+            ]
+    except Exception as exc:  # pragma: no cover
+        raise RuntimeError('Unable to initialize screen capture') from exc
+
+
+def primary_monitor() -> Dict[str, Any]:
+    """Geometry of the whole virtual screen as reported by ``mss``."""
+    return enumerate_monitors()[0]
+
+
+class MssSource:
+    """The local display, captured under ``lock`` with a per-thread handle.
+
+    Nothing connects to the display before the first ``monitors()`` or ``grab()``.
+    """
+
+    def __init__(self, lock: threading.Lock | None = None) -> None:
+        self._lock = lock or threading.Lock()
+        self._screen: Dict[str, Any] | None = None
+
+    def monitors(self) -> List[Dict[str, Any]]:
+        layout = enumerate_monitors()
+        self._screen = layout[0]
+        return layout
+
+    def grab(self, region: Dict[str, Any] | None = None) -> RawFrame:
+        waiting = time.perf_counter()
+        with self._lock:
+            metrics.SCREEN_LOCK_WAIT_SECONDS.observe(time.perf_counter() - waiting)
+            if region is None and self._screen is None:
+                self._screen = primary_monitor()
+            return capture.grab(region or self._screen)
+
+    def close(self) -> None:
+        capture.close()
+
+
+def parse_resolution(value: str) -> Tuple[int, int]:
+    if value.lower() in RESOLUTIONS:
+        return RESOLUTIONS[value.lower()]
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+class SyntheticSource:
+    """Deterministic fake screen (same ``seed`` -> same frames).
+
+    ``static`` returns the same desktop on every grab; ``scroll`` scrolls a
+    text window by a few rows per grab; ``video`` redraws the whole screen
+    with smooth noise, the worst case for change detection and tiles.
+    ``monitors`` places that many ``size`` monitors side by side.
+    """
+
+    def __init__(
+        self,
+        pattern: str = 'static',
+        size: Tuple[int, int] = (1920, 1080),
+        seed: int = 0,
+        monitors: int = 1,
+    ) -> None:
+        if pattern not in PATTERNS:
+            raise ValueError(f'unknown synthetic pattern {pattern!r} (expected one of {", ".join(PATTERNS)})')
+        self.pattern = pattern
+        self._layout = [
+            {'left': index * size[0], 'top': 0, 'width': size[0], 'height': size[1]}
+            for index in range(max(1, monitors))
+        ]
+        size = (size[0] * len(self._layout), size[1])
+        self._layout.insert(0, {'left': 0, 'top': 0, 'width': size[0], 'height': size[1]})
+        self.size = size
+        self.frames = 0
+        self._rng = np.random.default_rng(seed)
+        width, height = size
+        self._desktop = self._render_desktop(width, height)
+        self._static = self._desktop.tobytes()
+        # Text window: the middle half of the screen.
+        self._window = (height // 4, height * 3 // 4, width // 8, width * 7 // 8)
+        top, bottom, left, right = self._window
+        self._text = self._render_text(bottom - top + _LINE_H * 8, right - left)
+        self._film: np.ndarray | None = None
+
+    def _render_desktop(self, width: int, height: int) -> np.ndarray:
+        pixels = np.empty((height, width, 4), dtype=np.uint8)
+        pixels[...] = (0x30, 0x28, 0x20, 0xFF)  # BGRA wallpaper
+        gradient = np.linspace(0x40, 0xC0, width, dtype=np.uint8)
+        band = slice(0, max(1, height // 12))  # title / task bar
+        pixels[band, :, 0] = gradient
+        pixels[band, :, 1] = 0x50
+        pixels[band, :, 2] = gradient[::-1]
+        return pixels
+
+    def _render_noise(self, width: int, height: int) -> np.ndarray:
+        """Low-resolution noise, bilinearly upscaled (video-like gradients)."""
+        noise = self._rng.integers(0, 256, size=(-(-height // 6), -(-width // 6), 4), dtype=np.uint8)
+        noise[..., 3] = 0xFF
+        image = Image.frombuffer('RGBA', (noise.shape[1], noise.shape[0]), noise.tobytes(), 'raw', 'RGBA', 0, 1)
+        return np.asarray(image.resize((width, height), Image.BILINEAR))
+
+    def _render_text(self, height: int, width: int) -> np.ndarray:
+        """Light page with rows of random glyphs from a fixed 64-glyph font."""
+        font = self._rng.random((64, _GLYPH_H, _GLYPH_W)) < 0.35
+        font[:, :, -1] = False  # letter spacing
+        lines, columns = height // _LINE_H, width // _GLYPH_W
+        chars = self._rng.integers(0, 64, size=(lines, columns))
+        chars[self._rng.random((lines, columns)) < 0.18] = -1  # spaces
+        ink = font[chars] & (chars >= 0)[:, :, None, None]
+        ink = ink.transpose(0, 2, 1, 3).reshape(lines, _GLYPH_H, columns * _GLYPH_W)
+        page = np.zeros((lines, _LINE_H, width), dtype=bool)
+        page[:, 3:3 + _GLYPH_H, :columns * _GLYPH_W] = ink
+        page = page.reshape(lines * _LINE_H, width)
+        text = np.full((lines * _LINE_H, width, 4), 0xF2, dtype=np.uint8)
+        text[page] = (0x20, 0x20, 0x20, 0xFF)
+        text[..., 3] = 0xFF
+        return text
+
+    def monitors(self) -> List[Dict[str, Any]]:
+        return [dict(monitor) for monitor in self._layout]
+
+    def _pixels(self) -> np.ndarray:
+        if self.pattern == 'static':
+            return self._desktop
+        if self.pattern == 'scroll':
+            top, bottom, left, right = self._window
+            offset = (self.frames * _SCROLL_STEP) % (self._text.shape[0] - (bottom - top))
+            frame = self._desktop.copy()
+            frame[top:bottom, left:right] = self._text[offset:offset + bottom - top]
+            return frame
+        # Pan a smooth noise texture diagonally: every pixel changes every frame.
+        if self._film is None:
+            self._film = self._render_noise(*self.size)
+        shift = (self.frames * 3, self.frames * 5)
+        return np.roll(self._film, shift, axis=(0, 1))
+
+    def grab(self, region: Dict[str, Any] | None = None) -> RawFrame:
+        self.frames += 1
+        if region is None or region == self._layout[0]:
+            if self.pattern == 'static':
+                return RawFrame(self._static, self.size)
+            return RawFrame(self._pixels().tobytes(), self.size)
+        left, top = region['left'], region['top']
+        crop = self._pixels()[top:top + region['height'], left:left + region['width']]
+        return RawFrame(crop.tobytes(), (crop.shape[1], crop.shape[0]))
+
+    def close(self) -> None:
+        pass
+
+
+def create(spec: str, lock: threading.Lock | None = None):
+    """Build a source from ``mss`` or ``synthetic[:pattern[:resolution[:seed[:monitors]]]]``."""
+    kind, _, rest = spec.partition(':')
+    if kind == 'mss':
+        return MssSource(lock)
+    if kind == 'synthetic':
+        parts = rest.split(':') if rest else []
+        pattern = parts[0] if parts else 'static'
+        size = parse_resolution(parts[1]) if len(parts) > 1 else RESOLUTIONS['1080p']
+        seed = int(parts[2]) if len(parts) > 2 else 0
+        monitors = int(parts[3]) if len(parts) > 3 else 1
+        return SyntheticSource(pattern, size, seed, monitors)
+    raise ValueError(f'unknown frame source {spec!r}')
@@ -1,20 +1,36 @@
 const streamImg = document.getElementById('screen-stream');
+const streamCanvas = document.getElementById('screen-canvas');
+const streamVideo = document.getElementById('screen-video');
+const modeSelect = document.getElementById('stream-mode');
+const viewSelect = document.getElementById('view-select');
+const screenWrapper = document.querySelector('.screen-wrapper');
 const surface = document.getElementById('control-surface');
 const refreshBtn = document.getElementById('refresh-stream');
 const wakeBtn = document.getElementById('wake-display');
 const cursorIndicator = document.getElementById('cursor-indicator');
+const remoteCursor = document.getElementById('remote-cursor');
 const statusBanner = document.getElementById('status-banner');
+const latencyBtn = document.getElementById('latency-probe');
+const latencyPanel = document.getElementById('latency-panel');
 
 if (!streamImg || !surface) {
     console.error('Remote desktop dashboard failed to load required elements.');
 } else {
     let statusTimer;
+    // H.264 needs the server's encoder and Media Source Extensions here.
+    const videoEnabled = Boolean(
+        (window.VIDEO_STREAM === true || window.VIDEO_STREAM === 'true') && streamVideo && window.MediaSource
+    );
+    const savedMode = localStorage.getItem('streamMode');
     const state = {
         inputArmed: false,
-        lastMoveTs: 0,
         lastFrameTs: Date.now(),
         tipShown: false,
         agentLastStatus: null,
+        displayAsleep: false,
+        streamViewport: 0,
+        layoutVersion: null,
+        streamMode: (savedMode === 'tiles' && streamCanvas) || (savedMode === 'video' && videoEnabled) ? savedMode : 'mjpeg',
     };
     const agentEnabled = Boolean(window.AGENT_ENABLED === true || window.AGENT_ENABLED === 'true');
 
@@ -36,23 +52,103 @@ if (!streamImg || !surface) {
         if (statusTimer) clearTimeout(statusTimer);
     };
 
-    const sendEvent = async (payload) => {
+    // Input is queued and flushed once per animation frame as one batch, over
+    // a persistent websocket when available (HTTP batch POST otherwise).
+    // Consecutive pointer moves inside a batch collapse to the latest one.
+    const inputSocketEnabled = Boolean(window.INPUT_SOCKET === true || window.INPUT_SOCKET === 'true');
+    let inputSocket = null;
+    let inputQueue = [];
+    let flushScheduled = false;
+
+    const postBatch = async (events) => {
         try {
-            await fetch('/api/input', {
+            await fetch('/api/input/batch', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 credentials: 'include',
-                body: JSON.stringify(payload),
+                body: JSON.stringify({ events }),
             });
         } catch (err) {
-            console.error('Failed sending event', err);
+            console.error('Failed sending events', err);
             showStatus('Input channel lost. Reconnecting…', { autoHideMs: 3000 });
-            throw err;
+        }
+    };
+
+    const connectInputSocket = () => {
+        if (!inputSocketEnabled || !('WebSocket' in window)) return;
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}/ws/input`);
+        socket.addEventListener('message', (event) => {
+            console.warn('Input channel error', event.data);
+        });
+        socket.addEventListener('close', () => {
+            if (inputSocket === socket) inputSocket = null;
+            setTimeout(connectInputSocket, 2000);
+        });
+        inputSocket = socket;
+    };
+
+    const isMove = (payload) => payload.type === 'mouse' && payload.action === 'move';
+
+    // Latency probe (see probe.py): while it is on, input events carry an id
+    // and their send time, and frames come back stamped with their capture
+    // time and the last id injected before the grab. When a frame is drawn
+    // that gives round-trip, input-to-frame and capture-to-display latency.
+    // Full frames are then read with fetch and drawn on the canvas, because
+    // an <img> hides the part headers. Host timestamps are mapped to this
+    // clock with the offset from the /api/latency ping with the smallest
+    // round trip; samples are reported there too.
+    const PROBE_KINDS = ['round_trip', 'input_to_frame', 'capture_to_display'];
+    const PROBE_LABELS = {
+        round_trip: 'Round trip',
+        input_to_frame: 'Input→frame',
+        capture_to_display: 'Capture→display',
+    };
+    const PROBE_KEEP = 500; // samples per kind behind the percentiles shown
+    const PROBE_PINGS = 8; // clock pings the offset is picked from
+    const PROBE_INTERVAL = 2000; // ms between pings / sample reports
+    const emptySamples = () => Object.fromEntries(PROBE_KINDS.map((kind) => [kind, []]));
+    const probe = {
+        on: false,
+        since: 0,
+        nextId: 1,
+        lastId: 0,
+        pings: [],
+        offset: null, // host clock minus this one, ms
+        clockError: 0,
+        samples: emptySamples(),
+        unsent: emptySamples(),
+        timer: null,
+    };
+    const clockNow = () => performance.timeOrigin + performance.now();
+
+    const flushInput = () => {
+        flushScheduled = false;
+        if (!inputQueue.length) return;
+        const events = inputQueue;
+        inputQueue = [];
+        if (inputSocket && inputSocket.readyState === WebSocket.OPEN) {
+            inputSocket.send(JSON.stringify(events));
+        } else {
+            postBatch(events);
         }
     };
 
     const transmit = (payload) => {
-        sendEvent(payload).catch(() => {});
+        if (probe.on) payload = { ...payload, id: probe.nextId++, t: clockNow() };
+        const last = inputQueue[inputQueue.length - 1];
+        if (last && isMove(last) && isMove(payload)) {
+            inputQueue[inputQueue.length - 1] = payload;
+        } else {
+            inputQueue.push(payload);
+        }
+        if (flushScheduled) return;
+        flushScheduled = true;
+        if (document.hidden) {
+            setTimeout(flushInput, 16);
+        } else {
+            requestAnimationFrame(flushInput);
+        }
     };
 
     const clamp = (value) => Math.min(Math.max(value, 0), 1);
@@ -108,13 +204,489 @@ if (!streamImg || !surface) {
     };
 
     let reconnectTimer;
+    let canvasAbort = null;
+    let videoAbort = null;
+
+    const onFrame = () => {
+        state.lastFrameTs = Date.now();
+        if (state.displayAsleep) return;
+        if (!state.tipShown) {
+            state.tipShown = true;
+            showStatus('Tip: Keep the host awake/plugged in for best results.', { autoHideMs: 7000 });
+        } else {
+            hideStatus();
+        }
+    };
+
+    const scheduleReconnect = () => {
+        showStatus('Stream unreachable. Retrying…');
+        if (reconnectTimer) clearTimeout(reconnectTimer);
+        reconnectTimer = setTimeout(() => refreshStream({ silent: true }), 1500);
+    };
+
+    // Tile packets: see tiles.py for the wire format.
+    const TILE_FLAG_DISPLAY_ASLEEP = 0x02;
+    const TILE_FLAG_INPUT = 0x04;
+    const TILE_HEADER_BYTES = 23;
+    const TILE_INPUT_BYTES = 12;
+    const TILE_ENTRY_BYTES = 13;
+    const TILE_CODEC_TYPES = ['image/jpeg', 'image/png', 'image/webp'];
+    const tileCtx = streamCanvas ? streamCanvas.getContext('2d') : null;
+
+    // Draws one packet; returns its probe stamps.
+    const applyTileUpdate = async (packet) => {
+        const view = new DataView(packet.buffer, packet.byteOffset, packet.byteLength);
+        const magic = String.fromCharCode(packet[0], packet[1], packet[2], packet[3]);
+        if (magic !== 'RDT2') throw new Error('Bad tile packet');
+        setDisplayAsleep(Boolean(packet[4] & TILE_FLAG_DISPLAY_ASLEEP));
+        const stamp = { captured: view.getFloat64(9, true), inputId: null, sent: 0 };
+        const width = view.getUint16(17, true);
+        const height = view.getUint16(19, true);
+        const count = view.getUint16(21, true);
+        if (streamCanvas.width !== width || streamCanvas.height !== height) {
+            streamCanvas.width = width;
+            streamCanvas.height = height;
+        }
+        const tiles = [];
+        let offset = TILE_HEADER_BYTES;
+        if (packet[4] & TILE_FLAG_INPUT) {
+            stamp.inputId = view.getUint32(offset, true);
+            stamp.sent = view.getFloat64(offset + 4, true);
+            offset += TILE_INPUT_BYTES;
+        }
+        for (let i = 0; i < count; i++) {
+            const x = view.getUint16(offset, true);
+            const y = view.getUint16(offset + 2, true);
+            const codec = packet[offset + 8];
+            const length = view.getUint32(offset + 9, true);
+            offset += TILE_ENTRY_BYTES;
+            const type = TILE_CODEC_TYPES[codec] || 'image/jpeg';
+            const blob = new Blob([packet.subarray(offset, offset + length)], { type });
+            offset += length;
+            tiles.push({ x, y, blob });
+        }
+        const bitmaps = await Promise.all(tiles.map((tile) => createImageBitmap(tile.blob)));
+        bitmaps.forEach((bitmap, i) => {
+            tileCtx.drawImage(bitmap, tiles[i].x, tiles[i].y);
+            bitmap.close();
+        });
+        return stamp;
+    };
+
+    const consumeTiles = async (pending) => {
+        while (pending.length >= 4) {
+            const length = new DataView(pending.buffer, pending.byteOffset, 4).getUint32(0, true);
+            if (pending.length < 4 + length) break;
+            const stamp = await applyTileUpdate(pending.subarray(4, 4 + length));
+            pending = pending.subarray(4 + length);
+            onFrame();
+            probeFrame(stamp);
+        }
+        return pending;
+    };
+
+    // Full frames on the canvas (probe mode): multipart parts with
+    // Content-Length and the X-Frame / X-Input stamps from app.mjpeg_part.
+    const partDecoder = new TextDecoder();
+
+    const headerEnd = (bytes) => {
+        for (let i = 0; i + 3 < bytes.length; i++) {
+            if (bytes[i] === 13 && bytes[i + 1] === 10 && bytes[i + 2] === 13 && bytes[i + 3] === 10) return i;
+        }
+        return -1;
+    };
+
+    const consumeParts = async (pending) => {
+        for (;;) {
+            const end = headerEnd(pending);
+            if (end < 0) break;
+            const headers = {};
+            partDecoder.decode(pending.subarray(0, end)).split('\r\n').forEach((line) => {
+                const colon = line.indexOf(':');
+                if (colon > 0) headers[line.slice(0, colon).trim().toLowerCase()] = line.slice(colon + 1).trim();
+            });
+            const length = Number(headers['content-length']);
+            if (!(length >= 0)) throw new Error('Frame without Content-Length');
+            const start = end + 4;
+            if (pending.length < start + length + 2) break;
+            const bitmap = await createImageBitmap(
+                new Blob([pending.subarray(start, start + length)], { type: 'image/jpeg' })
+            );
+            if (streamCanvas.width !== bitmap.width || streamCanvas.height !== bitmap.height) {
+                streamCanvas.width = bitmap.width;
+                streamCanvas.height = bitmap.height;
+            }
+            tileCtx.drawImage(bitmap, 0, 0);
+            bitmap.close();
+            pending = pending.subarray(start + length + 2);
+            onFrame();
+            probeFrame({
+                captured: Number(headers['x-frame-time']),
+                inputId: 'x-input-id' in headers ? Number(headers['x-input-id']) : null,
+                sent: Number(headers['x-input-time']),
+            });
+        }
+        return pending;
+    };
+
+    // Streams drawn on the canvas: `consume` gets the bytes received so far,
+    // draws every complete packet / frame and returns the rest.
+    const runCanvasStream = async (url, consume) => {
+        const controller = new AbortController();
+        canvasAbort = controller;
+        try {
+            const response = await fetch(url, {
+                credentials: 'include',
+                signal: controller.signal,
+            });
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+            const reader = response.body.getReader();
+            let pending = new Uint8Array(0);
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                const merged = new Uint8Array(pending.length + value.length);
+                merged.set(pending);
+                merged.set(value, pending.length);
+                pending = await consume(merged);
+            }
+        } catch (err) {
+            if (controller.signal.aborted) return;
+            console.error('Stream failed', err);
+        }
+        if (canvasAbort === controller) {
+            canvasAbort = null;
+            scheduleReconnect();
+        }
+    };
+
+    const stopCanvasStream = () => {
+        if (canvasAbort) {
+            canvasAbort.abort();
+            canvasAbort = null;
+        }
+    };
+
+    const recordLatency = (kind, ms) => {
+        // Slightly negative values are clock offset error.
+        const seconds = Math.max(0, ms) / 1000;
+        const kept = probe.samples[kind];
+        kept.push(seconds);
+        if (kept.length > PROBE_KEEP) kept.shift();
+        probe.unsent[kind].push(seconds);
+    };
+
+    // A frame is on the canvas; it shows with the next paint.
+    const probeFrame = ({ captured, inputId, sent }) => {
+        if (!probe.on) return;
+        requestAnimationFrame(() => {
+            const shown = clockNow();
+            const capturedHere = probe.offset === null ? null : captured * 1000 - probe.offset;
+            if (capturedHere !== null) recordLatency('capture_to_display', shown - capturedHere);
+            // Only the first frame with a new id, and not ids from before this
+            // probe run (the host keeps the last one per session).
+            if (inputId === null || inputId <= probe.lastId || sent < probe.since) return;
+            probe.lastId = inputId;
+            recordLatency('round_trip', shown - sent);
+            if (capturedHere !== null) recordLatency('input_to_frame', capturedHere - sent);
+        });
+    };
+
+    const renderLatency = () => {
+        if (!latencyPanel) return;
+        if (state.streamMode === 'video') {
+            latencyPanel.textContent = 'Latency probe: switch to full frames or changed tiles';
+            return;
+        }
+        const parts = PROBE_KINDS.map((kind) => {
+            const sorted = [...probe.samples[kind]].sort((a, b) => a - b);
+            if (!sorted.length) return `${PROBE_LABELS[kind]} –`;
+            const ms = (point) => Math.round(1000 * sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * point / 100))]);
+            return `${PROBE_LABELS[kind]} p50 ${ms(50)} · p95 ${ms(95)} · p99 ${ms(99)} ms`;
+        });
+        const clock = probe.offset === null ? 'syncing clock…' : `clock ±${Math.ceil(probe.clockError)} ms`;
+        latencyPanel.textContent = `${parts.join('  |  ')}  (${probe.samples.round_trip.length} inputs, ${clock})`;
+    };
+
+    const syncProbe = async () => {
+        const unsent = probe.unsent;
+        probe.unsent = emptySamples();
+        try {
+            if (PROBE_KINDS.some((kind) => unsent[kind].length)) {
+                await fetch('/api/latency', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    credentials: 'include',
+                    body: JSON.stringify({ samples: unsent }),
+                });
+            }
+            const started = clockNow();
+            const response = await fetch('/api/latency', { credentials: 'include', cache: 'no-store' });
+            const finished = clockNow();
+            if (response.ok) {
+                const data = await response.json();
+                probe.pings.push({ rtt: finished - started, offset: data.server_time * 1000 - (started + finished) / 2 });
+                if (probe.pings.length > PROBE_PINGS) probe.pings.shift();
+                const best = probe.pings.reduce((a, b) => (b.rtt < a.rtt ? b : a));
+                probe.offset = best.offset;
+                probe.clockError = best.rtt / 2;
+            }
+        } catch (err) {
+            // Stream reconnect logic reports connectivity problems.
+        }
+        if (probe.on) renderLatency();
+    };
+
+    const setProbe = (on) => {
+        probe.on = on;
+        if (latencyBtn) latencyBtn.classList.toggle('is-active', on);
+        if (latencyPanel) latencyPanel.hidden = !on;
+        clearInterval(probe.timer);
+        probe.timer = null;
+        if (on) {
+            probe.since = clockNow();
+            probe.samples = emptySamples();
+            probe.timer = setInterval(syncProbe, PROBE_INTERVAL);
+            syncProbe();
+        }
+        // Full frames move between the <img> and the canvas.
+        if (state.streamMode === 'mjpeg') refreshStream({ silent: true });
+    };
+
+    // H.264 stream: an init segment, then one fMP4 fragment per captured
+    // frame (see video.py), appended to a MediaSource as bytes arrive.
+    // Samples have a fixed duration, so playback waits at the end of the
+    // buffer until the next frame; if it falls behind anyway it jumps to
+    // the live edge. Anything the browser cannot play falls back to MJPEG.
+    const VIDEO_MAX_LAG = 0.5; // seconds
+    const VIDEO_KEEP = 30; // seconds of played video kept buffered
+
+    const fallBackToMjpeg = (reason) => {
+        console.warn('H.264 stream unavailable, using full frames:', reason);
+        showStatus('Video mode unavailable; showing full frames', { autoHideMs: 4000 });
+        state.streamMode = 'mjpeg';
+        if (modeSelect) modeSelect.value = 'mjpeg';
+        refreshStream({ silent: true });
+    };
+
+    const keepVideoLive = () => {
+        const { buffered } = streamVideo;
+        if (!buffered.length) return;
+        const end = buffered.end(buffered.length - 1);
+        if (end - streamVideo.currentTime > VIDEO_MAX_LAG) {
+            streamVideo.currentTime = Math.max(buffered.start(buffered.length - 1), end - 0.05);
+        }
+        if (streamVideo.paused) streamVideo.play().catch(() => {});
+    };
+
+    const runVideoStream = async () => {
+        const controller = new AbortController();
+        videoAbort = controller;
+        const { width, height } = viewportPixels();
+        state.streamViewport = width;
+        let mediaError = null;
+        try {
+            const response = await fetch(`/stream/video?width=${width}&height=${height}&_=${Date.now()}`, {
+                credentials: 'include',
+                signal: controller.signal,
+            });
+            if (response.status === 501) {
+                mediaError = new Error('no encoder on the server');
+                throw mediaError;
+            }
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+            const mime = `video/mp4; codecs="${response.headers.get('X-Video-Codec') || 'avc1.42C01F'}"`;
+            if (!MediaSource.isTypeSupported(mime)) {
+                mediaError = new Error(`${mime} not supported`);
+                throw mediaError;
+            }
+            const mediaSource = new MediaSource();
+            const url = URL.createObjectURL(mediaSource);
+            streamVideo.src = url;
+            await new Promise((resolve) => mediaSource.addEventListener('sourceopen', resolve, { once: true }));
+            URL.revokeObjectURL(url);
+            const buffer = mediaSource.addSourceBuffer(mime);
+            const whenUpdated = () => new Promise((resolve, reject) => {
+                buffer.addEventListener('updateend', resolve, { once: true });
+                buffer.addEventListener('error', () => {
+                    mediaError = new Error('Media error');
+                    reject(mediaError);
+                }, { once: true });
+            });
+            const reader = response.body.getReader();
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                const updated = whenUpdated();
+                buffer.appendBuffer(value);
+                await updated;
+                const { buffered } = buffer;
+                if (buffered.length && streamVideo.currentTime - buffered.start(0) > 2 * VIDEO_KEEP) {
+                    const removed = whenUpdated();
+                    buffer.remove(0, streamVideo.currentTime - VIDEO_KEEP);
+                    await removed;
+                }
+                keepVideoLive();
+                onFrame();
+            }
+        } catch (err) {
+            if (controller.signal.aborted) return;
+            if (mediaError) {
+                videoAbort = null;
+                controller.abort();
+                fallBackToMjpeg(mediaError.message);
+                return;
+            }
+            console.error('Video stream failed', err);
+        }
+        if (videoAbort === controller) {
+            videoAbort = null;
+            scheduleReconnect();
+        }
+    };
+
+    const stopVideoStream = () => {
+        if (videoAbort) {
+            videoAbort.abort();
+            videoAbort = null;
+        }
+        if (streamVideo && streamVideo.getAttribute('src')) {
+            streamVideo.removeAttribute('src');
+            streamVideo.load();
+        }
+    };
+
+    // Host cursor: /stream/cursor pushes its position (relative to the
+    // current view) and, once per shape, its image, so pointer feedback does
+    // not wait for the next frame. Local moves predict the position until
+    // the host has caught up.
+    const CURSOR_PREDICT_MS = 150;
+    const DEFAULT_CURSOR = {
+        width: 12,
+        height: 19,
+        xhot: 0,
+        yhot: 0,
+        image: 'data:image/svg+xml,' + encodeURIComponent(
+            '<svg xmlns="http://www.w3.org/2000/svg" width="12" height="19">'
+            + '<path d="M.5.5v16l4-4 3 6 2-1-3-6h5z" fill="#fff" stroke="#000"/></svg>'
+        ),
+    };
+    const cursorShapes = new Map();
+    const hostCursor = { x: 0, y: 0, inside: false, shape: null, predictedAt: 0, drawScheduled: false };
+    let cursorSource = null;
+
+    const drawRemoteCursor = () => {
+        hostCursor.drawScheduled = false;
+        if (!hostCursor.inside) {
+            remoteCursor.hidden = true;
+            return;
+        }
+        const shape = cursorShapes.get(hostCursor.shape) || DEFAULT_CURSOR;
+        const key = String(hostCursor.shape);
+        if (remoteCursor.dataset.shape !== key) {
+            remoteCursor.dataset.shape = key;
+            remoteCursor.src = shape.image;
+        }
+        const rect = surface.getBoundingClientRect();
+        const scale = (rect.width || 1) / (Number(surface.dataset.screenWidth) || rect.width || 1);
+        remoteCursor.style.width = `${shape.width * scale}px`;
+        remoteCursor.style.height = `${shape.height * scale}px`;
+        const left = hostCursor.x * rect.width - shape.xhot * scale;
+        const top = hostCursor.y * rect.height - shape.yhot * scale;
+        remoteCursor.style.transform = `translate(${left}px, ${top}px)`;
+        remoteCursor.hidden = false;
+    };
+
+    const scheduleCursorDraw = () => {
+        if (hostCursor.drawScheduled) return;
+        hostCursor.drawScheduled = true;
+        requestAnimationFrame(drawRemoteCursor);
+    };
+
+    const predictCursor = (pos) => {
+        if (!cursorSource) return;
+        hostCursor.x = pos.x;
+        hostCursor.y = pos.y;
+        hostCursor.inside = true;
+        hostCursor.predictedAt = performance.now();
+        scheduleCursorDraw();
+    };
+
+    const setRemoteCursorLive = (live) => {
+        if (screenWrapper) screenWrapper.classList.toggle('remote-cursor-on', live);
+        if (!live) remoteCursor.hidden = true;
+    };
+
+    const connectCursor = () => {
+        if (!remoteCursor || !('EventSource' in window)) return;
+        if (cursorSource) cursorSource.close();
+        const source = new EventSource('/stream/cursor');
+        source.addEventListener('shape', (event) => {
+            const shape = JSON.parse(event.data);
+            cursorShapes.set(shape.serial, shape);
+        });
+        source.addEventListener('message', (event) => {
+            const data = JSON.parse(event.data);
+            setRemoteCursorLive(true);
+            hostCursor.shape = data.shape;
+            if (performance.now() - hostCursor.predictedAt >= CURSOR_PREDICT_MS) {
+                hostCursor.x = data.x;
+                hostCursor.y = data.y;
+                hostCursor.inside = data.inside;
+            }
+            scheduleCursorDraw();
+        });
+        source.addEventListener('error', () => {
+            // EventSource retries by itself; CLOSED means no channel (404).
+            if (source.readyState === EventSource.CLOSED && cursorSource === source) {
+                cursorSource = null;
+                setRemoteCursorLive(false);
+            }
+        });
+        cursorSource = source;
+    };
+
     const refreshStream = ({ silent = false } = {}) => {
         if (!silent) {
             showStatus('Refreshing stream…');
         }
-        streamImg.src = `/stream?_=${Date.now()}`;
-        state.lastFrameTs = Date.now();
         if (reconnectTimer) clearTimeout(reconnectTimer);
+        state.lastFrameTs = Date.now();
+        stopCanvasStream();
+        stopVideoStream();
+        const mode = state.streamMode;
+        const onCanvas = mode === 'tiles' || (mode === 'mjpeg' && probe.on);
+        streamImg.hidden = mode !== 'mjpeg' || onCanvas;
+        if (streamCanvas) streamCanvas.hidden = !onCanvas;
+        if (streamVideo) streamVideo.hidden = mode !== 'video';
+        if (streamImg.hidden) streamImg.removeAttribute('src');
+        if (mode === 'tiles') {
+            runCanvasStream(`/stream/tiles?_=${Date.now()}`, consumeTiles);
+        } else if (mode === 'video') {
+            runVideoStream();
+        } else {
+            // Let the server downscale to what this viewport can show.
+            const { width, height } = viewportPixels();
+            const url = `/stream?width=${width}&height=${height}&_=${Date.now()}`;
+            if (onCanvas) {
+                runCanvasStream(url, consumeParts);
+            } else {
+                streamImg.src = url;
+            }
+            state.streamViewport = width;
+        }
+        if (probe.on) renderLatency();
+        // The cursor feed is relative to the view, which may have changed.
+        connectCursor();
+    };
+
+    const viewportPixels = () => {
+        const rect = surface.getBoundingClientRect();
+        const ratio = window.devicePixelRatio || 1;
+        return {
+            width: Math.round((rect.width || 1) * ratio),
+            height: Math.round((rect.height || 1) * ratio),
+        };
     };
 
     const checkAgentHealth = async () => {
@@ -163,54 +735,140 @@ if (!streamImg || !surface) {
         }
     };
 
-    // Auto-wake detection: check if stream appears black/idle
-    let blackScreenCheckCount = 0;
-    const checkBlackScreen = () => {
-        if (!streamImg.complete || streamImg.naturalWidth === 0) return;
-        
-        const canvas = document.createElement('canvas');
-        const ctx = canvas.getContext('2d');
-        canvas.width = Math.min(streamImg.naturalWidth, 100);
-        canvas.height = Math.min(streamImg.naturalHeight, 100);
-        
+    // Black-screen detection and waking happen on the server; it flags tile
+    // packets while the display sleeps and reports the state for MJPEG viewers.
+    const setDisplayAsleep = (asleep) => {
+        if (asleep === state.displayAsleep) return;
+        state.displayAsleep = asleep;
+        if (asleep) {
+            showStatus('Host display is asleep. Waking it…');
+        } else {
+            showStatus('Host display awake', { autoHideMs: 2000 });
+        }
+    };
+
+    const checkDisplayState = async () => {
         try {
-            ctx.drawImage(streamImg, 0, 0, canvas.width, canvas.height);
-            const imageData = ctx.getImageData(0, 0, canvas.width, canvas.height);
-            const pixels = imageData.data;
-            let darkPixels = 0;
-            
-            for (let i = 0; i < pixels.length; i += 4) {
-                const r = pixels[i];
-                const g = pixels[i + 1];
-                const b = pixels[i + 2];
-                const brightness = (r + g + b) / 3;
-                if (brightness < 10) darkPixels++;
-            }
-            
-            const darkRatio = darkPixels / (pixels.length / 4);
-            if (darkRatio > 0.95 && Date.now() - state.lastFrameTs > 3000) {
-                blackScreenCheckCount++;
-                if (blackScreenCheckCount >= 3) {
-                    console.log('Detected black screen, auto-waking...');
-                    wakeHost(true);
-                    blackScreenCheckCount = 0;
-                }
-            } else {
-                blackScreenCheckCount = 0;
+            const response = await fetch('/api/display/state', { credentials: 'include' });
+            if (!response.ok) return;
+            const data = await response.json();
+            setDisplayAsleep(data.state === 'asleep');
+        } catch (err) {
+            // Stream reconnect logic reports connectivity problems.
+        }
+    };
+
+    // Monitor / region selection is stored server-side per session (streams
+    // and input mapping follow it); the layout is polled so resolution or
+    // monitor changes on the host reshape the viewport.
+    const applyRegion = (region) => {
+        if (!region) return;
+        if (screenWrapper) screenWrapper.style.aspectRatio = `${region.width} / ${region.height}`;
+        surface.dataset.screenWidth = region.width;
+        surface.dataset.screenHeight = region.height;
+    };
+
+    const addViewOption = (value, label) => {
+        const option = document.createElement('option');
+        option.value = value;
+        option.textContent = label;
+        viewSelect.appendChild(option);
+    };
+
+    const loadMonitors = async () => {
+        if (!viewSelect) return;
+        try {
+            const response = await fetch('/api/monitors', { credentials: 'include' });
+            if (!response.ok) return;
+            const data = await response.json();
+            const layoutChanged = state.layoutVersion !== null && data.layout_version !== state.layoutVersion;
+            state.layoutVersion = data.layout_version;
+            viewSelect.innerHTML = '';
+            data.monitors.forEach((monitor) => {
+                const size = `${monitor.width}×${monitor.height}`;
+                addViewOption(monitor.view, monitor.index === 0 ? `All monitors (${size})` : `Monitor ${monitor.index} (${size})`);
+            });
+            if (data.view.startsWith('region:')) {
+                addViewOption(data.view, `Region ${data.region.width}×${data.region.height}`);
             }
+            addViewOption('region', 'Custom region…');
+            viewSelect.value = data.view;
+            applyRegion(data.region);
+            if (layoutChanged) refreshStream({ silent: true });
+        } catch (err) {
+            // Stream reconnect logic reports connectivity problems.
+        }
+    };
+
+    const selectView = async (spec) => {
+        try {
+            const response = await fetch('/api/view', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                credentials: 'include',
+                body: JSON.stringify(spec),
+            });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || `HTTP ${response.status}`);
+            applyRegion(data.region);
+            refreshStream();
+            // The input socket captured the old view; it reconnects by itself.
+            if (inputSocket) inputSocket.close();
         } catch (err) {
-            // Canvas may fail due to CORS, ignore
+            showStatus(`Could not switch view: ${err.message}`, { autoHideMs: 4000 });
         }
+        loadMonitors();
     };
 
+    if (viewSelect) {
+        viewSelect.addEventListener('change', () => {
+            const value = viewSelect.value;
+            if (value === 'region') {
+                const answer = window.prompt('Region in screen pixels: left,top,width,height', '0,0,1280,720');
+                const parts = (answer || '').split(',').map((part) => parseInt(part.trim(), 10));
+                if (parts.length !== 4 || parts.some(Number.isNaN)) {
+                    loadMonitors();
+                    return;
+                }
+                const [left, top, width, height] = parts;
+                selectView({ region: { left, top, width, height } });
+            } else if (value.startsWith('monitor:')) {
+                selectView({ monitor: parseInt(value.split(':')[1], 10) });
+            } else if (value === 'screen') {
+                selectView({});
+            }
+        });
+    }
+
     if (refreshBtn) {
         refreshBtn.addEventListener('click', () => refreshStream());
     }
 
+    if (modeSelect) {
+        if (!videoEnabled) {
+            const option = modeSelect.querySelector('option[value="video"]');
+            if (option) option.remove();
+        }
+        modeSelect.value = state.streamMode;
+        modeSelect.addEventListener('change', () => {
+            state.streamMode = modeSelect.value;
+            localStorage.setItem('streamMode', state.streamMode);
+            refreshStream();
+        });
+    }
+
     if (wakeBtn) {
         wakeBtn.addEventListener('click', wakeHost);
     }
 
+    if (latencyBtn) {
+        if (!tileCtx) {
+            latencyBtn.remove();
+        } else {
+            latencyBtn.addEventListener('click', () => setProbe(!probe.on));
+        }
+    }
+
     surface.addEventListener('mouseenter', (event) => {
         setSurfaceFlags({ hover: true });
         setCursorIndicator(normalize(event), 'cursor-hover');
@@ -225,11 +883,9 @@ if (!streamImg || !surface) {
     });
 
     surface.addEventListener('mousemove', (event) => {
-        const now = Date.now();
-        if (now - state.lastMoveTs < 40) return;
-        state.lastMoveTs = now;
         const pos = normalize(event);
         setCursorIndicator(pos, surface.classList.contains('is-clicking') ? 'cursor-click' : undefined);
+        predictCursor(pos);
         transmit({ type: 'mouse', action: 'move', ...pos });
     });
 
@@ -289,22 +945,11 @@ if (!streamImg || !surface) {
     document.addEventListener('keyup', (event) => handleKey(event, 'up'));
     window.addEventListener('blur', () => disarmInput());
 
-    streamImg.addEventListener('load', () => {
-        state.lastFrameTs = Date.now();
-        blackScreenCheckCount = 0; // Reset on successful load
-        if (!state.tipShown) {
-            state.tipShown = true;
-            showStatus('Tip: Keep the host awake/plugged in for best results.', { autoHideMs: 7000 });
-        } else {
-            hideStatus();
-        }
-        // Check for black screen after load
-        setTimeout(checkBlackScreen, 1000);
-    });
+    streamImg.addEventListener('load', onFrame);
 
     streamImg.addEventListener('error', () => {
-        showStatus('Stream unreachable. Retrying…');
-        reconnectTimer = setTimeout(() => refreshStream({ silent: true }), 1500);
+        if (state.streamMode !== 'mjpeg') return;
+        scheduleReconnect();
     });
 
     setInterval(() => {
@@ -312,10 +957,22 @@ if (!streamImg || !surface) {
             showStatus('Stream idle. Attempting to reconnect…');
             refreshStream({ silent: true });
         }
-        // Periodic black screen check
-        checkBlackScreen();
+        if (state.streamMode !== 'tiles') checkDisplayState();
     }, 4000);
 
+    let resizeTimer;
+    window.addEventListener('resize', () => {
+        if (resizeTimer) clearTimeout(resizeTimer);
+        resizeTimer = setTimeout(() => {
+            if (state.streamMode === 'tiles' || !state.streamViewport) return;
+            const { width } = viewportPixels();
+            // Only reconnect for a meaningful change in the size we asked for.
+            if (Math.abs(width - state.streamViewport) / state.streamViewport > 0.15) {
+                refreshStream({ silent: true });
+            }
+        }, 500);
+    });
+
     window.addEventListener('visibilitychange', () => {
         if (!document.hidden) {
             refreshStream({ silent: true });
@@ -325,6 +982,9 @@ if (!streamImg || !surface) {
 
     window.addEventListener('load', () => {
         refreshStream();
+        connectInputSocket();
+        loadMonitors();
+        setInterval(loadMonitors, 10000);
         setTimeout(() => armInput(), 350);
         if (agentEnabled) {
             checkAgentHealth();
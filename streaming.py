@@ -0,0 +1,479 @@
+"""
+Shared capture/encode producer for the ``/stream`` endpoints.
+
+A single producer thread captures frames and publishes the latest one into a
+shared slot. Viewers subscribe and block until a newer frame is available.
+Encodings (the full-frame JPEG, individual tiles) are computed lazily on the
+published ``Frame`` and cached there, so N viewers cost one capture and one
+encode per frame. The producer exits once the last subscriber leaves and is
+restarted on demand.
+
+Subscriptions can also be iterated with ``async for`` (the ASGI gateway):
+each event loop gets one wake-up per published frame, however many of its
+viewers are waiting.
+
+With a ``display`` monitor attached, every capture is checked for a blank
+(sleeping) screen, which drives its wake-up logic; while it considers the
+display asleep the monitor's small placeholder is published in place of the
+black capture, flagged ``display_asleep`` (see ``display_state``).
+
+Unchanged captures are not published (so nothing is encoded or sent) except
+for a periodic keep-alive frame. The capture interval adapts between
+``min_interval`` and ``interval``: it halves while the screen changes, grows
+back while it is idle, and drops to the minimum for ``activity_boost``
+seconds after ``notify_activity()`` (e.g. on user input).
+
+With ``input_marks`` (the latency probe, see ``probe``), each frame carries
+the last tagged input of every session injected before its grab started,
+and a capture is published whenever those changed, even if the screen did
+not.
+"""
+
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterator, List, Mapping, Tuple
+
+from PIL import Image
+
+import numpy as np
+
+import capture
+import metrics
+import tiles
+from capture import RawFrame
+from encoder import Box, StripeEncoder
+import tilecodec
+
+if TYPE_CHECKING:  # pragma: no cover
+    from display_state import DisplayMonitor
+    from probe import InputMark
+    from tilecodec import TileCodec
+
+logger = logging.getLogger(__name__)
+
+# Dirty-tile masks kept for tile subscribers that skipped frames.
+DIRTY_HISTORY = 32
+
+_ENCODE_SCALED = metrics.ENCODE_SECONDS.labels('scaled')
+_ENCODE_STRIPES = metrics.ENCODE_SECONDS.labels('stripes')
+_ENCODE_REGIONS = metrics.ENCODE_SECONDS.labels('regions')
+
+
+class Frame:
+    """A captured frame plus its lazily computed, shared encodings.
+
+    Encodings are cached per ``(quality, scale)``, stripes per quality and
+    regions per ``(box, quality)``, so viewers that settle on the same
+    settings share the work. Downscaled images are resized once per scale
+    and frame; the cache lives and dies with the frame (one sequence number),
+    and the scale ladder keeps it to a handful of entries. Quality and scale come from
+    ``adaptive.StreamClient``, which quantises them to a few steps for
+    exactly that reason. Full-scale frames are encoded as parallel stripes
+    (see ``encoder``) that tile viewers get as-is and MJPEG viewers spliced.
+    With a ``tile_codec``, tiles (and keyframes of mostly text / UI screens)
+    get the codec their content calls for instead; see ``tilecodec``.
+    """
+
+    def __init__(
+        self,
+        seq: int,
+        timestamp: float,
+        raw: RawFrame,
+        quality: int,
+        encoder: StripeEncoder,
+        display_asleep: bool = False,
+        tile_codec: 'TileCodec | None' = None,
+        inputs: 'Mapping[str, InputMark] | None' = None,
+    ) -> None:
+        self.seq = seq
+        self.timestamp = timestamp
+        self.raw = raw
+        self.quality = quality
+        self.encoder = encoder
+        self.tile_codec = tile_codec
+        # True when ``raw`` is the "display asleep" placeholder.
+        self.display_asleep = display_asleep
+        # Session id -> last tagged input injected before the grab (latency probe).
+        self.inputs = inputs if inputs is not None else {}
+        self._lock = threading.RLock()
+        self._images: Dict[float, object] = {}
+        self._jpegs: Dict[Tuple[int, float], bytes] = {}
+        self._stripes: Dict[int, List[Tuple[Box, bytes]]] = {}
+        self._regions: Dict[Tuple[Box, int], Tuple[int, bytes]] = {}
+        self._flatness: Dict[int, np.ndarray] = {}
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.raw.size
+
+    def _image(self, scale: float = 1.0):
+        image = self._images.get(scale)
+        if image is None:
+            if scale == 1.0 and self.raw.data is None:
+                image = capture.decode_jpeg(self.raw.jpeg)
+            elif scale == 1.0:
+                image = capture.bgra_image(self.raw.data, self.raw.size)
+            elif (1 / scale).is_integer():
+                image = self._image().reduce(int(1 / scale))
+            else:
+                width, height = self.raw.size
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                image = self._image().resize(size, Image.BILINEAR, reducing_gap=2.0)
+            self._images[scale] = image
+        return image
+
+    def cached_jpeg(self, quality: int | None = None, scale: float = 1.0) -> bytes | None:
+        """The encoding if some viewer already paid for it (never blocks)."""
+        return self._jpegs.get((quality or self.quality, scale))
+
+    def jpeg(self, quality: int | None = None, scale: float = 1.0) -> bytes:
+        key = (quality or self.quality, scale)
+        with self._lock:
+            data = self._jpegs.get(key)
+            if data is None:
+                if scale == 1.0:
+                    data = self.encoder.splice(self.stripes(key[0]), self.size)
+                else:
+                    with _ENCODE_SCALED.time():
+                        data = self.encoder.encode(self._image(scale), key[0])
+                self._jpegs[key] = data
+            return data
+
+    def stripes(self, quality: int | None = None) -> List[Tuple[Box, bytes]]:
+        """The full-scale frame as ``(box, jpeg)`` horizontal stripes."""
+        quality = quality or self.quality
+        with self._lock:
+            stripes = self._stripes.get(quality)
+            if stripes is None and self.raw.jpeg is not None and quality == self.raw.quality:
+                # Encoded upstream (agent ring): pass the JPEG through as one stripe.
+                stripes = self._stripes[quality] = [((0, 0) + self.size, self.raw.jpeg)]
+            elif stripes is None:
+                with _ENCODE_STRIPES.time():
+                    stripes = self._stripes[quality] = self.encoder.encode_stripes(self._image(), quality)
+            return stripes
+
+    def flatness(self, tile_size: int) -> np.ndarray | None:
+        """Per-tile flatness map, or ``None`` without a tile codec or pixels."""
+        if self.tile_codec is None or self.raw.data is None:
+            return None
+        with self._lock:
+            flat = self._flatness.get(tile_size)
+            if flat is None:
+                flat = self._flatness[tile_size] = tilecodec.flatness(tiles.pixels(self.raw), tile_size)
+            return flat
+
+    def regions(self, boxes: List[Box], quality: int | None = None, tile_size: int | None = None) -> List[Tuple[int, bytes]]:
+        """``(codec, data)`` for ``(left, top, right, bottom)`` regions at full scale.
+
+        Boxes aligned to ``tile_size`` tiles go through the tile codec when
+        there is one; everything else is JPEG.
+        """
+        quality = quality or self.quality
+        with self._lock:
+            missing = [box for box in boxes if (box, quality) not in self._regions]
+            if missing:
+                flat = self.flatness(tile_size) if tile_size else None
+                with _ENCODE_REGIONS.time():
+                    if flat is not None:
+                        encoded = self.tile_codec.encode_boxes(
+                            self.encoder, tiles.pixels(self.raw), self._image(), missing, flat, tile_size, quality
+                        )
+                    else:
+                        encoded = [
+                            (tilecodec.CODEC_JPEG, data)
+                            for data in self.encoder.encode_regions(self._image(), missing, quality)
+                        ]
+                self._regions.update(((box, quality), entry) for box, entry in zip(missing, encoded))
+            return [self._regions[(box, quality)] for box in boxes]
+
+    def keyframe(self, quality: int | None, tile_size: int, moving: bool = False) -> List[Tuple[Box, int, bytes]]:
+        """The whole frame for tile viewers as ``(box, codec, data)``.
+
+        Per tile when at least ``tilecodec.KEYFRAME_FLAT_RATIO`` of it is text / UI (so
+        that part stays lossless), JPEG stripes otherwise (video, photos) and
+        while the screen is ``moving`` (see ``tiles.MOTION_DIRTY_RATIO``).
+        """
+        flat = None if moving else self.flatness(tile_size)
+        if flat is not None and (
+            np.count_nonzero(flat >= tilecodec.FLAT_THRESHOLD) >= tilecodec.KEYFRAME_FLAT_RATIO * flat.size
+        ):
+            boxes = [tiles.tile_box(row, col, self.size, tile_size) for row, col in np.ndindex(*flat.shape)]
+            return [
+                (box, codec, data)
+                for box, (codec, data) in zip(boxes, self.regions(boxes, quality, tile_size))
+            ]
+        return [(box, tilecodec.CODEC_JPEG, data) for box, data in self.stripes(quality)]
+
+
+class Subscription:
+    """Handle returned by ``FrameBroadcaster.subscribe``; iterate for frames."""
+
+    def __init__(self, broadcaster: 'FrameBroadcaster', stall_timeout: float, tiles: bool) -> None:
+        self._broadcaster = broadcaster
+        self._stall_timeout = stall_timeout
+        self.tiles = tiles
+        self._last_seq = 0
+        self._closed = False
+
+    def __enter__(self) -> 'Subscription':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Frame]:
+        while not self._closed:
+            frame = self._broadcaster.wait_for_frame(self._last_seq, self._stall_timeout)
+            if frame is None:
+                # No frame within the stall timeout: end the response so a dead
+                # client cannot pin the producer forever. Browsers reconnect.
+                return
+            self._last_seq = frame.seq
+            yield frame
+
+    async def __aiter__(self) -> AsyncIterator[Frame]:
+        while not self._closed:
+            frame = await self._broadcaster.wait_for_frame_async(self._last_seq, self._stall_timeout)
+            if frame is None:
+                return
+            self._last_seq = frame.seq
+            yield frame
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._broadcaster._unsubscribe(self)
+
+
+class FrameBroadcaster:
+    def __init__(
+        self,
+        capture: Callable[[], RawFrame],
+        interval: float,
+        quality: int,
+        min_interval: float | None = None,
+        activity_boost: float = 1.5,
+        keepalive_interval: float = 5.0,
+        sample_stride: int = 4,
+        stall_timeout: float = 10.0,
+        tile_size: int = 64,
+        encoder: StripeEncoder | None = None,
+        release: Callable[[], None] | None = None,
+        display: 'DisplayMonitor | None' = None,
+        tile_codec: 'TileCodec | None' = None,
+        input_marks: 'Callable[[], Mapping[str, InputMark]] | None' = None,
+    ) -> None:
+        self._capture = capture
+        self._input_marks = input_marks
+        self.display = display
+        self._encoder = encoder or StripeEncoder(workers=0, stripe_height=256)
+        self._tile_codec = tile_codec
+        self._release = release
+        self._interval = interval
+        self._min_interval = min(interval, min_interval if min_interval is not None else interval)
+        self._activity_boost = activity_boost
+        self._keepalive_interval = keepalive_interval
+        self._sample_stride = max(1, sample_stride)
+        self._current_interval = interval
+        self._active_until = 0.0
+        self._wake = threading.Event()
+        self._quality = quality
+        self._stall_timeout = stall_timeout
+        self.tile_size = tile_size
+        self._cond = threading.Condition()
+        self._latest: Frame | None = None
+        self._seq = 0
+        self._subscribers = 0
+        self._tile_subscribers = 0
+        self._dirty: deque = deque(maxlen=DIRTY_HISTORY)
+        # Per event loop: set (and replaced) on the loop when a frame is published.
+        self._loop_events: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+        self._thread: threading.Thread | None = None
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @property
+    def latest(self) -> Frame | None:
+        return self._latest
+
+    @property
+    def current_interval(self) -> float:
+        return self._current_interval
+
+    def notify_activity(self) -> None:
+        """Capture at the fastest rate for a while, starting immediately."""
+        self._active_until = time.monotonic() + self._activity_boost
+        self._wake.set()
+
+    def subscribe(self, tiles: bool = False) -> Subscription:
+        """Register a viewer; ``tiles`` viewers also need dirty-tile masks."""
+        with self._cond:
+            self._subscribers += 1
+            if tiles:
+                self._tile_subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='frame-producer', daemon=True
+                )
+                self._thread.start()
+        return Subscription(self, self._stall_timeout, tiles)
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+            if subscription.tiles:
+                self._tile_subscribers = max(0, self._tile_subscribers - 1)
+            self._cond.notify_all()
+
+    def wait_for_frame(self, after_seq: int, timeout: float) -> Frame | None:
+        """Block until a frame newer than ``after_seq`` is published."""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._latest is not None and self._latest.seq > after_seq,
+                timeout,
+            )
+            return self._latest if ready else None
+
+    async def wait_for_frame_async(self, after_seq: int, timeout: float) -> Frame | None:
+        """``wait_for_frame`` for coroutines on an event loop."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            event = self._loop_events.get(loop)
+            if event is None:
+                event = self._loop_events[loop] = asyncio.Event()
+            # Checked after registering: _publish sets _latest before waking loops.
+            latest = self._latest
+            if latest is not None and latest.seq > after_seq:
+                return latest
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def _wake_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        event = self._loop_events.pop(loop, None)
+        if event is not None:
+            event.set()
+
+    def dirty_between(self, after_seq: int, upto_seq: int):
+        """Union of dirty-tile masks for frames ``(after_seq, upto_seq]``.
+
+        Returns ``None`` when any of those masks is unknown (history overflow,
+        resolution change, no tile viewers at the time), meaning the caller
+        must resynchronise with a keyframe.
+        """
+        with self._cond:
+            history = {seq: mask for seq, mask in self._dirty}
+        union = None
+        for seq in range(after_seq + 1, upto_seq + 1):
+            mask = history.get(seq)
+            if mask is None:
+                return None
+            union = mask if union is None else union | mask
+        return union
+
+    def _publish(
+        self, raw: RawFrame, dirty, inputs: 'Mapping[str, InputMark] | None' = None, asleep: bool = False
+    ) -> None:
+        with self._cond:
+            self._seq += 1
+            self._latest = Frame(
+                self._seq, time.time(), raw, self._quality, self._encoder, asleep, self._tile_codec, inputs
+            )
+            self._dirty.append((self._seq, dirty))
+            self._cond.notify_all()
+        for loop in tuple(self._loop_events):
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:  # loop closed
+                self._loop_events.pop(loop, None)
+
+    def _run(self) -> None:
+        try:
+            self._produce()
+        finally:
+            if self._release is not None:
+                self._release()
+
+    def _next_interval(self, changed: bool) -> float:
+        if changed:
+            interval = self._current_interval / 2
+        else:
+            interval = self._current_interval * 1.5
+        self._current_interval = max(self._min_interval, min(self._interval, interval))
+        if time.monotonic() < self._active_until:
+            return self._min_interval
+        return self._current_interval
+
+    def _produce(self) -> None:
+        previous: RawFrame | None = None
+        last_publish = 0.0
+        published_inputs = None
+        phase = 0
+        while True:
+            with self._cond:
+                if self._subscribers == 0:
+                    # Drop the cached frame so a new viewer never sees a stale one.
+                    self._thread = None
+                    self._latest = None
+                    self._dirty.clear()
+                    return
+                want_dirty = self._tile_subscribers > 0
+
+            started = time.monotonic()
+            changed = True
+            # Before the grab: only inputs injected by now can be in it.
+            inputs = self._input_marks() if self._input_marks is not None else None
+            try:
+                raw = self._capture()
+                asleep = self.display is not None and self.display.observe(raw)
+                if asleep:
+                    # Unchanged placeholder: nothing to encode or send but keep-alives.
+                    raw = self.display.placeholder
+                dirty = None
+                if previous is not None and previous.size == raw.size:
+                    if raw.jpeg is not None and raw.jpeg == previous.jpeg:
+                        # Same frame from an upstream encoder: nothing to diff.
+                        changed = False
+                        if want_dirty:
+                            dirty = tiles.empty_mask(raw.size, self.tile_size)
+                    elif want_dirty:
+                        raw = capture.with_pixels(raw)
+                        dirty = tiles.dirty_tiles(capture.with_pixels(previous), raw, self.tile_size)
+                        changed = bool(dirty.any())
+                    else:
+                        phase += 1
+                        changed = tiles.frame_changed(previous, raw, self._sample_stride, phase)
+                # Idle screens still publish now and then: viewers use frames
+                # as a heartbeat and the sampled check can miss small changes.
+                # Probed inputs get a frame even if nothing visible changed.
+                if (
+                    changed
+                    or inputs is not published_inputs
+                    or started - last_publish >= self._keepalive_interval
+                ):
+                    self._publish(raw, dirty, inputs, asleep)
+                    previous = raw
+                    last_publish = started
+                    published_inputs = inputs
+                metrics.CAPTURES.labels('changed' if changed else 'unchanged').inc()
+            except Exception:
+                logger.exception('Frame capture failed')
+                metrics.CAPTURES.labels('error').inc()
+                changed = False
+
+            elapsed = time.monotonic() - started
+            self._wake.wait(max(0.0, self._next_interval(changed) - elapsed))
+            self._wake.clear()
@@ -0,0 +1,177 @@
+"""
+Content-aware codec choice for tile updates (``/stream/tiles``, recordings).
+
+JPEG blurs text and UI edges, and lossless formats waste bytes on photos and
+video. ``TileCodec`` picks per tile:
+
+* a frame-wide *flatness* map (per tile, the share of pixels equal to their
+  left neighbour: one vectorised compare per frame, ~2.5 ms at 1080p)
+  separates synthetic content (text, UI, flat fills: above ~0.5) from
+  photographic content (video, photos, gradients: close to 0);
+* a flat tile with at most 256 distinct colours (the usual terminal / IDE
+  tile) is sent lossless: as WebP when it has a handful of colours (blank
+  areas, rules; about half the size of the PNG) and Pillow has WebP, as a
+  palette PNG at 1-8 bits per pixel otherwise;
+* everything else stays JPEG at the viewer's quality, including flat tiles
+  with more colours (text over images, dense anti-aliased text), where
+  lossless WebP measured ~5x the JPEG.
+
+Encodings are cached by tile content (BLAKE2 of the pixels and the tile's
+shape, plus the quality for JPEG) across frames, viewers and views, up to ``cache_bytes``: text that
+reappears (periodic keyframes, a blinking caret, switching back to a tab) is
+hashed, not re-encoded.
+
+Scrolled content misses that cache on every frame, and classifying hundreds
+of new tiles costs several times a JPEG encode, so ``tiles.TileUpdates``
+bypasses the codec while the screen is moving.
+"""
+
+
+from __future__ import annotations
+
+import hashlib
+import io
+import struct
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, features
+
+import capture
+import metrics
+import tiles
+
+if TYPE_CHECKING:  # pragma: no cover
+    from encoder import Box, StripeEncoder
+
+CODEC_JPEG = 0
+CODEC_PNG = 1
+CODEC_WEBP = 2
+CODEC_NAMES = {CODEC_JPEG: 'jpeg', CODEC_PNG: 'png', CODEC_WEBP: 'webp'}
+
+# Tiles at least this flat are treated as text / UI ...
+FLAT_THRESHOLD = 0.5
+# ... and keyframes with at least this share of such tiles are sent per tile.
+KEYFRAME_FLAT_RATIO = 0.25
+PALETTE_COLORS = 256
+# Up to this many colours lossless WebP beats the palette PNG.
+WEBP_COLORS = 4
+_OPAQUE = np.uint32(0xFF000000)
+
+_ENCODES = {codec: metrics.TILE_ENCODES.labels(name) for codec, name in CODEC_NAMES.items()}
+_BYTES = {codec: metrics.TILE_BYTES.labels(name) for codec, name in CODEC_NAMES.items()}
+_CACHE_HIT = metrics.TILE_CACHE.labels('hit')
+_CACHE_MISS = metrics.TILE_CACHE.labels('miss')
+
+
+def flatness(pixels: np.ndarray, tile_size: int) -> np.ndarray:
+    """Per-tile share of pixels equal to their left neighbour, ``(rows, cols)``."""
+    height, width = pixels.shape
+    rows, cols = tiles.grid_shape((width, height), tile_size)
+    same = np.zeros((rows * tile_size, cols * tile_size), dtype=np.uint8)
+    np.equal(pixels[:, 1:], pixels[:, :-1], out=same[:height, 1:width].view(bool))
+    counts = same.reshape(rows, tile_size, cols, tile_size).sum(axis=(1, 3), dtype=np.uint32)
+    heights = np.minimum(tile_size, height - np.arange(rows) * tile_size)
+    widths = np.minimum(tile_size, width - np.arange(cols) * tile_size)
+    return counts / np.outer(heights, widths)
+
+
+def palette(tile: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct opaque colours of a BGRA tile and each pixel's index into them."""
+    return np.unique(tile | _OPAQUE, return_inverse=True)
+
+
+def palette_png(colors: np.ndarray, indices: np.ndarray, size: Tuple[int, int]) -> bytes:
+    """Lossless PNG of a tile given as ``palette`` output (at most 256 colours)."""
+    width, height = size
+    image = Image.frombuffer('P', (width, height), indices.astype(np.uint8).tobytes(), 'raw', 'P', 0, 1)
+    image.putpalette(colors.view(np.uint8).reshape(-1, 4)[:, 2::-1].tobytes())
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', compress_level=6)
+    return buffer.getvalue()
+
+
+def webp_lossless(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='WEBP', lossless=True, quality=0, method=0)
+    return buffer.getvalue()
+
+
+class TileCodec:
+    def __init__(self, cache_bytes: int = 32 * 1024 * 1024, webp: bool | None = None) -> None:
+        self.cache_bytes = cache_bytes
+        self.webp = features.check('webp') if webp is None else webp
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[Tuple[bytes, int], Tuple[int, bytes]] = OrderedDict()
+        self._cached_bytes = 0
+
+    def _get(self, key: Tuple[bytes, int]) -> Tuple[int, bytes] | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _put(self, key: Tuple[bytes, int], entry: Tuple[int, bytes]) -> None:
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = entry
+            self._cached_bytes += len(entry[1])
+            while self._cached_bytes > self.cache_bytes and self._cache:
+                _, (_, data) = self._cache.popitem(last=False)
+                self._cached_bytes -= len(data)
+
+    def encode(
+        self, pixels: np.ndarray, image: Image.Image, box: 'Box', flat: float, quality: int
+    ) -> Tuple[int, bytes]:
+        """``(codec, data)`` for ``box`` of a frame (``pixels`` and ``image`` views of it)."""
+        left, top, right, bottom = box
+        tile = np.ascontiguousarray(pixels[top:bottom, left:right])
+        # Edge tiles of one colour can share bytes but not shape (64x56 vs 56x64).
+        digest = hashlib.blake2b(tile, digest_size=16).digest() + struct.pack('<HH', right - left, bottom - top)
+        # Lossless entries are stored under quality 0 (valid JPEG qualities start at 1).
+        for key in ((digest, 0), (digest, quality)):
+            entry = self._get(key)
+            if entry is not None:
+                _CACHE_HIT.inc()
+                return entry
+        _CACHE_MISS.inc()
+
+        entry = None
+        if flat >= FLAT_THRESHOLD:
+            colors, indices = palette(tile)
+            if len(colors) <= WEBP_COLORS and self.webp:
+                entry = (CODEC_WEBP, webp_lossless(image.crop(box)))
+            elif len(colors) <= PALETTE_COLORS:
+                entry = (CODEC_PNG, palette_png(colors, indices, (right - left, bottom - top)))
+        key = (digest, 0)
+        if entry is None:
+            entry = (CODEC_JPEG, capture.encode_jpeg(image.crop(box), quality))
+            key = (digest, quality)
+        _ENCODES[entry[0]].inc()
+        _BYTES[entry[0]].inc(len(entry[1]))
+        self._put(key, entry)
+        return entry
+
+    def encode_boxes(
+        self,
+        encoder: 'StripeEncoder',
+        pixels: np.ndarray,
+        image: Image.Image,
+        boxes: Sequence['Box'],
+        flat: np.ndarray,
+        tile_size: int,
+        quality: int,
+    ) -> List[Tuple[int, bytes]]:
+        """Encode tile-aligned ``boxes`` on the encoder's worker threads."""
+        return encoder.map(
+            lambda box: self.encode(pixels, image, box, float(flat[box[1] // tile_size, box[0] // tile_size]), quality),
+            boxes,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._cache), 'bytes': self._cached_bytes, 'webp': self.webp}
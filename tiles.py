@@ -0,0 +1,252 @@
+"""
+Tile-based dirty-region delta streaming.
+
+The screen is split into fixed ``tile_size`` squares. The producer compares
+each captured frame with the previous one (vectorised with NumPy on 32-bit
+pixels) and records which tiles changed. A tile viewer is then sent only the
+changed tiles since the last frame it received (an empty packet when nothing
+changed), plus a full keyframe on connect, after gaps it cannot reconstruct,
+and every ``keyframe_interval`` seconds for resync. Keyframes are sent as the
+horizontal stripes produced by the parallel encoder, or tile by tile when
+the screen is mostly text / UI, and reassembled on the client's canvas.
+Each tile says which image codec it uses (``tilecodec``). While a large part
+of the screen changes (scrolling, ``MOTION_DIRTY_RATIO``) the tile codec's
+per-tile choice is skipped and JPEG stripes go out instead; a keyframe once
+the screen is still brings text back to lossless.
+
+Wire format (all little-endian), one length-prefixed packet per update::
+
+    u32 packet_length
+    4s  magic  b'RDT2'
+    u8  flags  (bit 0: keyframe, bit 1: display asleep placeholder,
+                bit 2: input block present)
+    u32 seq
+    f64 capture timestamp (unix seconds)
+    u16 width, u16 height, u16 tile_count
+    [u32 input id, f64 input sent time (browser clock, unix ms)]  if bit 2
+    tile_count x { u16 x, u16 y, u16 w, u16 h, u8 codec, u32 length, <length> bytes }
+
+``codec`` is 0 for JPEG, 1 for PNG, 2 for WebP. ``b'RDT1'`` packets (older
+recordings) have no codec byte and only JPEG tiles.
+
+The input block is the latency probe's: the last tagged input event of the
+viewer's session injected before this frame was captured (see ``probe``).
+"""
+
+
+from __future__ import annotations
+
+import struct
+import time
+from typing import TYPE_CHECKING, Iterator, List, Tuple
+
+import numpy as np
+
+from capture import RawFrame
+
+if TYPE_CHECKING:  # pragma: no cover
+    from adaptive import StreamClient
+    from probe import InputMark
+    from streaming import FrameBroadcaster, Subscription
+
+MAGIC = b'RDT2'
+MAGIC_V1 = b'RDT1'
+FLAG_KEYFRAME = 0x01
+FLAG_DISPLAY_ASLEEP = 0x02
+FLAG_INPUT = 0x04
+# Above this share of dirty tiles a keyframe is smaller and cheaper.
+KEYFRAME_DIRTY_RATIO = 0.5
+# With a tile codec, above this share the screen is moving (scrolling,
+# dragging, video): a whole-frame JPEG keyframe goes out instead, skipping
+# the per-tile codec choice, and a keyframe once the screen is still
+# restores lossless text.
+MOTION_DIRTY_RATIO = 0.25
+
+_LENGTH = struct.Struct('<I')
+_HEADER = struct.Struct('<4sBIdHHH')
+_INPUT = struct.Struct('<Id')
+_TILE = struct.Struct('<HHHHBI')
+_TILE_V1 = struct.Struct('<HHHHI')
+
+Tile = Tuple[int, int, int, int, int, bytes]  # x, y, w, h, codec, data
+
+
+def grid_shape(size: Tuple[int, int], tile_size: int) -> Tuple[int, int]:
+    width, height = size
+    return -(-height // tile_size), -(-width // tile_size)
+
+
+def empty_mask(size: Tuple[int, int], tile_size: int) -> np.ndarray:
+    return np.zeros(grid_shape(size, tile_size), dtype=bool)
+
+
+def pixels(frame: RawFrame) -> np.ndarray:
+    """View a BGRA frame as a ``(height, width)`` array of 32-bit pixels."""
+    width, height = frame.size
+    return np.frombuffer(frame.data, dtype=np.uint32, count=width * height).reshape(height, width)
+
+
+def frame_changed(previous: RawFrame, current: RawFrame, row_stride: int, phase: int = 0) -> bool:
+    """Cheap change check comparing every ``row_stride``-th pixel row.
+
+    Callers rotate ``phase`` between captures so a lasting change in any row
+    is noticed within ``row_stride`` captures.
+    """
+    if previous.size != current.size:
+        return True
+    if previous.data is None or current.data is None:
+        return previous.jpeg != current.jpeg
+    rows = slice(phase % row_stride, None, row_stride)
+    return not np.array_equal(pixels(previous)[rows], pixels(current)[rows])
+
+
+def dirty_tiles(previous: RawFrame, current: RawFrame, tile_size: int) -> np.ndarray:
+    """Boolean ``(rows, cols)`` mask of tiles that differ between two frames."""
+    width, height = current.size
+    rows, cols = grid_shape(current.size, tile_size)
+    changed = pixels(previous) != pixels(current)
+    if rows * tile_size != height or cols * tile_size != width:
+        padded = np.zeros((rows * tile_size, cols * tile_size), dtype=bool)
+        padded[:height, :width] = changed
+        changed = padded
+    return changed.reshape(rows, tile_size, cols, tile_size).any(axis=(1, 3))
+
+
+def moving(mask: np.ndarray) -> bool:
+    """Whether a dirty-tile mask is large enough to send JPEG stripes instead."""
+    return bool(mask.mean() > MOTION_DIRTY_RATIO)
+
+
+def tile_box(row: int, col: int, size: Tuple[int, int], tile_size: int) -> Tuple[int, int, int, int]:
+    width, height = size
+    left, top = col * tile_size, row * tile_size
+    return left, top, min(width, left + tile_size), min(height, top + tile_size)
+
+
+def pack_update(
+    seq: int,
+    timestamp: float,
+    size: Tuple[int, int],
+    keyframe: bool,
+    parts: List[Tile],
+    display_asleep: bool = False,
+    input_mark: 'InputMark | None' = None,
+) -> bytes:
+    flags = (FLAG_KEYFRAME if keyframe else 0) | (FLAG_DISPLAY_ASLEEP if display_asleep else 0)
+    if input_mark is not None:
+        flags |= FLAG_INPUT
+    body = [_HEADER.pack(MAGIC, flags, seq, timestamp, size[0], size[1], len(parts))]
+    if input_mark is not None:
+        body.append(_INPUT.pack(input_mark.input_id, input_mark.sent))
+    for x, y, w, h, codec, data in parts:
+        body.append(_TILE.pack(x, y, w, h, codec, len(data)))
+        body.append(data)
+    payload = b''.join(body)
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def unpack_update(payload: bytes) -> Tuple[int, int, float, Tuple[int, int], List[Tile]]:
+    """``(flags, seq, timestamp, size, tiles)`` of a packet without its length prefix."""
+    magic, flags, seq, timestamp, width, height, count = _HEADER.unpack_from(payload)
+    if magic not in (MAGIC, MAGIC_V1):
+        raise ValueError(f'not a tile packet: {magic!r}')
+    parts = []
+    position = _HEADER.size + (_INPUT.size if flags & FLAG_INPUT else 0)
+    for _ in range(count):
+        if magic == MAGIC:
+            x, y, w, h, codec, length = _TILE.unpack_from(payload, position)
+            position += _TILE.size
+        else:
+            (x, y, w, h, length), codec = _TILE_V1.unpack_from(payload, position), 0
+            position += _TILE_V1.size
+        parts.append((x, y, w, h, codec, payload[position:position + length]))
+        position += length
+    return flags, seq, timestamp, (width, height), parts
+
+
+def unpack_input(payload: bytes) -> Tuple[int, float] | None:
+    """``(input id, sent time)`` of a packet's input block, if it has one."""
+    if not payload[4] & FLAG_INPUT:
+        return None
+    return _INPUT.unpack_from(payload, _HEADER.size)
+
+
+class TileUpdates:
+    """Per-viewer state turning published frames into update packets."""
+
+    def __init__(
+        self,
+        broadcaster: 'FrameBroadcaster',
+        keyframe_interval: float,
+        client: 'StreamClient',
+        session_id: str | None = None,
+    ) -> None:
+        self._broadcaster = broadcaster
+        self._keyframe_interval = keyframe_interval
+        self.client = client
+        # Whose probed inputs (``Frame.inputs``) go into the packets.
+        self.session_id = session_id
+        self._last_seq = None
+        self._last_size = None
+        self._last_keyframe = 0.0
+        self._lossy = False  # the last keyframe was JPEG stripes sent while the screen moved
+
+    def packet(self, frame) -> bytes:
+        """The update bringing this viewer from its last frame to ``frame``.
+
+        Tiles are always sent at full scale; ``client`` only picks the quality.
+        """
+        now = time.monotonic()
+        mask = None
+        if self._last_seq is not None and frame.size == self._last_size:
+            mask = self._broadcaster.dirty_between(self._last_seq, frame.seq)
+
+        tile_size = self._broadcaster.tile_size
+        motion = mask is not None and frame.tile_codec is not None and moving(mask)
+        if (
+            mask is None
+            or now - self._last_keyframe >= self._keyframe_interval
+            or mask.mean() > KEYFRAME_DIRTY_RATIO
+            or motion
+            or (self._lossy and not mask.any())
+        ):
+            boxes_data = frame.keyframe(self.client.quality, tile_size, moving=motion)
+            keyframe = True
+            self._last_keyframe = now
+            self._lossy = motion
+        else:
+            boxes = [tile_box(int(row), int(col), frame.size, tile_size) for row, col in np.argwhere(mask)]
+            boxes_data = [
+                (box, codec, data)
+                for box, (codec, data) in zip(boxes, frame.regions(boxes, self.client.quality, tile_size))
+            ]
+            keyframe = False
+        parts = [
+            (left, top, right - left, bottom - top, codec, data)
+            for (left, top, right, bottom), codec, data in boxes_data
+        ]
+
+        self._last_seq = frame.seq
+        self._last_size = frame.size
+        # Unchanged frames still produce an empty packet: it doubles as a
+        # liveness heartbeat for the dashboard and detects dead clients.
+        return pack_update(
+            frame.seq, frame.timestamp, frame.size, keyframe, parts, frame.display_asleep,
+            frame.inputs.get(self.session_id),
+        )
+
+
+def stream_updates(
+    broadcaster: 'FrameBroadcaster',
+    subscription: 'Subscription',
+    keyframe_interval: float,
+    client: 'StreamClient',
+    session_id: str | None = None,
+) -> Iterator[bytes]:
+    """Yield tile update packets for one viewer until the subscription ends."""
+    updates = TileUpdates(broadcaster, keyframe_interval, client, session_id)
+    for frame in subscription:
+        packet = updates.packet(frame)
+        started = time.monotonic()
+        yield packet
+        client.frame_sent(frame.seq, len(packet), time.monotonic() - started)
@@ -0,0 +1,273 @@
+"""
+H.264 in fragmented MP4 for ``/stream/video`` (Media Source Extensions).
+
+MJPEG re-sends every pixel of every frame, so full-motion content (video,
+dragged windows) costs megabytes per second. Here each viewer gets a
+``VideoEncoder``: libx264 through PyAV in low-latency settings
+(``tune=zerolatency``: no B-frames, no lookahead, one access unit out per
+frame in), constrained to ``bitrate`` with an IDR frame every
+``keyframe_interval`` seconds. The encoder is per viewer because H.264 state
+is: a viewer can only join at an IDR frame and skipping frames breaks the
+references of the next ones.
+
+The MP4 boxes are written here rather than by libavformat, whose mp4 muxer
+holds each fragment back until the next packet arrives. With captures up to
+seconds apart on an idle screen that would be seconds of latency. The stream
+is one init segment (``ftyp`` + ``moov`` with the ``avcC`` from x264's
+headers) followed by one ``moof`` + ``mdat`` fragment per captured frame.
+Samples all last ``frame_duration`` and follow each other back to back, so
+the timeline has no gaps however irregular the captures; the dashboard keeps
+playback at the live edge.
+
+PyAV is optional (``requirements-video.txt``): without it ``available()`` is
+false and the dashboard stays on MJPEG or tiles.
+"""
+
+
+from __future__ import annotations
+
+import struct
+import time
+from fractions import Fraction
+from typing import List, Tuple
+
+import numpy as np
+
+import capture
+import metrics
+from capture import RawFrame
+
+try:
+    import av
+    from av.codec.context import Flags
+    from av.video.frame import PictureType
+except Exception:  # pragma: no cover - PyAV optional
+    av = None
+
+CODEC = 'libx264'
+TIMESCALE = 1000  # MP4 ticks per second
+TRACK_ID = 1
+# trun sample flags: sync samples depend on nothing, the rest are non-sync.
+_SYNC_SAMPLE = 0x02000000
+_NON_SYNC_SAMPLE = 0x01010000
+# trun flags: data offset, per-sample duration, size and flags present.
+_TRUN_FLAGS = 0x000001 | 0x000100 | 0x000200 | 0x000400
+# tfhd flag: offsets are relative to the moof (as MSE requires).
+_DEFAULT_BASE_IS_MOOF = 0x020000
+_MATRIX = struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+_HIGH_PROFILES = (100, 110, 122, 144)
+
+_ENCODE = metrics.ENCODE_SECONDS.labels('h264')
+
+
+def available() -> bool:
+    """PyAV is installed and has an H.264 encoder."""
+    if av is None:
+        return False
+    try:
+        av.codec.Codec(CODEC, 'w')
+    except Exception:
+        return False
+    return True
+
+
+def scaled_size(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    """``size`` times ``scale``, rounded down to the even sizes 4:2:0 needs."""
+    width, height = size
+    return max(2, int(width * scale) & ~1), max(2, int(height * scale) & ~1)
+
+
+def _box(kind: bytes, *payload: bytes) -> bytes:
+    body = b''.join(payload)
+    return struct.pack('>I4s', 8 + len(body), kind) + body
+
+
+def _full_box(kind: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return _box(kind, struct.pack('>I', version << 24 | flags), *payload)
+
+
+def nal_units(data: bytes) -> List[bytes]:
+    """The NAL units of an Annex B byte stream (start codes removed)."""
+    return [unit.rstrip(b'\x00') for unit in data.split(b'\x00\x00\x01') if unit.strip(b'\x00')]
+
+
+def avcc_sample(data: bytes) -> bytes:
+    """Annex B access unit -> MP4 sample (4-byte length before each NAL unit)."""
+    return b''.join(struct.pack('>I', len(unit)) + unit for unit in nal_units(data))
+
+
+def codec_string(extradata: bytes) -> str:
+    """RFC 6381 ``avc1.PPCCLL`` for the SPS in ``extradata``."""
+    sps = next(unit for unit in nal_units(extradata) if unit[0] & 0x1F == 7)
+    return 'avc1.{:02X}{:02X}{:02X}'.format(*sps[1:4])
+
+
+def avc_config(extradata: bytes) -> bytes:
+    """``avcC`` box from x264's Annex B SPS / PPS."""
+    units = nal_units(extradata)
+    sps = [unit for unit in units if unit[0] & 0x1F == 7]
+    pps = [unit for unit in units if unit[0] & 0x1F == 8]
+    profile, compatibility, level = sps[0][1:4]
+    body = [bytes((1, profile, compatibility, level, 0xFC | 3, 0xE0 | len(sps)))]
+    body += [struct.pack('>H', len(unit)) + unit for unit in sps]
+    body.append(bytes((len(pps),)))
+    body += [struct.pack('>H', len(unit)) + unit for unit in pps]
+    if profile in _HIGH_PROFILES:
+        body.append(bytes((0xFC | 1, 0xF8, 0xF8, 0)))  # 4:2:0, 8-bit, no SPS extensions
+    return _box(b'avcC', *body)
+
+
+def init_segment(size: Tuple[int, int], extradata: bytes) -> bytes:
+    """``ftyp`` + ``moov`` for one H.264 track with no samples (they come in fragments)."""
+    width, height = size
+    sample_entry = _box(
+        b'avc1',
+        bytes(6), struct.pack('>H', 1),  # reserved, data_reference_index
+        bytes(16), struct.pack('>HH', width, height),
+        struct.pack('>IIIH', 0x00480000, 0x00480000, 0, 1),  # 72 dpi, reserved, frame_count
+        bytes(32), struct.pack('>Hh', 0x18, -1),  # compressor name, depth, pre_defined
+        avc_config(extradata),
+    )
+    sample_table = _box(
+        b'stbl',
+        _full_box(b'stsd', 0, 0, struct.pack('>I', 1), sample_entry),
+        _full_box(b'stts', 0, 0, bytes(4)),
+        _full_box(b'stsc', 0, 0, bytes(4)),
+        _full_box(b'stsz', 0, 0, bytes(8)),
+        _full_box(b'stco', 0, 0, bytes(4)),
+    )
+    media = _box(
+        b'mdia',
+        _full_box(b'mdhd', 0, 0, struct.pack('>IIIIHH', 0, 0, TIMESCALE, 0, 0x55C4, 0)),  # language 'und'
+        _full_box(b'hdlr', 0, 0, bytes(4), b'vide', bytes(12), b'VideoHandler\x00'),
+        _box(
+            b'minf',
+            _full_box(b'vmhd', 0, 1, bytes(8)),
+            _box(b'dinf', _full_box(b'dref', 0, 0, struct.pack('>I', 1), _full_box(b'url ', 0, 1))),
+            sample_table,
+        ),
+    )
+    track = _box(
+        b'trak',
+        _full_box(
+            b'tkhd', 0, 3,  # enabled, in movie
+            struct.pack('>IIIII', 0, 0, TRACK_ID, 0, 0), bytes(8), bytes(8), _MATRIX,
+            struct.pack('>II', width << 16, height << 16),
+        ),
+        media,
+    )
+    movie = _box(
+        b'moov',
+        _full_box(
+            b'mvhd', 0, 0,
+            struct.pack('>IIIIIH', 0, 0, TIMESCALE, 0, 0x10000, 0x100), bytes(10), _MATRIX, bytes(24),
+            struct.pack('>I', TRACK_ID + 1),
+        ),
+        track,
+        _box(b'mvex', _full_box(b'trex', 0, 0, struct.pack('>IIIII', TRACK_ID, 1, 0, 0, 0))),
+    )
+    return _box(b'ftyp', b'isom', struct.pack('>I', 0x200), b'isomiso6avc1mp41') + movie
+
+
+def fragment(sequence: int, decode_time: int, duration: int, sample: bytes, keyframe: bool) -> bytes:
+    """``moof`` + ``mdat`` carrying one sample."""
+
+    def movie_fragment(data_offset: int) -> bytes:
+        return _box(
+            b'moof',
+            _full_box(b'mfhd', 0, 0, struct.pack('>I', sequence)),
+            _box(
+                b'traf',
+                _full_box(b'tfhd', 0, _DEFAULT_BASE_IS_MOOF, struct.pack('>I', TRACK_ID)),
+                _full_box(b'tfdt', 1, 0, struct.pack('>Q', decode_time)),
+                _full_box(
+                    b'trun', 0, _TRUN_FLAGS,
+                    struct.pack(
+                        '>IiIII', 1, data_offset, duration, len(sample),
+                        _SYNC_SAMPLE if keyframe else _NON_SYNC_SAMPLE,
+                    ),
+                ),
+            ),
+        )
+
+    # The sample starts right after the moof and the 8-byte mdat header.
+    header_size = len(movie_fragment(0))
+    return movie_fragment(header_size + 8) + _box(b'mdat', sample)
+
+
+class VideoEncoder:
+    """One viewer's H.264 stream: ``init_segment`` first, then ``encode`` each frame."""
+
+    def __init__(
+        self,
+        size: Tuple[int, int],
+        bitrate: int = 2_000_000,
+        keyframe_interval: float = 10.0,
+        frame_duration: float = 0.1,
+        preset: str = 'ultrafast',
+    ) -> None:
+        if av is None:
+            raise RuntimeError('PyAV is not installed')
+        self.size = scaled_size(size, 1.0)
+        self.keyframe_interval = keyframe_interval
+        self._duration = max(1, round(frame_duration * TIMESCALE))
+        context = av.CodecContext.create(CODEC, 'w')
+        context.width, context.height = self.size
+        context.pix_fmt = 'yuv420p'
+        context.time_base = Fraction(1, TIMESCALE)
+        context.framerate = Fraction(TIMESCALE, self._duration)
+        context.bit_rate = bitrate
+        # Keyframes are forced by wall time in ``encode``; this only bounds
+        # x264's own count at the full frame rate.
+        context.gop_size = max(1, round(keyframe_interval * TIMESCALE / self._duration))
+        context.flags |= Flags.global_header  # SPS / PPS in extradata, for avcC
+        context.options = {
+            'preset': preset,
+            'tune': 'zerolatency',
+            'maxrate': str(bitrate),
+            'bufsize': str(bitrate),  # about one second of VBV buffer
+            'colorspace': 'bt709',
+            'color_primaries': 'bt709',
+            'color_trc': 'bt709',
+            'color_range': 'tv',
+        }
+        context.open()
+        self._context = context
+        self.codec = codec_string(context.extradata)
+        self.init_segment = init_segment(self.size, context.extradata)
+        self._sequence = 0
+        self._last_keyframe = 0.0
+        self._last_picture = None
+
+    def encode(self, raw: RawFrame) -> bytes:
+        """Fragments for ``raw`` (scaled to ``size``); empty while x264 holds it back."""
+        raw = capture.with_pixels(raw)
+        width, height = raw.size
+        pixels = np.frombuffer(raw.data, dtype=np.uint8, count=width * height * 4).reshape(height, width, 4)
+        with _ENCODE.time():
+            picture = av.VideoFrame.from_ndarray(pixels, format='bgra').reformat(
+                *self.size, format='yuv420p', dst_colorspace='ITU709', interpolation='BILINEAR'
+            )
+            return self._encode(picture)
+
+    def repeat(self) -> bytes:
+        """Encode the last frame again (a few bytes: keeps the stream alive)."""
+        if self._last_picture is None:
+            return b''
+        with _ENCODE.time():
+            return self._encode(self._last_picture)
+
+    def _encode(self, picture) -> bytes:
+        self._last_picture = picture
+        picture.pts = self._sequence * self._duration
+        now = time.monotonic()
+        if self._sequence == 0 or now - self._last_keyframe >= self.keyframe_interval:
+            picture.pict_type = PictureType.I
+            self._last_keyframe = now
+        else:
+            picture.pict_type = PictureType.NONE
+        self._sequence += 1
+        return b''.join(
+            fragment(self._sequence, packet.dts, self._duration, avcc_sample(bytes(packet)), packet.is_keyframe)
+            for packet in self._context.encode(picture)
+        )